@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Benchmark: per-recipient vs batched birthday message generation against a local OpenAI stub
+
+    python benchmarks/bench_birthday_batch.py [--recipients 40] [--batch-size 10] [--latency 0.3]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import openai
+
+from src import llm_manager
+from src.birthday_messenger import generate_birthday_messages
+from src.catalog import get_catalog
+from src.config import PRICES_FILE
+from benchmarks.stubs import OpenAIStub
+
+
+def _run(label: str, names, prices_data, batch_size: int, stub: OpenAIStub):
+    before = dict(stub.counts)
+    start = time.perf_counter()
+    messages = generate_birthday_messages(names, prices_data, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    delta = {k: stub.counts[k] - before.get(k, 0) for k in ("chat_calls", "prompt_tokens", "completion_tokens")}
+    print(f"{label:<18} calls {delta['chat_calls']:>4}  prompt tokens {delta['prompt_tokens']:>8}  "
+          f"completion tokens {delta['completion_tokens']:>6}  wall {elapsed:>6.2f}s  ({len(messages)} messages)")
+    return delta, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub response time per call (s)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of batch entries the stub omits")
+    args = parser.parse_args()
+
+    names = [f"Pasien {i}" for i in range(args.recipients)]
+    prices_data = get_catalog(PRICES_FILE)
+    with OpenAIStub(latency=args.latency, drop_rate=args.drop_rate, seed=1) as stub:
+        llm_manager.client = openai.OpenAI(api_key="stub", base_url=stub.base_url, max_retries=0)
+        single, single_s = _run("per recipient", names, prices_data, 1, stub)
+        batched, batched_s = _run(f"batch of {args.batch_size}", names, prices_data, args.batch_size, stub)
+
+    print(f"\n{single['chat_calls'] / max(1, batched['chat_calls']):.1f}x fewer calls, "
+          f"{single['prompt_tokens'] / max(1, batched['prompt_tokens']):.1f}x fewer prompt tokens, "
+          f"{single_s / max(1e-9, batched_s):.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Benchmark: server cold start, as module import times and time to the first answered webhook
+
+    python benchmarks/bench_cold_start.py [--runs 3] [--top 15] [--settle 2] [--server-env PREWARM=false]
+
+Import times come from `python -X importtime -c "import src.server_flask"` (cumulative, top
+modules). Time to first request starts `scripts/server_flask.py` against local OpenAI and Graph
+API stubs and measures from process start to the port accepting connections, then the latency
+of the first signed webhook sent right away and after `--settle` seconds.
+"""
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import requests
+
+from benchmarks.loadtest import sign, start_server, webhook_payload
+from benchmarks.stubs import GraphApiStub, OpenAIStub
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_times(module: str = "src.server_flask"):
+    """(total seconds, [(cumulative us, self us, module)]) for importing `module` in a fresh interpreter."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=str(ROOT),
+                          capture_output=True, text=True)
+    total = time.perf_counter() - start
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if m:
+            rows.append((int(m.group(2)), int(m.group(1)), m.group(4)))
+    return total, rows
+
+
+def first_request(port: int, extra_env, settle: float = 0.0, timeout: float = 60.0):
+    """Seconds from process start to the port opening, and the first webhook's own latency.
+
+    The webhook is sent `settle` seconds after the port opens (0 = at once, like a request
+    that woke a scaled-to-zero instance). Returns (bound, webhook latency, reply delivered).
+    """
+    with OpenAIStub(seed=1) as openai_stub, GraphApiStub(seed=2) as graph_stub, \
+            tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        proc = start_server(port, openai_stub, graph_stub, workdir, extra_env)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            bound = None
+            deadline = start + timeout
+            while time.perf_counter() < deadline:
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server exited with status {proc.returncode}")
+                try:
+                    requests.get(url + "/", timeout=1)
+                    bound = time.perf_counter() - start
+                    break
+                except requests.RequestException:
+                    time.sleep(0.01)
+            if bound is None:
+                raise RuntimeError("server did not start")
+            time.sleep(settle)
+            body = json.dumps(webhook_payload(0, "6281200000001", "Harga laser pico berapa ya kak?")).encode("utf-8")
+            sent = time.perf_counter()
+            requests.post(url + "/webhook", data=body, timeout=timeout,
+                          headers={"Content-Type": "application/json", "X-Hub-Signature-256": sign(body)})
+            latency = time.perf_counter() - sent
+            while not graph_stub.sent and time.perf_counter() < deadline:
+                time.sleep(0.005)
+            delivered = time.perf_counter() - start
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return bound, latency, delivered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--port", type=int, default=18090)
+    parser.add_argument("--settle", type=float, default=2.0, help="second case: wait this long before the first webhook")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE")
+    args = parser.parse_args()
+
+    totals, rows = [], []
+    for _ in range(args.runs):
+        total, rows = import_times()
+        totals.append(total)
+    print(f"import src.server_flask (fresh interpreter): median {statistics.median(totals) * 1000:.0f}ms "
+          f"over {args.runs} runs")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative, self_us, module in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f} {self_us / 1000:>8.1f}  {module}")
+    for heavy in ("openai", "requests", "httpx"):
+        loaded = any(module == heavy for _, _, module in rows)
+        print(f"{heavy:<9} imported at startup: {'yes' if loaded else 'no'}")
+
+    print(f"\nTime to first request (median of {args.runs}, env {args.server_env or 'default'}):")
+    for settle in (0.0, args.settle):
+        results = [first_request(args.port, args.server_env, settle) for _ in range(args.runs)]
+        bound, latency, delivered = (statistics.median(r[i] for r in results) for i in range(3))
+        print(f"  first webhook {settle:.1f}s after the port opened:")
+        print(f"    port accepting connections  {bound * 1000:>8.0f}ms after process start")
+        print(f"    first webhook latency       {latency * 1000:>8.0f}ms")
+        print(f"    first reply delivered       {delivered * 1000:>8.0f}ms after process start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Benchmark: in-memory load + write-back vs streaming reminder update on a large synthetic lead export
+
+    python benchmarks/bench_csv_stream.py [--copies 25] [--source "data/Data Almeera - leads_pwt.csv"]
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.csv_manager import load_csv, stream_birthday_reminders, update_birthday_reminders_for_today
+
+
+def make_export(source: str, dest: str, copies: int) -> int:
+    """Concatenate `copies` of the source rows, like a multi-branch export."""
+    with open(source, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    with open(dest, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for _ in range(copies):
+            writer.writerows(rows)
+    return len(rows) * copies
+
+
+def _measure(label: str, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<12} {elapsed:>7.2f}s  peak {peak / 1e6:>7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=25)
+    parser.add_argument("--source", default="data/Data Almeera - leads_pwt.csv")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "leads.csv")
+        n = make_export(args.source, src, args.copies)
+        print(f"{n} rows, {os.path.getsize(src) / 1e6:.1f} MB\n")
+        _measure("in-memory", lambda: update_birthday_reminders_for_today(
+            load_csv(src), write_back_path=os.path.join(tmp, "memory.csv")))
+        _measure("streaming", lambda: stream_birthday_reminders(src, os.path.join(tmp, "stream.csv")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark: cold start of the SQLite lead store vs re-parsing the leads CSV for today's birthdays,
+and memory and filter time of the store vs the list of dicts from `load_csv`
+
+    python benchmarks/bench_lead_store.py [--copies 25]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.csv_manager import get_rows_where_column_equals, load_csv, row_birth_month_day
+from src.lead_store import LeadStore, open_lead_store
+from benchmarks.bench_csv_stream import make_export
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=25)
+    parser.add_argument("--filters", type=int, default=50, help="get_rows_where_column_equals calls to time")
+    parser.add_argument("--source", default="data/Data Almeera - leads_pwt.csv")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "leads.csv")
+        db = os.path.join(tmp, "leads.sqlite3")
+        n = make_export(args.source, src, args.copies)
+        print(f"{n} rows\n")
+        today = time.localtime()
+        md = (today.tm_mon, today.tm_mday)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            rows = [r for r in load_csv(src) if row_birth_month_day(r) == md]
+            csv_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            LeadStore(db).import_csv(src)
+            import_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        found = open_lead_store(src, db).birthdays_on()
+        store_ms = (time.perf_counter() - start) * 1000
+
+        print(f"CSV parse + scan    {csv_ms:>8.1f} ms  ({len(rows)} birthdays)")
+        print(f"one-off import      {import_ms:>8.1f} ms")
+        print(f"store open + query  {store_ms:>8.1f} ms  ({len(found)} birthdays)")
+
+        # Memory held by each representation, then repeated filters as in the campaign scripts
+        filters = [("Pekerjaan", "IRT"), ("BULAN", str(md[0])), ("ULTAH REMINDER", "ULTAH HARI INI")]
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracemalloc.start()
+            rows = load_csv(src)
+            list_mb = tracemalloc.get_traced_memory()[0] / 1e6
+            tracemalloc.stop()
+            tracemalloc.start()
+            store = open_lead_store(src, db)
+            store_mb = tracemalloc.get_traced_memory()[0] / 1e6
+            tracemalloc.stop()
+        print(f"\nlist of dicts {list_mb:.1f} MB in memory, lead store {store_mb:.1f} MB")
+        for column, value in filters:
+            times = []
+            for data in (rows, store):
+                found = get_rows_where_column_equals(data, column, value)  # the store indexes a column on first use
+                start = time.perf_counter()
+                for _ in range(args.filters):
+                    get_rows_where_column_equals(data, column, value)
+                times.append((time.perf_counter() - start) * 1000 / args.filters)
+            print(f"{f'{column} == {value!r}':<36} {len(found):>6} rows  list {times[0]:>6.2f} ms  store {times[1]:>6.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Benchmark: prompt-token reduction from treatment retrieval on sample complaints
+
+    python benchmarks/bench_retrieval.py [--top-k 6] [--prices data/prices_august.json]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.data_loader import load_prices_data
+from src.llm_manager import build_system_message
+
+SAMPLE_COMPLAINTS = [
+    "Kak, muka aku jerawatan parah dan merah-merah, perawatan apa yang cocok?",
+    "Wajahku kusam banget, pengen glowing buat nikahan bulan depan",
+    "Ada treatment buat bekas jerawat bopeng ga?",
+    "Harga laser pico berapa ya?",
+    "Kulit mulai keriput dan kendur, ada anti aging?",
+    "Bruntusan di dahi ga hilang-hilang",
+    "Promo kemerdekaan masih ada?",
+    "Flek hitam di pipi, bisa dihilangkan?",
+    "Pori-pori besar dan berminyak",
+    "Mau tanya paket double treatment glowing",
+]
+
+
+def count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except Exception:
+        # Rough estimate when tiktoken is not installed
+        return max(1, len(text) // 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--prices", default="data/prices_august.json")
+    args = parser.parse_args()
+
+    prices_data = load_prices_data(args.prices)
+    full_tokens = count_tokens(build_system_message(prices_data, top_k=0))
+    print(f"Full catalog system prompt: {full_tokens} tokens\n")
+    print(f"{'tokens':>7} {'saved':>6} {'ms':>6}  complaint")
+
+    total = 0
+    for complaint in SAMPLE_COMPLAINTS:
+        query = f"Pasien bertanya: {complaint}"
+        start = time.perf_counter()
+        prompt = build_system_message(prices_data, query, args.top_k)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        tokens = count_tokens(prompt)
+        total += tokens
+        saved = 100.0 * (full_tokens - tokens) / full_tokens
+        print(f"{tokens:>7} {saved:>5.1f}% {elapsed_ms:>6.2f}  {complaint}")
+
+    avg = total / len(SAMPLE_COMPLAINTS)
+    print(f"\nAverage: {avg:.0f} tokens vs {full_tokens} full "
+          f"({100.0 * (full_tokens - avg) / full_tokens:.1f}% fewer prompt tokens, top_k={args.top_k})")
+
+
+if __name__ == "__main__":
+    main()
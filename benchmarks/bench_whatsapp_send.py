@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Benchmark: pooled keep-alive session vs one requests.post per message, against the local Graph API stub
+
+    python benchmarks/bench_whatsapp_send.py [--messages 200] [--latency 0.005]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import requests
+
+from src import whatsapp_api
+from benchmarks.stubs import GraphApiStub
+
+
+def _unpooled_send(to_number: str, text: str):
+    payload = {"messaging_product": "whatsapp", "to": to_number, "type": "text", "text": {"body": text}}
+    resp = requests.post(whatsapp_api.MESSAGES_URL, headers=whatsapp_api.HEADERS, json=payload, timeout=30)
+    return resp.status_code // 100 == 2, resp.text
+
+
+def _run(label: str, send, n: int, stub: GraphApiStub):
+    before = dict(stub.counts)
+    start = time.perf_counter()
+    ok = sum(1 for i in range(n) if send("6281234567890", f"pesan {i}")[0])
+    elapsed = time.perf_counter() - start
+    conns = stub.counts["connections"] - before.get("connections", 0)
+    reqs = stub.counts["requests"] - before.get("requests", 0)
+    print(f"{label:<10} ok={ok}/{n} requests={reqs} connections={conns} "
+          f"total={elapsed:.3f}s per_msg={elapsed / n * 1000:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub latency per request (s)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    with GraphApiStub(latency=args.latency, rate_429=args.rate_429, retry_after=0, seed=1) as stub:
+        whatsapp_api.configure(token="bench-token", phone_number_id="123", base_url=stub.base_url)
+        _run("unpooled", _unpooled_send, args.messages, stub)
+        _run("pooled", whatsapp_api.send_text_message, args.messages, stub)
+        print(f"status counts: { {k: v for k, v in stub.counts.items() if k.startswith('status_')} }")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+"""
+Load test: signed Meta-format webhooks at a target rate against the server, with local OpenAI and Graph API stubs
+
+    python benchmarks/loadtest.py [--rate 20] [--duration 30] [--senders 50] [--openai-latency 0.8]
+    python benchmarks/loadtest.py --server-env WEBHOOK_ASYNC=true --server-env WEBHOOK_WORKERS=16
+    python benchmarks/loadtest.py --gunicorn --server-env WEB_CONCURRENCY=4
+    python benchmarks/loadtest.py --async --rate 100 --openai-latency 2
+    python benchmarks/loadtest.py --url http://127.0.0.1:8080 --openai-port 9101 --graph-port 9102
+
+Starts the stubs, launches `scripts/server_flask.py` (or gunicorn, or `scripts/server_async.py`)
+pointed at them (unless `--url` targets a server already configured with OPENAI_BASE_URL /
+WHATSAPP_GRAPH_API_BASE at the stub ports), posts webhooks open-loop at `--rate` per second for `--duration` seconds, then waits for the replies.
+Reports webhook response latency, end-to-end latency (webhook sent -> reply received by the Graph
+API stub) and sustained throughput. Everything runs on 127.0.0.1; no network access is needed.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import requests
+
+from benchmarks.stubs import REF_PATTERN, GraphApiStub, OpenAIStub
+
+APP_SECRET = "loadtest-secret"
+PHONE_NUMBER_ID = "1000000001"
+
+QUESTIONS = [
+    "Kak, muka aku jerawatan parah, perawatan apa yang cocok?",
+    "Harga laser pico berapa ya kak?",
+    "Kulit aku kusam, pengen glowing buat nikahan bulan depan",
+    "Promo bulan ini apa aja?",
+    "Bekas jerawat bisa hilang ga kak pakai peeling?",
+    "Klinik buka jam berapa ya?",
+    "Facial yang cocok buat kulit sensitif apa?",
+    "Mau booking treatment hari sabtu bisa?",
+]
+
+
+def percentiles(values) -> dict:
+    """count/avg/p50/p95/p99/max in ms for a list of seconds."""
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    n = len(values)
+
+    def pct(p):
+        return round(values[min(n - 1, int(p * n))] * 1000, 1)
+    return {"count": n, "avg": round(sum(values) / n * 1000, 1), "p50": pct(0.50), "p95": pct(0.95),
+            "p99": pct(0.99), "max": round(values[-1] * 1000, 1)}
+
+
+def webhook_payload(seq: int, from_number: str, text: str) -> dict:
+    """Meta WhatsApp Cloud API `messages` notification with one text message."""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "loadtest-waba",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "628000000000", "phone_number_id": PHONE_NUMBER_ID},
+                    "contacts": [{"profile": {"name": f"Pasien {from_number[-4:]}"}, "wa_id": from_number}],
+                    "messages": [{
+                        "from": from_number,
+                        "id": f"wamid.loadtest.{seq:08d}.{random.getrandbits(32):08x}",
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text},
+                    }],
+                },
+            }],
+        }],
+    }
+
+
+def sign(body: bytes, secret: str = APP_SECRET) -> str:
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+DEV_SERVER = [sys.executable, "-u", os.path.join("scripts", "server_flask.py")]
+GUNICORN = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "src.server_flask:app"]
+ASYNC_SERVER = [sys.executable, "-u", os.path.join("scripts", "server_async.py")]
+
+
+def start_server(port: int, openai_stub: OpenAIStub, graph_stub: GraphApiStub, workdir: str, extra_env,
+                 command=DEV_SERVER) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "PORT": str(port),
+        "OPENAI_API_KEY": "loadtest",
+        "OPENAI_BASE_URL": openai_stub.base_url,
+        "WHATSAPP_GRAPH_API_BASE": graph_stub.base_url,
+        "WHATSAPP_TOKEN_ACCESS": "loadtest",
+        "PHONE_NUMBER": PHONE_NUMBER_ID,
+        "WHATSAPP_APP_SECRET": APP_SECRET,
+        # Every message is a new question; keep state out of data/
+        "RESPONSE_CACHE_ENABLED": "false",
+        # Simulated senders write faster than a patient would; override to test the limit
+        "SENDER_RATE_PER_MIN": "0",
+        "RESPONSE_CACHE_DB": os.path.join(workdir, "response_cache.sqlite3"),
+        "SESSION_DB": os.path.join(workdir, "sessions.sqlite3"),
+        "DEDUP_DB": os.path.join(workdir, "dedup.sqlite3"),
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+    })
+    for item in extra_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    log = open(os.path.join(workdir, "server.log"), "w")
+    return subprocess.Popen(command, cwd=str(ROOT), env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url: str, timeout: float = 60.0, proc: subprocess.Popen = None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            if requests.get(url + "/ready", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} not ready after {timeout:.0f}s")
+
+
+class LoadGenerator:
+    """Posts webhooks open-loop: message i is due at start + i / rate whether or not earlier ones finished.
+
+    Webhook latency is measured from the due time, so time spent waiting for a free client
+    thread counts against the server instead of being hidden (no coordinated omission).
+    """
+
+    def __init__(self, url: str, rate: float, duration: float, senders: int, concurrency: int, timeout: float):
+        self.url = url.rstrip("/") + "/webhook"
+        self.rate = rate
+        self.total = max(1, int(rate * duration))
+        self.numbers = [f"62812{i:08d}" for i in range(max(1, senders))]
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.sent_at = {}  # ref -> due time (epoch seconds)
+        self.webhook_latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.dispatch_seconds = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _post(self, seq: int, due: float):
+        ref = f"#ref-{seq:06d}"
+        text = f"{QUESTIONS[seq % len(QUESTIONS)]} {ref}"
+        body = json.dumps(webhook_payload(seq, self.numbers[seq % len(self.numbers)], text)).encode("utf-8")
+        with self._lock:
+            self.sent_at[ref] = due
+        try:
+            resp = self._session().post(self.url, data=body, timeout=self.timeout, headers={
+                "Content-Type": "application/json", "X-Hub-Signature-256": sign(body)})
+            status = str(resp.status_code)
+        except requests.RequestException:
+            status = "error"
+        latency = time.time() - due
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status == "200":
+                self.webhook_latencies.append(latency)
+            else:
+                self.errors += 1
+
+    def run(self) -> float:
+        """Send all messages and wait for their webhook responses; returns the start time."""
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="loadgen") as pool:
+            for seq in range(self.total):
+                due = start + seq / self.rate
+                delay = due - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._post, seq, due)
+            self.dispatch_seconds = time.time() - start
+        return start
+
+
+def collect_replies(graph_stub: GraphApiStub, sent_at: dict, expected: int, drain: float):
+    """Wait up to `drain` seconds for `expected` replies; returns (e2e latencies, delivery times, unmatched)."""
+    deadline = time.time() + drain
+    while time.time() < deadline and len(graph_stub.sent) < expected:
+        time.sleep(0.1)
+    latencies, delivered, unmatched = [], [], 0
+    for item in list(graph_stub.sent):
+        body = ((item["payload"].get("text") or {}).get("body")) or ""
+        ref = REF_PATTERN.search(body)
+        due = sent_at.get(ref.group(0)) if ref else None
+        if due is None:
+            # Fallback/moderation replies don't carry the reference
+            unmatched += 1
+            continue
+        latencies.append(item["received_at"] - due)
+        delivered.append(item["received_at"])
+    return latencies, delivered, unmatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=20, help="webhooks per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--senders", type=int, default=50, help="distinct patient numbers")
+    parser.add_argument("--concurrency", type=int, default=256, help="max in-flight webhook requests")
+    parser.add_argument("--timeout", type=float, default=120, help="webhook request timeout (s)")
+    parser.add_argument("--drain", type=float, default=60, help="max wait for outstanding replies (s)")
+    parser.add_argument("--url", default="", help="target an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=18080, help="port for the server started by the harness")
+    parser.add_argument("--gunicorn", action="store_true", help="start the production gunicorn server instead")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="start the asyncio server instead")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the started server (repeatable)")
+    parser.add_argument("--openai-port", type=int, default=0)
+    parser.add_argument("--openai-latency", type=float, default=0.8, help="stub chat/moderation latency (s)")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-429-rate", type=float, default=0.0)
+    parser.add_argument("--graph-port", type=int, default=0)
+    parser.add_argument("--graph-latency", type=float, default=0.15, help="stub /messages latency (s)")
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--graph-429-rate", type=float, default=0.0)
+    parser.add_argument("--output", default="", help="write the report as JSON here")
+    args = parser.parse_args()
+
+    openai_stub = OpenAIStub(port=args.openai_port, latency=args.openai_latency, error_rate=args.openai_error_rate,
+                             rate_429=args.openai_429_rate, retry_after=0, seed=1)
+    graph_stub = GraphApiStub(port=args.graph_port, latency=args.graph_latency, error_rate=args.graph_error_rate,
+                              rate_429=args.graph_429_rate, retry_after=0, seed=2)
+    with openai_stub, graph_stub, tempfile.TemporaryDirectory() as workdir:
+        proc = None
+        url = args.url.rstrip("/")
+        if not url:
+            url = f"http://127.0.0.1:{args.port}"
+            proc = start_server(args.port, openai_stub, graph_stub, workdir, args.server_env,
+                                GUNICORN if args.gunicorn else ASYNC_SERVER if args.use_async else DEV_SERVER)
+        try:
+            wait_ready(url, proc=proc)
+            print(f"Server {url} | OpenAI stub {openai_stub.base_url} | Graph stub {graph_stub.base_url}")
+            loadgen = LoadGenerator(url, args.rate, args.duration, args.senders, args.concurrency, args.timeout)
+            print(f"Sending {loadgen.total} webhooks at {args.rate:g}/s from {len(loadgen.numbers)} senders...")
+            start = loadgen.run()
+            e2e, delivered, unmatched = collect_replies(graph_stub, loadgen.sent_at, loadgen.total, args.drain)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        if proc is not None and proc.returncode not in (0, -15):
+            print(f"Server exited with {proc.returncode}; log: {os.path.join(workdir, 'server.log')}")
+
+    span = (max(delivered) - start) if delivered else 0.0
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "sent": loadgen.total,
+        "offered_rate": round((loadgen.total - 1) / loadgen.dispatch_seconds, 2) if loadgen.dispatch_seconds else 0.0,
+        "webhook_status": loadgen.statuses,
+        "webhook_latency_ms": percentiles(loadgen.webhook_latencies),
+        "replies": len(e2e),
+        "fallback_replies": unmatched,
+        "missing_replies": max(0, loadgen.total - len(e2e) - unmatched),
+        "end_to_end_ms": percentiles(e2e),
+        "sustained_msgs_per_sec": round(len(e2e) / span, 2) if span else 0.0,
+        "openai_stub": dict(openai_stub.counts),
+        "graph_stub": dict(graph_stub.counts),
+    }
+
+    print(f"\nOffered {report['offered_rate']}/s, webhook status {report['webhook_status']}")
+    for label, key in (("webhook", "webhook_latency_ms"), ("end-to-end", "end_to_end_ms")):
+        s = report[key]
+        if s["count"]:
+            print(f"{label:<11} n={s['count']:<6} p50={s['p50']:>8.1f}ms p95={s['p95']:>8.1f}ms "
+                  f"p99={s['p99']:>8.1f}ms max={s['max']:>8.1f}ms")
+        else:
+            print(f"{label:<11} n=0")
+    print(f"replies {report['replies']}/{report['sent']} (fallback {unmatched}, missing {report['missing_replies']}), "
+          f"sustained {report['sustained_msgs_per_sec']} msgs/s")
+    print(f"OpenAI stub: chat={openai_stub.counts['chat_calls']} moderations={openai_stub.counts['moderations']} | "
+          f"Graph stub: requests={graph_stub.counts['requests']} connections={graph_stub.counts['connections']}")
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+Microbenchmark suite for hot paths, with JSON results and baseline comparison
+
+    python benchmarks/run.py                      # run, write benchmarks/results/latest.json, compare to baseline
+    python benchmarks/run.py --save-baseline      # run and store the results as the new baseline
+    python benchmarks/run.py --sizes 1000 --filter dob,signature --threshold 0.3
+
+Exits with status 1 when a benchmark's median is more than `--threshold` slower than the baseline.
+"""
+import argparse
+import contextlib
+import csv
+import hashlib
+import hmac
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.csv_manager import (
+    _parse_dob, load_csv, save_csv, update_birthday_reminders_for_today, get_rows_where_column_equals,
+)
+from src.catalog import get_catalog
+from src.config import PRICES_FILE
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Differences smaller than this are timer noise, whatever the ratio
+NOISE_FLOOR_S = 2e-6
+
+HEADER = ['no', 'Nomor RM', 'NAMA', 'Alamat', 'Pekerjaan', 'Tanggal lahir', 'No. Whatsapp', 'ULTAH REMINDER',
+          '09/12/2025 21:11:57', 'UMUR', 'BULAN', 'TANGGAL', 'TAHUN'] + [''] * 13
+JOBS = ['MAHASISWA', 'KARYAWAN SWASTA', 'IBU RUMAH TANGGA', 'PELAJAR', '', 'WIRASWASTA', 'GURU', 'PNS']
+NAMES = ['ANISA', 'DEA', 'PUTRI', 'SITI', 'RINA', 'AYU', 'DEWI', 'NUR', 'SRI', 'INDAH']
+
+
+def _dob(rng: random.Random) -> str:
+    """Date strings in the shapes found in the real export (mostly DD/MM/YYYY)."""
+    y, m, d = rng.randint(1960, 2015), rng.randint(1, 12), rng.randint(1, 28)
+    roll = rng.random()
+    if roll < 0.90:
+        return f"{d:02d}/{m:02d}/{y}"
+    if roll < 0.94:
+        return f"{d:02d}/{m}/{y}"
+    if roll < 0.96:
+        return f"{d}/{m}/{y}"
+    if roll < 0.97:
+        return f"{y}-{m:02d}-{d:02d}"
+    if roll < 0.98:
+        return f"{d:02d}/{m:02d}"
+    return rng.choice(["", "di RM Kosong", "-"])
+
+
+def synthetic_rows(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(n):
+        dob = _dob(rng)
+        row = [str(i + 1), f"{rng.randint(1, 31):02d}{rng.randint(1, 12):02d}21{i:04d}",
+               f"{rng.choice(NAMES)} {rng.choice(NAMES)}", f"Jl. Melati No. {rng.randint(1, 200)}",
+               rng.choice(JOBS), dob, f"08{rng.randint(10**9, 10**10 - 1)}", '', '',
+               str(rng.randint(10, 60)), dob[3:5].lstrip('0') if len(dob) >= 10 else '',
+               dob[:2].lstrip('0') if len(dob) >= 10 else '', dob[-4:] if len(dob) >= 10 else '']
+        yield row + [''] * (len(HEADER) - len(row))
+
+
+def write_lead_file(path: str, n: int):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(synthetic_rows(n))
+
+
+def measure(fn, repeat: int, number: int = 1) -> dict:
+    """Median/min seconds per call over `repeat` rounds of `number` calls (stdout silenced)."""
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()  # warm-up
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            times.append((time.perf_counter() - start) / number)
+    return {"median_s": statistics.median(times), "min_s": min(times), "repeat": repeat, "number": number}
+
+
+def bench_parse_dob(sizes, tmp):
+    rng = random.Random(1)
+    values = [_dob(rng) for _ in range(10000)]
+
+    def run():
+        for v in values:
+            _parse_dob(v)
+    result = measure(run, repeat=5)
+    result["items"] = len(values)
+    yield "parse_dob[10k strings]", result
+
+
+def bench_csv(sizes, tmp):
+    for n in sizes:
+        path = os.path.join(tmp, f"leads_{n}.csv")
+        write_lead_file(path, n)
+        rows = load_csv(path)
+        repeat = 9 if n <= 10000 else 3
+        yield f"load_csv[{n}]", measure(lambda: load_csv(path), repeat)
+        out = os.path.join(tmp, f"out_{n}.csv")
+        yield f"save_csv[{n}]", measure(lambda: save_csv(out, rows), repeat)
+        yield f"update_birthday_reminders[{n}]", measure(
+            lambda: update_birthday_reminders_for_today(rows, write_back_path=None), repeat)
+        yield f"update_birthday_reminders_write_back[{n}]", measure(
+            lambda: update_birthday_reminders_for_today(rows, write_back_path=out), repeat)
+        yield f"get_rows_where_column_equals[{n}]", measure(
+            lambda: get_rows_where_column_equals(rows, 'Pekerjaan', 'MAHASISWA'), repeat, number=5)
+
+
+def bench_prompt(sizes, tmp):
+    from src.llm_manager import build_system_message
+    # Relative PRICES_FILE is relative to the repo, not to wherever the bench is started from
+    prices_path = ROOT / PRICES_FILE
+    catalog = get_catalog(str(prices_path))
+    if not catalog.data:
+        raise SystemExit(f"bench_prompt: no treatments in {prices_path}; set PRICES_FILE to the price list")
+    queries = ["Kak, muka aku jerawatan parah, perawatan apa yang cocok?", "Harga laser pico berapa ya?",
+               "Kulit kusam pengen glowing", "Promo bulan ini apa aja?"]
+    state = {"i": 0}
+
+    def retrieved():
+        state["i"] += 1
+        build_system_message(catalog, queries[state["i"] % len(queries)])
+    yield "system_prompt[retrieval]", measure(retrieved, repeat=5, number=200)
+    yield "system_prompt[full_catalog]", measure(lambda: build_system_message(catalog, "", top_k=0), repeat=5, number=200)
+
+
+def bench_signature(sizes, tmp):
+    from src import server_flask
+    secret = "bench-secret"
+    for size in (1024, 10 * 1024, 100 * 1024):
+        body = json.dumps({"entry": [{"changes": [{"value": {"text": "x" * size}}]}]}).encode("utf-8")[:size]
+        signature = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        original = server_flask.APP_SECRET
+        server_flask.APP_SECRET = secret
+        try:
+            assert server_flask.verify_signature(body, signature)
+            yield f"verify_signature[{size // 1024}KB]", measure(
+                lambda: server_flask.verify_signature(body, signature), repeat=5, number=500)
+        finally:
+            server_flask.APP_SECRET = original
+
+
+BENCHMARKS = {
+    "dob": bench_parse_dob,
+    "csv": bench_csv,
+    "prompt": bench_prompt,
+    "signature": bench_signature,
+}
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Returns rows of (name, baseline_s, current_s, ratio, regressed)."""
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result["median_s"] / base["median_s"] if base["median_s"] else 1.0
+        regressed = ratio > 1 + threshold and result["median_s"] - base["median_s"] > NOISE_FLOOR_S
+        rows.append((name, base["median_s"], result["median_s"], ratio, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="lead file sizes (rows)")
+    parser.add_argument("--filter", default="", help=f"comma-separated groups: {','.join(BENCHMARKS)}")
+    parser.add_argument("--output", default=str(RESULTS_DIR / "latest.json"))
+    parser.add_argument("--baseline", default=str(RESULTS_DIR / "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    groups = [g for g in args.filter.split(",") if g] or list(BENCHMARKS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for group in groups:
+            for name, result in BENCHMARKS[group](sizes, tmp):
+                results[name] = result
+                print(f"{name:<48} {result['median_s'] * 1000:>10.3f} ms")
+
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "platform": platform.platform(), "sizes": sizes},
+        "results": results,
+    }
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.save_baseline:
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+
+    regressions = 0
+    print(f"\n{'benchmark':<48} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for name, base_s, cur_s, ratio, regressed in compare(results, baseline, args.threshold):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<48} {base_s * 1000:>12.3f} {cur_s * 1000:>12.3f} {ratio:>6.2f}x{flag}")
+    if regressions:
+        print(f"\n{regressions} benchmark(s) more than {args.threshold:.0%} slower than baseline")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""
+Local stand-ins for external HTTP APIs, for tests and offline benchmarks.
+
+Each stub listens on 127.0.0.1 (ephemeral port by default), runs on a background
+thread and counts TCP connections, requests and responses by status so
+connection reuse and retry behaviour can be measured without network access.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    # Write headers and body in one segment; split writes on a kept-alive
+    # socket hit Nagle + delayed ACK and add ~40ms per response
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.stub._count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body or b"{}")
+        except ValueError:
+            return {}
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.stub._count(f"status_{status}")
+
+    def do_POST(self):
+        stub = self.server.stub
+        stub._count("requests")
+        payload = self._read_json()
+        if stub.latency:
+            time.sleep(stub.latency)
+        failure = stub._next_failure()
+        if failure is not None:
+            status, retry_after = failure
+            headers = {"Retry-After": retry_after} if retry_after is not None else None
+            self._send_json(status, {"error": {"message": "stub failure", "code": status}}, headers)
+            return
+        status, body = stub.handle(self.path, payload)
+        self._send_json(status, body)
+
+
+class StubServer:
+    """Base stub: configurable latency, random error/429 rates and scripted failures."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, rate_429: float = 0.0, retry_after=None, seed: int = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._scripted = []
+        self._random = random.Random(seed)
+        self._server = _Server((host, port), _StubHandler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail_next(self, n: int, status: int = 429, retry_after=None):
+        """Make the next `n` requests fail with `status` (optionally sending Retry-After)."""
+        with self._lock:
+            self._scripted.extend([(status, retry_after)] * n)
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counts[key] += n
+
+    def _next_failure(self):
+        with self._lock:
+            if self._scripted:
+                return self._scripted.pop(0)
+            roll = self._random.random()
+        if roll < self.rate_429:
+            return 429, self.retry_after
+        if roll < self.rate_429 + self.error_rate:
+            return 500, None
+        return None
+
+    def handle(self, path: str, payload: dict):
+        raise NotImplementedError
+
+
+class GraphApiStub(StubServer):
+    """Imitates `POST /<version>/<phone_number_id>/messages` of the WhatsApp Cloud API."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sent = []
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v22.0"
+
+    def handle(self, path: str, payload: dict):
+        if not path.rstrip("/").endswith("/messages"):
+            return 404, {"error": {"message": f"unknown path {path}"}}
+        to = payload.get("to", "")
+        with self._lock:
+            self.sent.append({"to": to, "payload": payload, "received_at": time.time()})
+        return 200, {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": to, "wa_id": to}],
+            "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}],
+        }
+
+
+# Load-test messages carry a reference like "#ref-000042"; chat replies repeat it so the
+# harness can match each reply sent to the Graph API stub with the webhook that caused it
+REF_PATTERN = re.compile(r"#ref-\w+")
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class OpenAIStub(StubServer):
+    """Imitates `POST /v1/chat/completions` and `POST /v1/moderations` of the OpenAI API.
+
+    Chat replies are canned; when the last user message ends with a JSON line holding
+    `{"recipients": [{"id": ..., "name": ...}]}` and JSON output was requested, the reply is
+    `{"messages": {id: text}}`. `drop_rate` leaves entries out of such replies to exercise
+    callers' fallbacks. Any `#ref-...` marker in the last user message is repeated at the end of
+    plain replies. Token usage is estimated at ~4 characters per token and counted in
+    `counts["prompt_tokens"]` / `counts["completion_tokens"]`.
+    """
+
+    def __init__(self, *args, drop_rate: float = 0.0, reply: str = "Halo kak! Minra bantu jelaskan ya ✨", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drop_rate = drop_rate
+        self.reply = reply
+        self.calls = []
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/v1"
+
+    def handle(self, path: str, payload: dict):
+        if path.rstrip("/").endswith("/moderations"):
+            self._count("moderations")
+            return 200, {"id": f"modr-{uuid.uuid4().hex}", "model": "omni-moderation-latest",
+                         "results": [{"flagged": False, "categories": {}, "category_scores": {}}]}
+        if not path.rstrip("/").endswith("/chat/completions"):
+            return 404, {"error": {"message": f"unknown path {path}"}}
+
+        messages = payload.get("messages", [])
+        content = self._reply_for(messages, payload.get("response_format") or {})
+        prompt_tokens = sum(_approx_tokens(str(m.get("content", ""))) for m in messages)
+        completion_tokens = _approx_tokens(content)
+        with self._lock:
+            self.calls.append(payload)
+            self.counts["chat_calls"] += 1
+            self.counts["prompt_tokens"] += prompt_tokens
+            self.counts["completion_tokens"] += completion_tokens
+        return 200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _reply_for(self, messages, response_format: dict) -> str:
+        last_user = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        if response_format.get("type") == "json_object":
+            try:
+                recipients = json.loads(last_user.strip().splitlines()[-1])["recipients"]
+            except (ValueError, KeyError, IndexError, TypeError):
+                recipients = []
+            out = {}
+            for r in recipients:
+                with self._lock:
+                    drop = self._random.random() < self.drop_rate
+                if not drop:
+                    out[str(r.get("id"))] = f"Selamat ulang tahun, Kak {r.get('name')}! Semoga harimu seindah kulitmu ✨"
+            return json.dumps({"messages": out}, ensure_ascii=False)
+        ref = REF_PATTERN.search(last_user)
+        return f"{self.reply} {ref.group(0)}" if ref else self.reply
@@ -0,0 +1,70 @@
+# gunicorn.conf.py — production server: gunicorn -c gunicorn.conf.py src.server_flask:app
+#
+# Prefork workers with a thread pool each. The app is imported once in the master
+# (preload_app) and the catalog, retrieval index and patient index are loaded there before
+# forking, so workers share them copy-on-write instead of each loading its own copy.
+#
+#   kill -HUP <master pid>   graceful reload: re-reads the leads file, then replaces workers
+#                            after they finish in-flight requests (code changes need a restart)
+#   kill -TERM <master pid>  graceful shutdown within GUNICORN_GRACEFUL_TIMEOUT seconds
+
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count() * 2 + 1))))
+worker_class = "gthread"
+# Handlers mostly wait on OpenAI/Graph API, so threads (not CPUs) bound concurrent patients
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
+preload_app = True
+# OpenAI calls can take up to LLM_TIMEOUT seconds; don't kill workers while they wait
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "90"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+# Workers are separate processes: share webhook dedup and metrics between them.
+# Read by src/config.py when the app is preloaded, so these must be set before that.
+os.environ.setdefault("DEDUP_DB", "data/dedup.sqlite3")
+os.environ.setdefault("METRICS_DIR", "/tmp/almeera-metrics")
+# Acknowledge webhooks at once and reply from each process's queue. Quick acks let one process
+# accept most of the load, so it gets as many queue workers as LLM calls it may run at a time.
+os.environ.setdefault("WEBHOOK_ASYNC", "true")
+os.environ.setdefault("WEBHOOK_WORKERS", os.getenv("LLM_MAX_CONCURRENCY", "32"))
+
+
+def on_starting(server):
+    from src.metrics import clear_metrics_dir
+    clear_metrics_dir(os.environ["METRICS_DIR"])
+
+
+def when_ready(server):
+    # Runs in the master after the app is preloaded and before the first fork
+    from src.server_flask import load_shared_data
+    load_shared_data()
+    # Keep the loaded objects out of the collector so GC passes in workers don't touch
+    # (and un-share) their pages
+    gc.freeze()
+    server.log.info("Shared data loaded; forking %s workers x %s threads", workers, threads)
+
+
+def on_reload(server):
+    from src.server_flask import load_shared_data
+    load_shared_data(reload=True)
+    gc.freeze()
+    server.log.info("Reloaded shared data")
+
+
+def post_worker_init(worker):
+    # Per-process clients (OpenAI, Graph API session); /ready turns 200 when done
+    from src.server_flask import start_prewarm
+    start_prewarm()
+
+
+def worker_exit(server, worker):
+    # Acknowledged messages still queued in this worker would be lost on exit (reload/shutdown)
+    from src.server_flask import WEBHOOK_QUEUE
+    if not WEBHOOK_QUEUE.drain(timeout=graceful_timeout):
+        server.log.warning("Worker %s exited with %s queued webhook message(s)", worker.pid, WEBHOOK_QUEUE.depth())
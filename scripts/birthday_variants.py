@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+"""
+Birthday variants entry point — generate or show today's birthday message variant pool
+"""
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.birthday_variants import main
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+"""
+Lead store entry point — import the leads CSV into SQLite or export it back to CSV
+"""
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.lead_store import main
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""
+Async server entry point — same webhook contract as server_flask.py, served by aiohttp
+"""
+import sys
+from pathlib import Path
+import os
+
+# Ensure project root is on sys.path so `src` can be imported when running script directly
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.server_async import serve
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 8080))
+    print(f"🚀 Starting async server on port {port}")
+    print(f"📡 Server will be available at: http://0.0.0.0:{port}")
+    serve(port=port)
@@ -10,7 +10,7 @@ import os
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
-from src.server_flask import app
+from src.server_flask import serve
 
 
 if __name__ == "__main__":
@@ -18,12 +18,12 @@ if __name__ == "__main__":
     debug_mode = os.getenv("FLASK_DEBUG", "False").lower() == "true"
     print(f"🚀 Starting server on port {port}")
     print(f"📡 Server will be available at: http://0.0.0.0:{port}")
-    app.run(host="0.0.0.0", port=port, debug=debug_mode)
+    serve(port=port, debug=debug_mode)
 #!/usr/bin/env python
 """
 Flask server entry point — run WhatsApp webhook and chatbot server
 """
-from src.server_flask import app
+from src.server_flask import serve
 
 if __name__ == "__main__":
     import os
@@ -31,4 +31,4 @@ if __name__ == "__main__":
     debug_mode = os.getenv("FLASK_DEBUG", "False").lower() == "true"
     print(f"🚀 Starting server on port {port}")
     print(f"📡 Server will be available at: http://0.0.0.0:{port}")
-    app.run(host="0.0.0.0", port=port, debug=debug_mode)
+    serve(port=port, debug=debug_mode)
@@ -1,54 +1,190 @@
-from .csv_manager import load_csv, update_birthday_reminders_for_today, get_rows_where_column_equals
-from .data_loader import load_prices_data
+import json
+import os
+import threading
+
+from .lead_store import open_lead_store
+from .catalog import get_catalog
+from .config import PRICES_FILE, BIRTHDAY_BATCH_SIZE, BIRTHDAY_VARIANTS
+from .birthday_variants import get_variant_pool
+from .reminders import refresh_reminders
 
 # Local CSV data file
 DATA_CSV = "data/Data Almeera - leads_pwt.csv"
-PRICES_FILE = "data/prices_august.json"
+
+
+BIRTHDAY_STYLE = (
+    "Gunakan Bahasa Indonesia yang girly, casual, elegan, dan hangat. "
+    "Ajak pasien untuk menikmati Birthday Treat di Almeera dengan nada lembut (tanpa memaksa). "
+    "Batasi 2-3 kalimat saja."
+)
+
+# Sent instead of an LLM failure ("[LLM Unavailable] ...", "[LLM Error] ...") so patients never see the marker
+BIRTHDAY_TEMPLATE = (
+    "Selamat ulang tahun, {name}! Semoga hari istimewa ini penuh kebahagiaan. "
+    "Ada Birthday Treat spesial untukmu di Almeera, kabari kami kalau mau mampir ya 💕"
+)
+
+_batch_lock = threading.Lock()
+# batches = batched requests sent, batched = messages they produced, fallbacks = per-recipient retries
+BATCH_STATS = {"batches": 0, "batched": 0, "fallbacks": 0}
 
 
 def build_birthday_prompt(name):
+    return f"Buatkan pesan ucapan ulang tahun singkat dan manis untuk pasien bernama {name}. {BIRTHDAY_STYLE}"
+
+
+def build_birthday_batch_prompt(names):
+    """One request for several patients; the last line is the recipient list as JSON."""
+    recipients = [{"id": str(i), "name": name} for i, name in enumerate(names)]
     return (
-        f"Buatkan pesan ucapan ulang tahun singkat dan manis untuk pasien bernama {name}. "
-        "Gunakan Bahasa Indonesia yang girly, casual, elegan, dan hangat. "
-        "Ajak pasien untuk menikmati Birthday Treat di Almeera dengan nada lembut (tanpa memaksa). "
-        "Batasi 2-3 kalimat saja."
+        "Buatkan pesan ucapan ulang tahun singkat dan manis untuk setiap pasien di bawah ini, "
+        f"satu pesan per pasien dengan menyebut namanya. {BIRTHDAY_STYLE} "
+        'Balas hanya dengan JSON berbentuk {"messages": {"<id>": "<pesan>"}} dengan satu entri untuk setiap id.\n'
+        + json.dumps({"recipients": recipients}, ensure_ascii=False)
     )
 
 
+def _parse_batch_reply(reply, count):
+    try:
+        messages = json.loads(reply).get("messages", {})
+    except (TypeError, ValueError, AttributeError):
+        return [None] * count
+    if not isinstance(messages, dict):
+        return [None] * count
+    out = []
+    for i in range(count):
+        msg = messages.get(str(i))
+        out.append(msg.strip() if isinstance(msg, str) and msg.strip() else None)
+    return out
+
+
+class GenerationStopped(Exception):
+    """`generate_birthday_messages` stopped early (e.g. on a campaign timeout).
+
+    `messages` maps the position of each name already handled to its message (None if the LLM
+    could not generate it); the rest were never attempted. The original error is `__cause__`.
+    """
+
+    def __init__(self, messages, total, cause):
+        super().__init__(f"{cause} (after {len(messages)} of {total} messages)")
+        self.messages = messages
+
+
+def generate_birthday_messages(names, prices_data, batch_size=BIRTHDAY_BATCH_SIZE, llm=None):
+    """Birthday messages for `names` (same order), `batch_size` patients per LLM request.
+
+    Entries missing or malformed in a batch reply are generated with a single-patient request;
+    entries the LLM could not generate at all are None (see `birthday_text`).
+    `llm` defaults to `get_llm_response` (and must accept its arguments). If an `llm` call raises,
+    GenerationStopped is raised with the messages generated so far.
+    """
+    if llm is None:
+        from .llm_manager import get_llm_response as llm
+    names = list(names)
+    results = [None] * len(names)
+    done = set()
+    try:
+        if batch_size > 1:
+            for start in range(0, len(names), batch_size):
+                chunk = names[start:start + batch_size]
+                reply = llm([{"role": "user", "content": build_birthday_batch_prompt(chunk)}], prices_data,
+                            response_format={"type": "json_object"})
+                parsed = _parse_batch_reply(reply, len(chunk))
+                results[start:start + len(chunk)] = parsed
+                done.update(start + j for j, m in enumerate(parsed) if m is not None)
+                with _batch_lock:
+                    BATCH_STATS["batches"] += 1
+                    BATCH_STATS["batched"] += sum(m is not None for m in parsed)
+        for i, name in enumerate(names):
+            if results[i] is None:
+                if batch_size > 1:
+                    with _batch_lock:
+                        BATCH_STATS["fallbacks"] += 1
+                reply = llm([{"role": "user", "content": build_birthday_prompt(name)}], prices_data)
+                results[i] = None if is_llm_failure(reply) else reply
+                done.add(i)
+    except Exception as e:
+        raise GenerationStopped({i: results[i] for i in sorted(done)}, len(names), e) from e
+    return results
+
+
+def batch_stats() -> dict:
+    with _batch_lock:
+        return dict(BATCH_STATS)
+
+
+def is_llm_failure(msg) -> bool:
+    """Whether `msg` is missing or one of get_llm_response's "[LLM ..." failure markers."""
+    return not isinstance(msg, str) or not msg.strip() or msg.lstrip().startswith("[LLM")
+
+
+def address_patient(name, msg):
+    """Outgoing text "Kak <first_name> <message>", without doubling 'Kak' if the name already has it."""
+    cleaned_name = (name or "Kak").strip()
+    first_name = cleaned_name.split()[0] if cleaned_name else "Kak"
+    if first_name.lower().startswith("kak"):
+        return f"{cleaned_name} {msg}"
+    return f"Kak {first_name} {msg}"
+
+
+def birthday_text(name, msg):
+    """Outgoing birthday text: `msg` addressed to the patient, or BIRTHDAY_TEMPLATE if the LLM failed."""
+    if not is_llm_failure(msg):
+        return address_patient(name, msg)
+    words = (name or "").split()
+    if words and words[0].lower().startswith("kak"):
+        words = words[1:]
+    return BIRTHDAY_TEMPLATE.format(name=" ".join(["Kak"] + words[:1]))
+
+
+def _row_name_phone(row):
+    # Support multiple possible name column headers
+    name = row.get("Nama") or row.get("NAMA") or row.get("nama") or row.get("Name") or row.get("name") or "Kak"
+    # try common phone header names
+    phone = row.get("No. Whatsapp", row.get("No Whatsapp", row.get("No", "-")))
+    return name, phone
+
+
 def main():
     # Load treatment data for potential cross-sell in system prompt
-    prices_data = load_prices_data(PRICES_FILE) or []
+    prices_data = get_catalog(PRICES_FILE)
 
-    rows = load_csv(DATA_CSV)
-    if not rows:
+    if not os.path.exists(DATA_CSV):
         print("No data found in CSV.")
         return
 
-    # Update reminders in-memory (and write an inspection CSV)
-    update_birthday_reminders_for_today(rows, write_back_path="data/updated_leads.csv")
+    # Update the 'ULTAH HARI INI' flags in the inspection CSV (only what changed since the last run);
+    # it is for people to look at, recipients are not read back from it
+    refresh_reminders(DATA_CSV, "data/updated_leads.csv")
 
-    # Fetch rows where ULT AH REMINDER == 'ULTAH HARI INI'
-    rows = get_rows_where_column_equals(rows, "ULTAH REMINDER", "ULTAH HARI INI")
+    # Today's birthdays, from the lead store's (birth month, birth day) index
+    rows = open_lead_store(DATA_CSV).birthdays_on()
     if not rows:
         print("No birthdays today.")
         return
 
     print(f"Found {len(rows)} birthdays today. Generating messages...\n")
 
-    for row in rows:
-        # Support multiple possible name column headers
-        name = row.get("Nama") or row.get("NAMA") or row.get("nama") or row.get("Name") or row.get("name") or "Kak"
-        # try common phone header names
-        phone = row.get("No. Whatsapp", row.get("No Whatsapp", row.get("No", "-")))
-
-        # Build conversation for contextual LLM message
-        # Lazy import LLM helper to avoid importing heavy libs at module import time
+    names = [_row_name_phone(row)[0] for row in rows]
+    # Today's variant pool (BIRTHDAY_VARIANTS LLM calls per day, reused from disk afterwards)
+    pool = get_variant_pool(prices_data) if BIRTHDAY_VARIANTS > 0 else None
+    if pool is not None:
+        messages = pool.assign(_row_name_phone(row)[1] for row in rows)
+    else:
+        # Several patients per LLM request (BIRTHDAY_BATCH_SIZE); the LLM helper is imported lazily
+        # to avoid importing heavy libs at module import time
         try:
-            from .llm_manager import get_llm_response
-            messages = [{"role": "user", "content": build_birthday_prompt(name)}]
-            response = get_llm_response(messages, prices_data)
+            messages = generate_birthday_messages(names, prices_data)
+        except GenerationStopped as e:
+            print(f"LLM stopped, sending the greeting template to the rest: {e}")
+            messages = [e.messages.get(i) for i in range(len(names))]
         except Exception as e:
-            response = f"[LLM not available for testing: {e}] Hello {name}, selamat ulang tahun!"
+            print(f"LLM not available, sending the greeting template: {e}")
+            messages = [None] * len(names)
+    responses = [birthday_text(name, msg) for name, msg in zip(names, messages)]
+
+    for row, response in zip(rows, responses):
+        name, phone = _row_name_phone(row)
         print("==== Message ====")
         print(f"To: {phone} | Name: {name}")
         print(response)
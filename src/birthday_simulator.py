@@ -1,39 +1,41 @@
 import csv
+import os
 from datetime import datetime
 from pathlib import Path
 
-from .csv_manager import load_csv, update_birthday_reminders_for_today, get_rows_where_column_equals
-from .birthday_messenger import build_birthday_prompt
-from .data_loader import load_prices_data
+from .lead_store import open_lead_store
+from .birthday_messenger import (build_birthday_prompt, generate_birthday_messages, batch_stats, birthday_text,
+                                 GenerationStopped)
+from .birthday_variants import get_variant_pool
+from .catalog import get_catalog
+from .config import PRICES_FILE, CAMPAIGN_CONCURRENCY, CAMPAIGN_TARGET_TIMEOUT, BIRTHDAY_BATCH_SIZE, BIRTHDAY_VARIANTS
+from .campaign import run_campaign, TargetTimeout, OPENAI_BUCKET
+from .reminders import refresh_reminders
 from . import whatsapp_api
 
 # Use same CSV and prices paths as other scripts
 DATA_CSV = "data/Data Almeera - leads_pwt.csv"
-PRICES_FILE = "data/prices_august.json"
 REPORT_DIR = Path("outputs")
 REPORT_DIR.mkdir(parents=True, exist_ok=True)
 REPORT_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def run_simulation(write_report: bool = True):
-    rows = load_csv(DATA_CSV)
-    if not rows:
+def run_simulation(write_report: bool = True, concurrency: int = CAMPAIGN_CONCURRENCY,
+                   batch_size: int = BIRTHDAY_BATCH_SIZE, variants: int = BIRTHDAY_VARIANTS):
+    if not os.path.exists(DATA_CSV):
         print("No data loaded; ensure the CSV path is correct.")
         return
 
-    # Update reminders (writes an inspection CSV)
-    updated = update_birthday_reminders_for_today(rows, write_back_path=str(REPORT_DIR / "updated_leads.csv"))
+    # Update reminders in the inspection CSV (skipped if already done today)
+    updated = refresh_reminders(DATA_CSV, str(REPORT_DIR / "updated_leads.csv"))
     print(f"Updated {updated} rows (reminder flags).")
 
-    # Select today's birthdays
-    targets = get_rows_where_column_equals(rows, "ULTAH REMINDER", "ULTAH HARI INI")
+    # Select today's birthdays from the lead store's (month, day) index instead of rescanning every row
+    targets = open_lead_store(DATA_CSV).birthdays_on()
     print(f"Found {len(targets)} target(s) for today.")
 
-    # Load prices for contextual LLM (optional)
-    prices_data = load_prices_data(PRICES_FILE) or []
-
-    # Prepare report rows
-    report_rows = []
+    # Load prices for contextual LLM (optional); the catalog is shared with the system-prompt cache
+    prices_data = get_catalog(PRICES_FILE)
 
     # Lazy import LLM call here to allow safe operation even if OpenAI not configured
     try:
@@ -42,34 +44,63 @@ def run_simulation(write_report: bool = True):
         get_llm_response = None
         print(f"LLM manager not available: {e}")
 
-    for r in targets:
+    def _target_name_phone(r):
         # Support multiple possible name column headers (case variations)
         name = r.get("Nama") or r.get("NAMA") or r.get("nama") or r.get("Name") or r.get("name") or "Kak"
         phone = r.get("No. Whatsapp", r.get("No Whatsapp", r.get("No", "-")))
-
-        # Build message via LLM if available, else simple template
-        msg = None
-        if get_llm_response:
+        return name, phone
+
+    def _rate_limited_llm(*args, **kwargs):
+        # Like CampaignContext.llm: no call without a token (variant and batch generation catch this)
+        if not OPENAI_BUCKET.acquire(timeout=CAMPAIGN_TARGET_TIMEOUT):
+            raise TargetTimeout("timed out waiting for OpenAI rate limit")
+        return get_llm_response(*args, timeout=CAMPAIGN_TARGET_TIMEOUT, **kwargs)
+
+    pregenerated = {}
+    # Variant pool: `variants` generic messages per day, assigned by phone number; the cached
+    # pool keeps campaigns going when OpenAI is unreachable
+    pool = None
+    if variants > 0 and targets:
+        pool = get_variant_pool(prices_data, n=variants, llm=_rate_limited_llm if get_llm_response else None)
+        if pool is not None:
+            assigned = pool.assign(_target_name_phone(r)[1] for r in targets)
+            pregenerated = {id(r): m for r, m in zip(targets, assigned)}
+
+    # Batch mode: generate all messages up front, `batch_size` patients per LLM request
+    if pool is None and get_llm_response and batch_size > 1 and targets:
+        try:
+            names = [_target_name_phone(r)[0] for r in targets]
+            messages = generate_birthday_messages(names, prices_data, batch_size, llm=_rate_limited_llm)
+            pregenerated = {id(r): m for r, m in zip(targets, messages)}
+            print(f"Batch generation: {batch_stats()}")
+        except GenerationStopped as e:
+            # Keep what was generated; the remaining targets get per-target calls
+            pregenerated = {id(targets[i]): m for i, m in e.messages.items()}
+            print(f"[BATCH] Batch generation stopped, {len(targets) - len(pregenerated)} target(s) "
+                  f"fall back to per-target calls: {e}")
+        except Exception as e:
+            print(f"[BATCH] Batch generation failed, falling back to per-target calls: {e}")
+
+    def _process_target(r, ctx):
+        name, phone = _target_name_phone(r)
+
+        # Build message via LLM if available (unless batch generation already failed for this target)
+        msg = pregenerated.get(id(r))
+        if id(r) not in pregenerated and get_llm_response:
             try:
                 user_msg = build_birthday_prompt(name)
                 messages = [{"role": "user", "content": user_msg}]
-                msg = get_llm_response(messages, prices_data)
+                msg = ctx.llm(get_llm_response, messages, prices_data)
             except Exception as e:
-                msg = f"[LLM Error] Selamat ulang tahun, {name}!"
-        else:
-            msg = f"Selamat ulang tahun, Kak {name}! Semoga hari istimewa ini menyenangkan."
-
-        # Build outgoing text that will actually be sent/printed: "Kak <first_name> <message>"
-        # Avoid duplicating 'Kak' if the name already begins with it
-        cleaned_name = (name or "Kak").strip()
-        first_name = cleaned_name.split()[0] if cleaned_name else "Kak"
-        if first_name.lower().startswith("kak"):
-            outgoing_text = f"{cleaned_name} {msg}"
-        else:
-            outgoing_text = f"Kak {first_name} {msg}"
+                print(f"[LLM Error] {name}: {e}")
+                msg = None
+
+        # Build outgoing text that will actually be sent/printed: "Kak <first_name> <message>",
+        # or the local greeting template when the LLM failed
+        outgoing_text = birthday_text(name, msg)
 
         # Simulate send via whatsapp_api (function will print SIMULATED if no token is set)
-        sent_ok, resp = whatsapp_api.send_text_message(phone, outgoing_text)
+        sent_ok, resp = ctx.send(whatsapp_api.send_text_message, phone, outgoing_text)
 
         # If the whatsapp api returned a simulated-send message, mark the report clearly
         sent_field = None
@@ -81,15 +112,33 @@ def run_simulation(write_report: bool = True):
         except Exception:
             sent_field = str(sent_ok)
 
-        report_rows.append({
+        return {
             "Timestamp": datetime.now().isoformat(),
             "Nama": name,
             "Phone": phone,
-            "Message": msg,
+            "Message": msg or "",
             "OutgoingMessage": outgoing_text,
             "Sent": sent_field,
             "SendResponse": resp,
-        })
+        }
+
+    def _failed_target(r, exc):
+        name, phone = _target_name_phone(r)
+        return {
+            "Timestamp": datetime.now().isoformat(),
+            "Nama": name,
+            "Phone": phone,
+            "Message": "",
+            "OutgoingMessage": "",
+            "Sent": "TIMEOUT" if isinstance(exc, TargetTimeout) else "ERROR",
+            "SendResponse": str(exc),
+        }
+
+    # Generation and sending overlap across targets; report rows keep the target order
+    report_rows, summary = run_campaign(targets, _process_target, concurrency=concurrency, on_error=_failed_target)
+    print(f"Campaign: {summary['targets']} target(s) in {summary['wall_clock_s']}s "
+          f"({summary['throughput_per_s']}/s, concurrency={summary['concurrency']}, "
+          f"ok={summary['ok']}, failed={summary['failed']}, timeouts={summary['timeouts']})")
 
     if write_report:
         report_path = REPORT_DIR / f"birthday_report_{datetime.now().strftime('%Y%m%d')}.csv"
@@ -0,0 +1,174 @@
+# birthday_variants.py
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from .catalog import as_catalog
+from .config import BIRTHDAY_VARIANTS, BIRTHDAY_VARIANTS_DIR
+from .phone import normalize_phone
+
+POOL_FORMAT = 1
+KEEP_POOLS = 7
+
+# One style per variant so the pool doesn't read like N copies of the same message
+VARIANT_STYLES = [
+    "hangat dan manis",
+    "ceria dengan beberapa emoji",
+    "elegan dan singkat",
+    "playful dan girly",
+    "penuh doa dan harapan baik",
+    "santai seperti sahabat dekat",
+    "mewah dan memanjakan",
+    "lembut dan menenangkan",
+]
+
+
+def build_variant_prompt(style: str) -> str:
+    return (
+        "Buatkan satu pesan ucapan ulang tahun singkat untuk pasien klinik kecantikan Almeera "
+        f"dengan gaya {style}. Jangan menyebut nama atau sapaan (\"Kak <nama>\" ditambahkan di depan pesan). "
+        "Gunakan Bahasa Indonesia yang girly, casual, elegan, dan hangat. "
+        "Ajak pasien untuk menikmati Birthday Treat di Almeera dengan nada lembut (tanpa memaksa). "
+        "Batasi 2-3 kalimat saja."
+    )
+
+
+class VariantPool:
+    """Generic birthday messages for one day and catalog version, assigned to recipients by phone."""
+
+    def __init__(self, day: str, version: str, variants: List[str]):
+        self.day = day
+        self.version = version
+        self.variants = variants
+
+    def assign(self, phones) -> List[str]:
+        """One variant per recipient, picked by hashing the phone number.
+
+        Recipients sharing a number (siblings on a family phone) get consecutive, different variants.
+        """
+        per_phone = {}
+        out = []
+        for phone in phones:
+            key = normalize_phone(phone) or str(phone)
+            k = per_phone.get(key, 0)
+            per_phone[key] = k + 1
+            start = int(hashlib.sha256(f"{self.day}:{key}".encode("utf-8")).hexdigest()[:12], 16)
+            out.append(self.variants[(start + k) % len(self.variants)])
+        return out
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"format": POOL_FORMAT, "date": self.day, "version": self.version,
+                       "variants": self.variants}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["VariantPool"]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("format") != POOL_FORMAT or not data.get("variants"):
+            return None
+        return cls(data["date"], data["version"], data["variants"])
+
+
+def pool_path(directory: str, day: str, version: str) -> str:
+    return os.path.join(directory, f"{day}_{version}.json")
+
+
+def _pool_files(directory: str) -> List[str]:
+    """Pool files, newest day first (then most recently written)."""
+    def key(path):
+        try:
+            return os.path.basename(path)[:10], os.path.getmtime(path)
+        except OSError:
+            return os.path.basename(path)[:10], 0.0
+    return sorted(glob.glob(os.path.join(directory, "*.json")), key=key, reverse=True)
+
+
+def latest_pool(directory: str) -> Optional[VariantPool]:
+    """Most recent pool on disk, whatever its date or catalog version."""
+    for path in _pool_files(directory):
+        pool = VariantPool.load(path)
+        if pool is not None:
+            return pool
+    return None
+
+
+def _prune(directory: str, keep: int = KEEP_POOLS):
+    for path in _pool_files(directory)[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_variant_pool(prices_data, n: int = BIRTHDAY_VARIANTS, directory: str = BIRTHDAY_VARIANTS_DIR,
+                     day: str = None, refresh: bool = False, llm=None) -> Optional[VariantPool]:
+    """Today's pool for the current catalog version, generated with `n` LLM calls on first use.
+
+    If generation fails entirely (e.g. OpenAI unreachable) the most recent pool on disk is
+    reused; returns None only when there is none.
+    """
+    catalog = as_catalog(prices_data)
+    day = day or datetime.now().date().isoformat()
+    path = pool_path(directory, day, catalog.version)
+    if not refresh:
+        pool = VariantPool.load(path)
+        if pool is not None:
+            return pool
+
+    variants = []
+    try:
+        if llm is None:
+            from .llm_manager import get_llm_response as llm
+        for i in range(n):
+            style = VARIANT_STYLES[i % len(VARIANT_STYLES)]
+            reply = llm([{"role": "user", "content": build_variant_prompt(style)}], catalog)
+            # get_llm_response reports failures as "[LLM ...]" text
+            if reply and not reply.startswith("[LLM") and reply.strip() not in variants:
+                variants.append(reply.strip())
+    except Exception as e:
+        print(f"[VARIANTS] Generation failed: {e}")
+
+    if variants:
+        pool = VariantPool(day, catalog.version, variants)
+        pool.save(path)
+        _prune(directory)
+        print(f"[VARIANTS] Generated {len(variants)} birthday variants for {day} -> {path}")
+        return pool
+
+    pool = latest_pool(directory)
+    if pool is not None:
+        print(f"[VARIANTS] LLM unavailable, reusing {len(pool.variants)} variants from {pool.day}")
+    return pool
+
+
+def main():
+    from .catalog import get_catalog
+    from .config import PRICES_FILE
+
+    parser = argparse.ArgumentParser(description="Generate (or show) today's birthday message variant pool")
+    parser.add_argument("--refresh", action="store_true", help="regenerate even if today's pool exists")
+    parser.add_argument("-n", type=int, default=BIRTHDAY_VARIANTS, help="number of variants")
+    args = parser.parse_args()
+
+    pool = get_variant_pool(get_catalog(PRICES_FILE), n=max(1, args.n), refresh=args.refresh)
+    if pool is None:
+        print("No variant pool available.")
+        return
+    for i, text in enumerate(pool.variants):
+        print(f"[{i}] {text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# campaign.py
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import CAMPAIGN_CONCURRENCY, CAMPAIGN_TARGET_TIMEOUT, OPENAI_RATE_PER_SEC, GRAPH_API_RATE_PER_SEC
+from .rate_limit import TokenBucket
+
+# Shared by every campaign in this process so parallel runs stay under the provider limits
+OPENAI_BUCKET = TokenBucket(OPENAI_RATE_PER_SEC)
+GRAPH_API_BUCKET = TokenBucket(GRAPH_API_RATE_PER_SEC)
+
+
+class TargetTimeout(Exception):
+    """Raised inside a target's job when its per-target deadline has passed."""
+
+
+class CampaignContext:
+    """Handed to each target job: rate-limited wrappers that respect the target's deadline."""
+
+    def __init__(self, deadline: float, llm_bucket: TokenBucket, send_bucket: TokenBucket):
+        self.deadline = deadline
+        self.llm_bucket = llm_bucket
+        self.send_bucket = send_bucket
+
+    def remaining(self) -> float:
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TargetTimeout("per-target timeout exceeded")
+        return remaining
+
+    def llm(self, fn, *args, **kwargs):
+        if not self.llm_bucket.acquire(timeout=self.remaining()):
+            raise TargetTimeout("timed out waiting for OpenAI rate limit")
+        return fn(*args, timeout=self.remaining(), **kwargs)
+
+    def send(self, fn, *args, **kwargs):
+        if not self.send_bucket.acquire(timeout=self.remaining()):
+            raise TargetTimeout("timed out waiting for Graph API rate limit")
+        # Last chance to abort: once the send starts it is not interrupted
+        self.remaining()
+        return fn(*args, **kwargs)
+
+
+def run_campaign(targets, job, concurrency: int = CAMPAIGN_CONCURRENCY,
+                 timeout: float = CAMPAIGN_TARGET_TIMEOUT,
+                 llm_bucket: TokenBucket = None, send_bucket: TokenBucket = None,
+                 on_error=None):
+    """Run `job(target, ctx)` for every target on a bounded thread pool.
+
+    `job` does the LLM call via `ctx.llm(...)` and the send via `ctx.send(...)` so generation for
+    one target overlaps sending for others. Results keep the order of `targets`; a target that
+    fails or times out gets `on_error(target, exc)` (or None) in its slot.
+    Returns (results, summary).
+    """
+    targets = list(targets)
+    llm_bucket = llm_bucket or OPENAI_BUCKET
+    send_bucket = send_bucket or GRAPH_API_BUCKET
+    counts = {"ok": 0, "failed": 0, "timeouts": 0}
+
+    def _run_one(target):
+        ctx = CampaignContext(time.monotonic() + timeout, llm_bucket, send_bucket)
+        return job(target, ctx)
+
+    start = time.perf_counter()
+    results = [None] * len(targets)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="campaign") as pool:
+        futures = [pool.submit(_run_one, t) for t in targets]
+        for i, future in enumerate(futures):
+            try:
+                results[i] = future.result()
+                counts["ok"] += 1
+            except Exception as e:
+                counts["timeouts" if isinstance(e, TargetTimeout) else "failed"] += 1
+                print(f"[CAMPAIGN] Target {i} failed: {e}")
+                results[i] = on_error(targets[i], e) if on_error else None
+    elapsed = time.perf_counter() - start
+
+    summary = dict(counts,
+                   targets=len(targets),
+                   concurrency=max(1, concurrency),
+                   wall_clock_s=round(elapsed, 3),
+                   throughput_per_s=round(len(targets) / elapsed, 2) if elapsed > 0 else 0.0)
+    return results, summary
@@ -0,0 +1,91 @@
+# catalog.py
+
+import hashlib
+import json
+import os
+import threading
+
+from .retrieval import TreatmentIndex
+
+
+class Catalog:
+    """A loaded price list plus a content-hash version used to key derived caches."""
+
+    def __init__(self, data, version: str, path: str = None):
+        self.data = data
+        self.version = version
+        self.path = path
+        self._index = None
+
+    @property
+    def index(self) -> TreatmentIndex:
+        if self._index is None:
+            self._index = TreatmentIndex(self.data)
+        return self._index
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+
+_lock = threading.Lock()
+# path -> ((mtime_ns, size), Catalog)
+_CATALOGS = {}
+# id(raw data) -> (raw data, Catalog) for callers that still pass plain dicts
+_WRAPPED = {}
+
+
+def _version_of(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+def get_catalog(file_path: str) -> Catalog:
+    """Return the catalog for `file_path`, re-reading it only when the file changes.
+
+    Cheap enough (one stat) to call per request so edits to the price list are picked up.
+    """
+    try:
+        st = os.stat(file_path)
+        stamp = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        stamp = None
+
+    cached = _CATALOGS.get(file_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with _lock:
+        cached = _CATALOGS.get(file_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            data = json.loads(raw.decode('utf-8'))
+            print(f"✅ Loaded catalog {file_path} (version {_version_of(raw)})")
+        except FileNotFoundError:
+            print(f"⚠️  Warning: {file_path} not found, using empty list")
+            raw, data = b"", []
+        except Exception as e:
+            print(f"❌ Error loading {file_path}: {e}")
+            raw, data = b"", []
+        catalog = Catalog(data, _version_of(raw), file_path)
+        _CATALOGS[file_path] = (stamp, catalog)
+        return catalog
+
+
+def as_catalog(prices_data) -> Catalog:
+    """Wrap plain price data (e.g. from `load_prices_data`) in a Catalog, once per object."""
+    if isinstance(prices_data, Catalog):
+        return prices_data
+    cached = _WRAPPED.get(id(prices_data))
+    if cached is not None and cached[0] is prices_data:
+        return cached[1]
+    raw = json.dumps(prices_data, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    catalog = Catalog(prices_data, _version_of(raw))
+    with _lock:
+        _WRAPPED.clear()
+        _WRAPPED[id(prices_data)] = (prices_data, catalog)
+    return catalog
@@ -0,0 +1,125 @@
+# circuit_breaker.py
+
+import threading
+import time
+
+from .metrics import METRICS
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of making a call while the breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failed or slow calls (a success resets
+    the count); open fails fast for `reset_timeout` seconds; then half-open lets `half_open_probes`
+    calls through at a time: a good one closes the breaker, a failed or slow one reopens it.
+
+    Calls slower than `slow_call_seconds` (0 = never) count as failures even if they succeed.
+    A `failure_threshold` of 0 (or less) disables the breaker. Thread-safe and non-blocking, so it
+    can also be used from an event loop.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call_seconds: float = 0.0,
+                 reset_timeout: float = 30.0, half_open_probes: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = max(1, half_open_probes)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.counts = {"calls": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str):
+        self._state = state
+        self._probes = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+            self.counts["opened"] += 1
+        elif state == self.CLOSED:
+            self._failures = 0
+        print(f"[CIRCUIT] {self.name} {state}")
+        METRICS.inc("circuit_breaker_transitions_total", breaker=self.name, state=state)
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now. Every allowed call must be followed by `record`."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self.counts["rejected"] += 1
+        METRICS.inc("circuit_breaker_rejected_total", breaker=self.name)
+        return False
+
+    def record(self, ok: bool, seconds: float = 0.0):
+        """Outcome of an allowed call; `ok=None` for a call abandoned by the caller (e.g. cancelled)."""
+        if self.failure_threshold <= 0:
+            return
+        slow = bool(ok) and 0 < self.slow_call_seconds <= seconds
+        with self._lock:
+            if ok is None:
+                if self._state == self.HALF_OPEN:
+                    self._probes = max(0, self._probes - 1)
+                return
+            self.counts["calls"] += 1
+            self.counts["failures"] += not ok
+            self.counts["slow"] += slow
+            if self._state == self.HALF_OPEN:
+                self._transition(self.CLOSED if ok and not slow else self.OPEN)
+            elif self._state == self.CLOSED:
+                self._failures = 0 if ok and not slow else self._failures + 1
+                if self._failures >= self.failure_threshold:
+                    self._transition(self.OPEN)
+
+    def guard(self) -> "_Guarded":
+        """`with breaker.guard(): call()` raises CircuitOpenError instead of calling while open
+        and records the call's outcome and duration."""
+        return _Guarded(self)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts, state=self._current_state(time.monotonic()), consecutive_failures=self._failures,
+                        enabled=self.failure_threshold > 0)
+
+
+class _Guarded:
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.start = 0.0
+
+    def __enter__(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.breaker.name} circuit is open")
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.breaker.record(True, time.perf_counter() - self.start)
+        elif issubclass(exc_type, Exception):
+            self.breaker.record(False)
+        else:
+            # Cancellation says nothing about the service
+            self.breaker.record(None)
+        return False
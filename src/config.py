@@ -3,8 +3,104 @@
 import os
 from dotenv import load_dotenv
 
+# The only place .env is read; other modules import their settings from here
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_SHEETS_CREDENTIALS_PATH = os.getenv("GOOGLE_SHEETS_CREDENTIALS_PATH", "path/to/your/credentials.json")
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
+
+# Webhook processing: when enabled, POST /webhook only validates and enqueues
+# messages; a bounded worker pool does moderation, LLM and sending.
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "false").lower() == "true"
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+# Number of treatments retrieved into the LLM prompt per message; 0 sends the full catalog.
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+
+# Treatment price list shared by the server, chat loop and birthday scripts
+PRICES_FILE = os.getenv("PRICES_FILE", "data/prices_august.json")
+
+# WhatsApp Cloud API credentials and webhook verification
+WHATSAPP_TOKEN_ACCESS = os.getenv("WHATSAPP_TOKEN_ACCESS")
+PHONE_NUMBER = os.getenv("PHONE_NUMBER")  # WhatsApp Phone Number ID
+WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "verify_token_dev")
+WHATSAPP_APP_SECRET = os.getenv("WHATSAPP_APP_SECRET", "")
+
+# WhatsApp Graph API client: connection pool size and retry policy for 429/5xx
+WHATSAPP_GRAPH_API_BASE = os.getenv("WHATSAPP_GRAPH_API_BASE", "https://graph.facebook.com/v22.0")
+WHATSAPP_POOL_SIZE = int(os.getenv("WHATSAPP_POOL_SIZE", "10"))
+WHATSAPP_MAX_RETRIES = int(os.getenv("WHATSAPP_MAX_RETRIES", "3"))
+WHATSAPP_BACKOFF_BASE = float(os.getenv("WHATSAPP_BACKOFF_BASE", "0.5"))
+WHATSAPP_BACKOFF_MAX = float(os.getenv("WHATSAPP_BACKOFF_MAX", "30"))
+
+# Birthday campaigns: parallel targets, per-target deadline (s) and provider rate limits (req/s, 0 = off)
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", "4"))
+CAMPAIGN_TARGET_TIMEOUT = float(os.getenv("CAMPAIGN_TARGET_TIMEOUT", "60"))
+OPENAI_RATE_PER_SEC = float(os.getenv("OPENAI_RATE_PER_SEC", "5"))
+GRAPH_API_RATE_PER_SEC = float(os.getenv("GRAPH_API_RATE_PER_SEC", "20"))
+
+# Start moderation and reply generation together; the reply is discarded if moderation flags the message
+SPECULATIVE_MODERATION = os.getenv("SPECULATIVE_MODERATION", "false").lower() == "true"
+MODERATION_TIMEOUT = float(os.getenv("MODERATION_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+
+# Webhook load limits (per server process). Each sender gets SENDER_BURST messages, refilled at
+# SENDER_RATE_PER_MIN (0 = off); at most LLM_MAX_CONCURRENCY messages are moderated/answered at
+# once (0 = off). Once LLM_MAX_BACKLOG messages are waiting (for a slot or in the webhook queue),
+# or one has waited LLM_SLOT_WAIT seconds, it gets a short "Minra lagi ramai" reply instead.
+SENDER_RATE_PER_MIN = float(os.getenv("SENDER_RATE_PER_MIN", "10"))
+SENDER_BURST = float(os.getenv("SENDER_BURST", "5"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_BACKLOG = int(os.getenv("LLM_MAX_BACKLOG", "32"))
+LLM_SLOT_WAIT = float(os.getenv("LLM_SLOT_WAIT", "10"))
+
+# Circuit breaker shared by OpenAI chat and moderation calls (per process): opens after
+# OPENAI_BREAKER_FAILURES consecutive failed calls or calls slower than OPENAI_BREAKER_SLOW_SECONDS
+# (0 = off), fails fast for OPENAI_BREAKER_RESET seconds, then lets a probe call through.
+OPENAI_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_SLOW_SECONDS = float(os.getenv("OPENAI_BREAKER_SLOW_SECONDS", "15"))
+OPENAI_BREAKER_RESET = float(os.getenv("OPENAI_BREAKER_RESET", "30"))
+
+# Cache of LLM replies to repeated questions (SQLite file shared by worker processes; empty = memory only)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_DB = os.getenv("RESPONSE_CACHE_DB", "data/response_cache.sqlite3")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+
+# Conversation history per WhatsApp number
+SESSION_DB = os.getenv("SESSION_DB", "data/sessions.sqlite3")
+SESSION_MAX_ACTIVE = int(os.getenv("SESSION_MAX_ACTIVE", "1000"))
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", "1200"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "21600"))
+SESSION_PURGE_INTERVAL = float(os.getenv("SESSION_PURGE_INTERVAL", "600"))
+
+# Ignore webhook redeliveries of message IDs seen within DEDUP_TTL seconds (DEDUP_DB shares them across processes)
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "86400"))
+DEDUP_DB = os.getenv("DEDUP_DB", "")
+
+# SQLite copy of the leads CSV with indexes for campaign/reminder lookups (re-imported when the CSV changes)
+LEAD_DB = os.getenv("LEAD_DB", "data/leads.sqlite3")
+
+# Leads CSV used to recognise incoming WhatsApp senders as patients
+LEADS_FILE = os.getenv("LEADS_FILE", "data/Data Almeera - leads_pwt.csv")
+# Tell the LLM the matched patient's name and age (personalized replies bypass the response cache)
+PATIENT_CONTEXT = os.getenv("PATIENT_CONTEXT", "false").lower() == "true"
+
+# Birthday messages generated per LLM request (JSON output); 1 = one request per patient
+BIRTHDAY_BATCH_SIZE = int(os.getenv("BIRTHDAY_BATCH_SIZE", "10"))
+
+# Birthday variant pool: N generic messages generated once per day (per catalog version) and
+# assigned to recipients by phone number; 0 = generate per patient/batch instead
+BIRTHDAY_VARIANTS = int(os.getenv("BIRTHDAY_VARIANTS", "8"))
+BIRTHDAY_VARIANTS_DIR = os.getenv("BIRTHDAY_VARIANTS_DIR", "data/birthday_variants")
+
+# Prometheus metrics at GET /metrics. With METRICS_DIR set, each worker process writes its
+# values there (every METRICS_FLUSH_INTERVAL seconds) and /metrics reports the sum over all workers.
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+
+# Load the OpenAI SDK, HTTP session, catalog and patient index in a background thread once the
+# server is listening, instead of on the first webhook
+PREWARM = os.getenv("PREWARM", "true").lower() == "true"
@@ -1,6 +1,11 @@
+import calendar
 import csv
-from datetime import datetime
-from typing import List, Dict, Tuple, Optional
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
 
 
 def load_csv(file_path: str) -> List[Dict[str, str]]:
@@ -18,15 +23,47 @@ def load_csv(file_path: str) -> List[Dict[str, str]]:
         return []
 
 
-def save_csv(file_path: str, rows: List[Dict[str, str]]) -> bool:
+def iter_csv(file_path: str) -> Iterator[Dict[str, str]]:
+    """Yield rows one at a time: the same rows, in the same order, as `load_csv`."""
+    try:
+        with open(file_path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    except FileNotFoundError:
+        print(f"Warning: CSV file not found: {file_path}")
+
+
+def file_stamp(path: str) -> Optional[Dict[str, int]]:
+    """Size and mtime of `path` (None if missing), to tell whether a file changed since it was last read."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+@contextmanager
+def atomic_write(file_path: str):
+    """Open a temp file next to `file_path` for writing; it replaces `file_path` only once complete,
+    so readers never see a half-written file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), prefix='.tmp-', suffix='.csv')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            yield f
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_csv(file_path: str, rows: List[Dict[str, str]], fieldnames: Optional[List[str]] = None) -> bool:
     if not rows:
         print("No rows to write.")
         return False
     try:
-        # preserve field order from first row
-        fieldnames = list(rows[0].keys())
-        with open(file_path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
+        # preserve field order from first row unless a header is given; missing keys are written empty
+        fieldnames = fieldnames or list(rows[0].keys())
+        with atomic_write(file_path) as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, restval='')
             writer.writeheader()
             for r in rows:
                 writer.writerow(r)
@@ -37,21 +74,43 @@ def save_csv(file_path: str, rows: List[Dict[str, str]]) -> bool:
         return False
 
 
+_DOB_FORMATS = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%d %m %Y', '%d.%m.%Y')
+# Fast paths for the common shapes: DD/MM/YYYY (any of / - space .) and YYYY-MM-DD
+_DMY_RE = re.compile(r'(\d{1,2})([/\-. ])(\d{1,2})\2(\d{4})')
+_YMD_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+_NON_DIGIT_RE = re.compile(r'\D+')
+
+
+def _valid_date(y: int, m: int, d: int) -> bool:
+    return 1 <= m <= 12 and 1 <= d <= calendar.monthrange(y, m)[1]
+
+
 def _parse_dob(raw: str) -> Optional[Tuple[int, int]]:
     if not raw:
         return None
     raw = raw.strip()
+    m = _DMY_RE.fullmatch(raw)
+    if m:
+        d, mo, y = int(m.group(1)), int(m.group(3)), int(m.group(4))
+        if _valid_date(y, mo, d):
+            return mo, d
+        if m.group(2) == '/' and _valid_date(y, d, mo):
+            return d, mo
+    else:
+        m = _YMD_RE.fullmatch(raw)
+        if m:
+            y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
+            if _valid_date(y, mo, d):
+                return mo, d
     # Try common formats
-    formats = ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%m/%d/%Y', '%d %m %Y', '%d.%m.%Y')
-    for fmt in formats:
+    for fmt in _DOB_FORMATS:
         try:
             d = datetime.strptime(raw, fmt)
             return d.month, d.day
         except Exception:
             continue
     # Try split by non-digit
-    import re
-    parts = re.split(r'\D+', raw)
+    parts = _NON_DIGIT_RE.split(raw)
     if len(parts) >= 2:
         try:
             d = int(parts[0])
@@ -65,6 +124,25 @@ def _parse_dob(raw: str) -> Optional[Tuple[int, int]]:
     return None
 
 
+def row_birth_month_day(r: Dict[str, str],
+                        dob_field: str = 'Tanggal lahir',
+                        bulan_field: str = 'BULAN',
+                        tanggal_field: str = 'TANGGAL') -> Optional[Tuple[int, int]]:
+    """(month, day) of a lead's birthday from `dob_field`, else the separate BULAN/TANGGAL columns."""
+    parsed = _parse_dob(r.get(dob_field, ''))
+    if parsed:
+        return parsed
+    # fallback to separate columns
+    try:
+        b = r.get(bulan_field, '')
+        t = r.get(tanggal_field, '')
+        if b and t:
+            return int(b), int(t)
+    except Exception:
+        pass
+    return None
+
+
 def update_birthday_reminders_for_today(rows: List[Dict[str, str]],
                                         dob_field: str = 'Tanggal lahir',
                                         reminder_field: str = 'ULTAH REMINDER',
@@ -83,24 +161,7 @@ def update_birthday_reminders_for_today(rows: List[Dict[str, str]],
     updated = 0
 
     for r in rows:
-        mm = None
-        dd = None
-
-        raw = r.get(dob_field, '')
-        parsed = _parse_dob(raw)
-        if parsed:
-            mm, dd = parsed
-
-        # fallback to separate columns
-        if (mm is None or dd is None):
-            try:
-                b = r.get(bulan_field, '')
-                t = r.get(tanggal_field, '')
-                if b and t:
-                    mm = int(b)
-                    dd = int(t)
-            except Exception:
-                pass
+        mm, dd = row_birth_month_day(r, dob_field, bulan_field, tanggal_field) or (None, None)
 
         target = 'ULTAH HARI INI' if (mm == today_m and dd == today_d) else ''
         current = r.get(reminder_field, '')
@@ -109,23 +170,98 @@ def update_birthday_reminders_for_today(rows: List[Dict[str, str]],
             updated += 1
 
     if write_back_path:
-        # ensure all rows have same keys (add missing header keys if needed)
-        # collect union of keys
-        all_keys = []
-        for r in rows:
-            for k in r.keys():
-                if k not in all_keys:
-                    all_keys.append(k)
-        # normalize rows to include all keys
-        normalized = []
-        for r in rows:
-            nr = {k: (r.get(k, '') or '') for k in all_keys}
-            normalized.append(nr)
-        save_csv(write_back_path, normalized)
+        # union of keys in first-seen order; rows missing a key are written with ''
+        all_keys = list(dict.fromkeys(k for r in rows for k in r))
+        save_csv(write_back_path, rows, fieldnames=all_keys)
 
     print(f"Updated {updated} rows for birthday reminders (in-memory).")
     return updated
 
 
+def stream_birthday_reminders(src_path: str,
+                              dst_path: str,
+                              dob_field: str = 'Tanggal lahir',
+                              reminder_field: str = 'ULTAH REMINDER',
+                              bulan_field: str = 'BULAN',
+                              tanggal_field: str = 'TANGGAL',
+                              today: Optional[date] = None) -> int:
+    """Same flags as `update_birthday_reminders_for_today`, but read from `src_path` and written
+    to `dst_path` one row at a time, so memory does not grow with the file.
+
+    Columns are kept exactly as in the source (including repeated blank headers, which a
+    DictReader would collapse). `dst_path` is replaced atomically and may equal `src_path`.
+    Returns number of rows changed.
+    """
+    if not os.path.exists(src_path):
+        print(f"Warning: CSV file not found: {src_path}")
+        return 0
+    if os.path.getsize(src_path) == 0:
+        print(f"No rows in {src_path}.")
+        return 0
+    today = today or datetime.now().date()
+    updated = 0
+    total = 0
+    # The source is closed before the temp file replaces `dst_path` (which may be the source)
+    with atomic_write(dst_path) as dst, open(src_path, newline='', encoding='utf-8') as src:
+        reader = csv.reader(src)
+        header = next(reader)
+        if reminder_field not in header:
+            header.append(reminder_field)
+        # Last occurrence wins, as with DictReader
+        col = {name: i for i, name in enumerate(header)}
+        fields = [name for name in (dob_field, bulan_field, tanggal_field) if name in col]
+        reminder_col = col[reminder_field]
+
+        writer = csv.writer(dst)
+        writer.writerow(header)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < len(header):
+                row.extend([''] * (len(header) - len(row)))
+            md = row_birth_month_day({name: row[col[name]] for name in fields},
+                                     dob_field, bulan_field, tanggal_field)
+            target = 'ULTAH HARI INI' if md == (today.month, today.day) else ''
+            if row[reminder_col] != target:
+                row[reminder_col] = target
+                updated += 1
+            writer.writerow(row)
+            total += 1
+
+    print(f"Updated {updated} of {total} rows for birthday reminders -> {dst_path}")
+    return updated
+
+
+def rewrite_column(file_path: str, column: str, values: Dict[int, str]) -> int:
+    """Set `column` on the rows at the given 0-based positions and atomically rewrite `file_path`.
+
+    Other rows are copied through untouched. Returns number of cells changed.
+    """
+    changed = 0
+    with atomic_write(file_path) as dst, open(file_path, newline='', encoding='utf-8') as src:
+        reader = csv.reader(src)
+        header = next(reader)
+        col = {name: i for i, name in enumerate(header)}[column]
+        writer = csv.writer(dst)
+        writer.writerow(header)
+        i = 0
+        for row in reader:
+            if not row:
+                continue
+            if i in values:
+                if len(row) <= col:
+                    row.extend([''] * (col + 1 - len(row)))
+                if row[col] != values[i]:
+                    row[col] = values[i]
+                    changed += 1
+            writer.writerow(row)
+            i += 1
+    return changed
+
+
 def get_rows_where_column_equals(rows: List[Dict[str, str]], column_name: str, expected_value: str) -> List[Dict[str, str]]:
+    where = getattr(rows, 'where', None)
+    if where is not None:
+        # LeadStore: answered from an index on the column instead of a scan
+        return where(column_name, expected_value)
     return [r for r in rows if str(r.get(column_name, '')).strip() == str(expected_value).strip()]
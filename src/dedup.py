@@ -0,0 +1,90 @@
+# dedup.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MessageDeduplicator:
+    """Remembers WhatsApp message IDs for `ttl` seconds so redelivered webhooks are ignored.
+
+    The in-memory set is bounded by `max_entries`; with `db_path` the IDs are also recorded in
+    SQLite so every worker process sees the same history.
+    """
+
+    def __init__(self, ttl: float = 86400, db_path: str = None, max_entries: int = 100000):
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._seen = OrderedDict()  # message id -> first seen (insertion order == time order)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checked = 0
+        self.duplicates = 0
+
+    def _conn(self):
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS seen_messages (id TEXT PRIMARY KEY, seen_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_messages_at ON seen_messages (seen_at)")
+        conn.commit()
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _expire(self, now: float):
+        cutoff = now - self.ttl
+        while self._seen:
+            seen_at = next(iter(self._seen.values()))
+            if seen_at >= cutoff and len(self._seen) < self.max_entries:
+                break
+            self._seen.popitem(last=False)
+
+    def seen_before(self, message_id: str) -> bool:
+        """Record `message_id` and return True if it was already handled within the TTL."""
+        if not message_id:
+            return False
+        now = time.time()
+        with self._lock:
+            self.checked += 1
+            self._expire(now)
+            if message_id in self._seen:
+                self.duplicates += 1
+                return True
+            self._seen[message_id] = now
+
+        conn = self._conn()
+        if conn is not None:
+            try:
+                with conn:
+                    conn.execute("DELETE FROM seen_messages WHERE id = ? AND seen_at < ?", (message_id, now - self.ttl))
+                    inserted = conn.execute("INSERT OR IGNORE INTO seen_messages (id, seen_at) VALUES (?, ?)",
+                                            (message_id, now)).rowcount
+                    if self.checked % 1000 == 0:
+                        conn.execute("DELETE FROM seen_messages WHERE seen_at < ?", (now - self.ttl,))
+            except sqlite3.OperationalError as e:
+                # Busy database under load: answering a rare cross-process duplicate beats dropping the message
+                print(f"[DEDUP] Shared store unavailable ({e}), checked {message_id} in this process only")
+                return False
+            if not inserted:
+                # Handled by another worker process
+                with self._lock:
+                    self.duplicates += 1
+                return True
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "duplicates": self.duplicates,
+                "tracked": len(self._seen),
+                "ttl": self.ttl,
+                "db": self.db_path or None,
+            }
@@ -0,0 +1,206 @@
+# lead_store.py
+
+import argparse
+import calendar
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import LEAD_DB
+from .csv_manager import atomic_write, file_stamp, row_birth_month_day
+from .phone import normalize_phone
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    # id is the 0-based row position in the source CSV, as used by rewrite_column
+    "CREATE TABLE IF NOT EXISTS leads ("
+    " id INTEGER PRIMARY KEY, nomor_rm TEXT, phone TEXT, birth_month INTEGER, birth_day INTEGER,"
+    " data TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_leads_rm ON leads (nomor_rm)",
+    "CREATE INDEX IF NOT EXISTS idx_leads_phone ON leads (phone)",
+    "CREATE INDEX IF NOT EXISTS idx_leads_birthday ON leads (birth_month, birth_day)",
+)
+
+
+class LeadStore:
+    """Leads in SQLite, indexed by `Nomor RM`, normalized WhatsApp number and birth (month, day).
+
+    Each row keeps every CSV column (as a JSON object) so it can be returned as the same
+    dict `load_csv` would give and exported back to CSV.
+    """
+
+    def __init__(self, db_path: str = LEAD_DB, rm_field: str = 'Nomor RM', phone_field: str = 'No. Whatsapp'):
+        self.db_path = db_path
+        self.rm_field = rm_field
+        self.phone_field = phone_field
+        self._local = threading.local()
+        self._where_indexes = set()  # columns `where` has indexed
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def meta(self, key: str):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def columns(self) -> List[str]:
+        return self.meta("columns") or []
+
+    def import_csv(self, csv_path: str, **fields) -> int:
+        """Replace the store's contents with `csv_path`, streamed in one transaction. Returns rows imported."""
+        source = file_stamp(csv_path)
+        started = time.perf_counter()
+        conn = self._conn()
+        with open(csv_path, newline='', encoding='utf-8') as f, conn:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            columns = list(dict.fromkeys(header))
+            last = {name: i for i, name in enumerate(header)}  # repeated headers: last wins, as with DictReader
+
+            def records():
+                i = 0
+                for values in reader:
+                    if not values:
+                        continue
+                    row = {name: (values[j] if j < len(values) else '') for name, j in last.items()}
+                    month, day = row_birth_month_day(row, **fields) or (None, None)
+                    yield (i, row.get(self.rm_field, '').strip() or None, normalize_phone(row.get(self.phone_field, '')) or None,
+                           month, day, json.dumps(row, ensure_ascii=False))
+                    i += 1
+
+            conn.execute("DELETE FROM leads")
+            conn.executemany("INSERT INTO leads (id, nomor_rm, phone, birth_month, birth_day, data) VALUES (?, ?, ?, ?, ?, ?)",
+                             records())
+            count = conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("columns", json.dumps(columns, ensure_ascii=False)),
+                ("source", json.dumps(source)),
+                ("source_path", json.dumps(os.path.abspath(csv_path))),
+            ])
+        print(f"Imported {count} leads from {csv_path} into {self.db_path} in {time.perf_counter() - started:.2f}s")
+        return count
+
+    def export_csv(self, csv_path: str) -> int:
+        """Write every lead back out as CSV (atomically) for use in spreadsheets. Returns rows written."""
+        count = 0
+        with atomic_write(csv_path) as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns(), restval='', extrasaction='ignore')
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow(row)
+                count += 1
+        print(f"Exported {count} leads to {csv_path}")
+        return count
+
+    def _select(self, where: str = "", params=()) -> List[Dict[str, str]]:
+        cur = self._conn().execute(f"SELECT data FROM leads {where} ORDER BY id", params)
+        return [json.loads(data) for (data,) in cur]
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def rows(self) -> Iterator[Dict[str, str]]:
+        for (data,) in self._conn().execute("SELECT data FROM leads ORDER BY id"):
+            yield json.loads(data)
+
+    def get(self, row_id: int) -> Optional[Dict[str, str]]:
+        rows = self._select("WHERE id = ?", (row_id,))
+        return rows[0] if rows else None
+
+    def by_rm(self, nomor_rm: str) -> List[Dict[str, str]]:
+        return self._select("WHERE nomor_rm = ?", (str(nomor_rm).strip(),))
+
+    def by_phone(self, number: str) -> List[Dict[str, str]]:
+        """Leads with this WhatsApp number, in any format ('0812...', '+62 812-...', '62812...')."""
+        phone = normalize_phone(number)
+        return self._select("WHERE phone = ?", (phone,)) if phone else []
+
+    def birthday_ids(self, month: int, day: int) -> List[int]:
+        cur = self._conn().execute("SELECT id FROM leads WHERE birth_month = ? AND birth_day = ? ORDER BY id", (month, day))
+        return [row_id for (row_id,) in cur]
+
+    def birthdays_on(self, d: Optional[date] = None) -> List[Dict[str, str]]:
+        d = d or datetime.now().date()
+        return self._select("WHERE birth_month = ? AND birth_day = ?", (d.month, d.day))
+
+    def upcoming_birthdays(self, days: int, start: Optional[date] = None) -> List[Tuple[date, List[Dict[str, str]]]]:
+        """(date, leads) for each of the `days` days after `start` (default today, excluded) with birthdays.
+
+        Dates run on across the new year; in non-leap years 29 February birthdays fall on the 28th.
+        """
+        start = start or datetime.now().date()
+        result = []
+        for offset in range(1, days + 1):
+            d = start + timedelta(days=offset)
+            if (d.month, d.day) == (2, 28) and not calendar.isleap(d.year):
+                rows = self._select("WHERE birth_month = 2 AND birth_day IN (28, 29)")
+            else:
+                rows = self.birthdays_on(d)
+            if rows:
+                result.append((d, rows))
+        return result
+
+    def where(self, column: str, value: str) -> List[Dict[str, str]]:
+        """Same result as `get_rows_where_column_equals(rows, column, value)` (values compared stripped).
+
+        The first filter on a column adds an index on its stripped value, kept up to date by later imports.
+        """
+        path = f'$."{column}"'.replace("'", "''")
+        expr = f"trim(coalesce(json_extract(data, '{path}'), ''))"
+        if column not in self._where_indexes:
+            name = "idx_leads_where_" + hashlib.sha1(column.encode("utf-8")).hexdigest()[:12]
+            with self._conn() as conn:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON leads ({expr})")
+            self._where_indexes.add(column)
+        # Same expression text as the index, so SQLite uses it
+        return self._select(f"WHERE {expr} = ?", (str(value).strip(),))
+
+    def set_field(self, row_ids, column: str, value: str) -> int:
+        """Set `column` on the given rows. Returns rows changed."""
+        with self._conn() as conn:
+            return conn.executemany(
+                "UPDATE leads SET data = json_set(data, ?, ?) WHERE id = ? AND coalesce(json_extract(data, ?), '') != ?",
+                [(f'$."{column}"', value, i, f'$."{column}"', value) for i in row_ids]).rowcount
+
+
+def open_lead_store(csv_path: str, db_path: str = LEAD_DB) -> LeadStore:
+    """Open the store for `csv_path`, importing the CSV first if it changed since the last import."""
+    store = LeadStore(db_path)
+    if file_stamp(csv_path) != store.meta("source") or store.meta("source_path") != os.path.abspath(csv_path):
+        store.import_csv(csv_path)
+    return store
+
+
+def main():
+    from .reminders import DATA_CSV
+
+    parser = argparse.ArgumentParser(description="Import the leads CSV into SQLite or export it back to CSV")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("--csv", default=DATA_CSV, help="CSV to import from / export to")
+    parser.add_argument("--db", default=LEAD_DB)
+    args = parser.parse_args()
+
+    store = LeadStore(args.db)
+    if args.command == "import":
+        store.import_csv(args.csv)
+    else:
+        store.export_csv(args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,77 @@
 # llm_manager.py
 
-import os
-from dotenv import load_dotenv
-import openai
+import threading
+import time
+from .config import (
+    OPENAI_API_KEY, RETRIEVAL_TOP_K, OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_SLOW_SECONDS, OPENAI_BREAKER_RESET,
+)
+from .catalog import Catalog, as_catalog
+from .circuit_breaker import CircuitBreaker
+from .metrics import METRICS
+from .retrieval import select_relevant_treatments
 
-# Ensure .env is loaded so the OpenAI key from the project .env is picked up
-load_dotenv()
-
-# Create client lazily to avoid issues if OPENAI_API_KEY not present at import time
-_OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# The OpenAI SDK takes ~0.5s to import, so the client is built on first use (or by the
+# server's prewarm thread) rather than at import. Tests and benchmarks may assign `client`.
 client = None
-if _OPENAI_API_KEY:
-    try:
-        client = openai.OpenAI(api_key=_OPENAI_API_KEY)
-    except Exception as e:
-        print(f"Warning: failed to initialize OpenAI client: {e}")
+async_client = None
+_client_lock = threading.Lock()
+_client_failed = False
 
+# While OpenAI is down or very slow, calls fail at once instead of each waiting for its timeout
+OPENAI_BREAKER = CircuitBreaker("openai", OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_SLOW_SECONDS, OPENAI_BREAKER_RESET)
 
-def get_llm_response(messages, prices_data, model="gpt-4o-mini", temperature=0.7):
-    """Generates a response from the LLM based on the given conversation history.
-    """
-    system_message = f"""Anda adalah seorang asisten bot WhatsApp untuk klinik kecantikan Almeera. 
-Ini adalah daftar perawatan yang tersedia beserta deskripsi dan harganya: {prices_data}.
+# get_llm_response's result when no reply could be generated; callers test for the "[LLM" prefix
+LLM_UNAVAILABLE = "[LLM Unavailable] Selamat ulang tahun!"
+
+
+def get_client():
+    """The shared OpenAI client, created on first call; None without OPENAI_API_KEY."""
+    global client, _client_failed
+    if client is not None or _client_failed or not OPENAI_API_KEY:
+        return client
+    with _client_lock:
+        if client is None and not _client_failed:
+            try:
+                import openai
+                client = openai.OpenAI(api_key=OPENAI_API_KEY)
+            except Exception as e:
+                _client_failed = True
+                print(f"Warning: failed to initialize OpenAI client: {e}")
+    return client
 
+
+def get_async_client():
+    """The shared `AsyncOpenAI` client for the asyncio server (`server_async`); None without OPENAI_API_KEY."""
+    global async_client
+    if async_client is not None or not OPENAI_API_KEY:
+        return async_client
+    with _client_lock:
+        if async_client is None:
+            try:
+                import openai
+                async_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+            except Exception as e:
+                print(f"Warning: failed to initialize async OpenAI client: {e}")
+    return async_client
+
+
+def _retrieval_query(messages, turns: int = 2) -> str:
+    """Latest user messages joined, so follow-ups ("yang itu harganya?") still match the earlier topic."""
+    texts = []
+    for m in reversed(messages or []):
+        if m.get("role") == "user":
+            texts.append(str(m.get("content", "")))
+            if len(texts) >= turns:
+                break
+    return " ".join(reversed(texts))
+
+
+# Fixed instructions come first, then the catalog part. OpenAI only caches prompts of 1024+
+# tokens: the full-catalog prompt (~2.1k tokens) qualifies, but the usual retrieved prompt
+# (~550 tokens, see benchmarks/bench_retrieval.py) does not, so for it only the local reuse of
+# rendered prompts below helps. Sending the full catalog first to get the cache discount would
+# still cost more input tokens than retrieval saves.
+SYSTEM_INSTRUCTIONS = """Anda adalah seorang asisten bot WhatsApp untuk klinik kecantikan Almeera.
 Anda harus merespons dalam Bahasa Indonesia dengan gaya yang girly, casual, dan elegan.
 Ketika pasien menjelaskan keluhan kulit atau mencari perawatan, analisis keluhan mereka dengan cermat.
 Kemudian, rekomendasikan perawatan atau paket perawatan yang paling sesuai dari daftar yang diberikan.
@@ -32,26 +81,121 @@ Jika keluhan pasien tidak mengindikasikan tindakan spesifik, berikan informasi u
 Jaga agar respons Anda tetap ringkas, antara 3 hingga 5 kalimat, kecuali jika detail perawatan lengkap diminta.
 """
 
+_prompt_lock = threading.Lock()
+# catalog version -> rendered full-catalog system prompt
+_FULL_PROMPTS = {}
+# builds/reuses count the full-catalog prompt; retrieved counts prompts that reuse the
+# fixed instructions with a per-query treatment list appended
+PROMPT_CACHE_STATS = {"builds": 0, "reuses": 0, "retrieved": 0}
+
+
+def _full_catalog_prompt(catalog: Catalog) -> str:
+    with _prompt_lock:
+        prompt = _FULL_PROMPTS.get(catalog.version)
+        if prompt is not None:
+            PROMPT_CACHE_STATS["reuses"] += 1
+            return prompt
+        prompt = (f"{SYSTEM_INSTRUCTIONS}\n"
+                  f"Ini adalah daftar perawatan yang tersedia beserta deskripsi dan harganya: {catalog.data}.\n")
+        # Keep only the current catalog version
+        _FULL_PROMPTS.clear()
+        _FULL_PROMPTS[catalog.version] = prompt
+        PROMPT_CACHE_STATS["builds"] += 1
+        return prompt
+
+
+def prompt_cache_stats() -> dict:
+    with _prompt_lock:
+        return dict(PROMPT_CACHE_STATS, versions=list(_FULL_PROMPTS))
+
+
+def build_system_message(prices_data, query: str = "", top_k: int = RETRIEVAL_TOP_K) -> str:
+    """Builds the system prompt: fixed instructions followed by the catalog part.
+
+    Only the treatments relevant to `query` are included; the full catalog (rendered once
+    per catalog version) is used when retrieval is disabled (`top_k` <= 0) or nothing matches.
+    """
+    catalog = as_catalog(prices_data)
+    relevant = None
+    if query:
+        relevant = select_relevant_treatments(catalog.index, query, top_k) if top_k > 0 else None
+    if not relevant:
+        return _full_catalog_prompt(catalog)
+    with _prompt_lock:
+        PROMPT_CACHE_STATS["retrieved"] += 1
+    return (f"{SYSTEM_INSTRUCTIONS}\n"
+            f"Ini adalah perawatan yang paling relevan dengan pertanyaan pasien beserta deskripsi dan harganya: {relevant}.\n")
+
+
+FALLBACK_REPLY = "Maaf kak, Minra lagi ada gangguan sebentar 🙏 Coba kirim pertanyaannya lagi beberapa menit lagi ya ✨"
+
+
+def _rupiah(value) -> str:
+    return "Rp" + f"{int(value):,}".replace(",", ".")
+
+
+def fallback_reply(prices_data, query: str, top_k: int = 3) -> str:
+    """A reply built from the price list alone, for patients when no LLM answer is available:
+    the treatments matching `query` with their prices, or a short ask-again-later message."""
+    catalog = as_catalog(prices_data)
+    hits = catalog.index.search(query, top_k) if catalog and query else []
+    lines = []
+    for _, _, item in hits:
+        price, original = item.get("promo_price"), item.get("original_price")
+        if price is None:
+            price, original = original, None
+        if price is None:
+            lines.append(f"- {item['name']}")
+        elif original and original > price:
+            lines.append(f"- {item['name']}: {_rupiah(price)} (normal {_rupiah(original)})")
+        else:
+            lines.append(f"- {item['name']}: {_rupiah(price)}")
+    if not lines:
+        return FALLBACK_REPLY
+    return ("Maaf kak, Minra lagi ada gangguan jadi belum bisa jawab lengkap 🙏 Ini perawatan yang mungkin kakak cari:\n"
+            + "\n".join(lines) + "\nUntuk detail dan rekomendasinya, coba tanya Minra lagi sebentar lagi ya ✨")
+
+
+def get_llm_response(messages, prices_data, model="gpt-4o-mini", temperature=0.7, top_k=RETRIEVAL_TOP_K, timeout=None,
+                     response_format=None):
+    """Generates a response from the LLM based on the given conversation history.
+
+    `response_format` is passed through, e.g. {"type": "json_object"} for structured output.
+    """
+    system_message = build_system_message(prices_data, _retrieval_query(messages), top_k)
+
+    start = time.perf_counter()
     try:
-        if client is None:
+        openai_client = get_client()
+        if openai_client is None:
             raise RuntimeError("OpenAI client not configured. Set OPENAI_API_KEY in .env to enable real LLM calls.")
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "system", "content": system_message}] + messages,
-            temperature=temperature,
-        )
+        with OPENAI_BREAKER.guard():
+            response = openai_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "system", "content": system_message}] + messages,
+                temperature=temperature,
+                **({"timeout": timeout} if timeout is not None else {}),
+                **({"response_format": response_format} if response_format is not None else {}),
+            )
+        METRICS.observe("llm_request_seconds", time.perf_counter() - start, outcome="ok")
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error getting LLM response: {e}")
-        return f"[LLM Unavailable] Selamat ulang tahun!"
+        METRICS.observe("llm_request_seconds", time.perf_counter() - start, outcome="error")
+        METRICS.inc("llm_errors_total", call="chat", error=type(e).__name__)
+        return LLM_UNAVAILABLE
 
-def moderate_content(text):
+def moderate_content(text, timeout=None):
     """Checks content for moderation issues using OpenAI's moderation API."""
+    start = time.perf_counter()
     try:
-        if client is None:
+        openai_client = get_client()
+        if openai_client is None:
             raise RuntimeError("OpenAI client not configured. Set OPENAI_API_KEY in .env to enable moderation.")
-        response = client.moderations.create(input=text)
+        with OPENAI_BREAKER.guard():
+            response = openai_client.moderations.create(input=text, **({"timeout": timeout} if timeout is not None else {}))
+        METRICS.observe("moderation_request_seconds", time.perf_counter() - start, outcome="ok")
         moderation_output = response.results[0]
         if moderation_output.flagged:
             print("Content flagged by moderation API.")
@@ -60,4 +204,57 @@ def moderate_content(text):
             return False, "Content is clean."
     except Exception as e:
         print(f"Error during content moderation: {e}")
+        METRICS.observe("moderation_request_seconds", time.perf_counter() - start, outcome="error")
+        METRICS.inc("llm_errors_total", call="moderation", error=type(e).__name__)
+        return False, "Moderation service unavailable."
+
+
+async def aget_llm_response(messages, prices_data, model="gpt-4o-mini", temperature=0.7, top_k=RETRIEVAL_TOP_K,
+                            timeout=None, response_format=None):
+    """`get_llm_response` on the async OpenAI client: same prompt, result and fallback text."""
+    system_message = build_system_message(prices_data, _retrieval_query(messages), top_k)
+
+    start = time.perf_counter()
+    try:
+        openai_client = get_async_client()
+        if openai_client is None:
+            raise RuntimeError("OpenAI client not configured. Set OPENAI_API_KEY in .env to enable real LLM calls.")
+
+        with OPENAI_BREAKER.guard():
+            response = await openai_client.chat.completions.create(
+                model=model,
+                messages=[{"role": "system", "content": system_message}] + messages,
+                temperature=temperature,
+                **({"timeout": timeout} if timeout is not None else {}),
+                **({"response_format": response_format} if response_format is not None else {}),
+            )
+        METRICS.observe("llm_request_seconds", time.perf_counter() - start, outcome="ok")
+        return response.choices[0].message.content
+    except Exception as e:
+        print(f"Error getting LLM response: {e}")
+        METRICS.observe("llm_request_seconds", time.perf_counter() - start, outcome="error")
+        METRICS.inc("llm_errors_total", call="chat", error=type(e).__name__)
+        return LLM_UNAVAILABLE
+
+
+async def amoderate_content(text, timeout=None):
+    """`moderate_content` on the async OpenAI client."""
+    start = time.perf_counter()
+    try:
+        openai_client = get_async_client()
+        if openai_client is None:
+            raise RuntimeError("OpenAI client not configured. Set OPENAI_API_KEY in .env to enable moderation.")
+        with OPENAI_BREAKER.guard():
+            response = await openai_client.moderations.create(
+                input=text, **({"timeout": timeout} if timeout is not None else {}))
+        METRICS.observe("moderation_request_seconds", time.perf_counter() - start, outcome="ok")
+        moderation_output = response.results[0]
+        if moderation_output.flagged:
+            print("Content flagged by moderation API.")
+            return True, moderation_output.categories.model_dump_json(indent=2)
+        return False, "Content is clean."
+    except Exception as e:
+        print(f"Error during content moderation: {e}")
+        METRICS.observe("moderation_request_seconds", time.perf_counter() - start, outcome="error")
+        METRICS.inc("llm_errors_total", call="moderation", error=type(e).__name__)
         return False, "Moderation service unavailable."
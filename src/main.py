@@ -1,12 +1,11 @@
 # main.py
 
-from .config import OPENAI_API_KEY
-from .data_loader import load_prices_data
-import openai
+from .config import OPENAI_API_KEY, PRICES_FILE, SESSION_TOKEN_BUDGET
+from .session_store import SessionStore
+from .catalog import get_catalog
 # from .sheets_manager import get_google_sheet_client, open_spreadsheet, get_worksheet_data, append_row_to_worksheet, find_patient_by_rm_number, get_upcoming_treatments, get_upcoming_birthdays
-from .llm_manager import get_llm_response, moderate_content
+from .llm_manager import get_client, get_llm_response, moderate_content
 
-PRICES_FILE = "data/prices_august.json"
 # GOOGLE_SHEET_NAME = "WhatsApp Chatbot Data"
 # PATIENT_WORKSHEET_NAME = "Patients"
 # CONSULTATION_WORKSHEET_NAME = "Consultations"
@@ -17,10 +16,14 @@ def main():
         print("Error: OPENAI_API_KEY not found in .env file.")
         return
 
-    client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    if get_client() is None:
+        # OPENAI_API_KEY is set, so the SDK failed to import or build a client (warning above)
+        print("Error: OpenAI client could not be initialized; check that the openai package is installed "
+              "(pip install -r requirements.txt) and the warning above.")
+        return
     print("OpenAI client initialized.")
 
-    prices_data = load_prices_data(PRICES_FILE)
+    prices_data = get_catalog(PRICES_FILE)
     if prices_data:
         print(f"Successfully loaded {len(prices_data)} treatment prices.")
     else:
@@ -29,7 +32,8 @@ def main():
 
     # Temporary direct LLM interaction for testing
     print("\n--- LLM Chat Test ---")
-    messages = [] # Initialize conversation history
+    # Conversation history, trimmed to the same token budget as WhatsApp sessions
+    session = SessionStore(token_budget=SESSION_TOKEN_BUDGET)
 
     while True:
         user_input = input("You (type 'exit' to quit): ")
@@ -41,11 +45,11 @@ def main():
             print(f"Bot: Warning! Input contains inappropriate content: {categories}. Please rephrase.")
             continue
 
-        messages.append({"role": "user", "content": user_input}) # Add user message to history
+        messages = session.history("cli") + [{"role": "user", "content": user_input}]
 
         llm_response = get_llm_response(messages, prices_data)
         print("Bot:", llm_response)
-        messages.append({"role": "assistant", "content": llm_response}) # Add bot response to history
+        session.append("cli", user_input, llm_response) # Add exchange to history
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,198 @@
+# metrics.py
+
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from .config import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help). Only names listed here are exported.
+METRICS_HELP = {
+    "webhook_requests_total": ("counter", "POST /webhook requests by response status"),
+    "webhook_stage_seconds": ("histogram", "Time spent in each stage of POST /webhook"),
+    "message_handle_seconds": ("histogram", "Time to moderate, generate and send the reply to one message"),
+    "llm_request_seconds": ("histogram", "OpenAI chat completion calls made by get_llm_response"),
+    "moderation_request_seconds": ("histogram", "OpenAI moderation calls made by moderate_content"),
+    "whatsapp_send_seconds": ("histogram", "Graph API sends, including retries"),
+    "llm_errors_total": ("counter", "Failed OpenAI calls by call type"),
+    "fallback_replies_total": ("counter", "Replies sent without a generated answer, by reason"),
+    "whatsapp_simulated_sends_total": ("counter", "Sends simulated because WhatsApp credentials are missing"),
+    "whatsapp_send_errors_total": ("counter", "Graph API sends that failed after retries"),
+    "whatsapp_retries_total": ("counter", "Graph API requests retried after 429/5xx or connection errors"),
+    "messages_rate_limited_total": ("counter", "Messages dropped by the per-sender rate limit"),
+    "messages_shed_total": ("counter", "Messages given the busy reply instead of an LLM answer, by reason"),
+    "circuit_breaker_transitions_total": ("counter", "Circuit breaker state changes, by breaker and new state"),
+    "circuit_breaker_rejected_total": ("counter", "Calls refused without trying because the breaker was open"),
+}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+class Metrics:
+    """Counters and latency histograms for this process, rendered in Prometheus text format.
+
+    Updates are a dict lookup and a bucket increment under one lock. With `directory`, each
+    process also writes its values to `<directory>/<pid>.json` (at most every `flush_interval`
+    seconds) and `render` adds up every file there, so any worker can serve the totals for all
+    of them. Files of exited workers are kept so counters never go backwards; empty the
+    directory when the server (re)starts.
+    """
+
+    def __init__(self, directory: str = None, flush_interval: float = 1.0, buckets=DEFAULT_BUCKETS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._counters = {}
+        self._histograms = {}  # key -> [per-bucket counts (last is +Inf), sum, count]
+        self._pid = os.getpid()
+        self._last_flush = 0.0
+
+    def _check_fork(self):
+        # A forked worker starts from zero; the parent's values are in the parent's file
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._maybe_flush()
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._check_fork()
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            hist[0][i] += 1
+            hist[1] += seconds
+            hist[2] += 1
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._check_fork()
+            return {
+                "pid": self._pid,
+                "buckets": list(self.buckets),
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, list(labels), list(h[0]), h[1], h[2]] for (name, labels), h in self._histograms.items()],
+            }
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write this process's values to `<directory>/<pid>.json` (atomically)."""
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        snapshot = self.snapshot()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{snapshot['pid']}.json")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[METRICS] Could not write {self.directory}: {e}")
+
+    def collect(self):
+        """Snapshots of every process sharing `directory` (just this one without it)."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self) -> str:
+        """All processes' metrics in the Prometheus text exposition format."""
+        counters, histograms = {}, {}
+        for snap in self.collect():
+            if snap.get("buckets") != list(self.buckets):
+                continue
+            for name, labels, value in snap["counters"]:
+                key = _key(name, dict(labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, counts, total, count in snap["histograms"]:
+                key = _key(name, dict(labels))
+                merged = histograms.setdefault(key, [[0] * len(counts), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+
+        lines = []
+        for name, (kind, help_text) in METRICS_HELP.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (n, labels), value in sorted(counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            for (n, labels), (counts, total, count) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, c in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += c
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) and not float(value).is_integer() else str(int(value))
+
+
+def clear_metrics_dir(directory: str = METRICS_DIR):
+    """Remove per-process files left by a previous run (call once before starting workers)."""
+    for path in glob.glob(os.path.join(directory, "*.json")) if directory else []:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+METRICS = Metrics(METRICS_DIR or None, METRICS_FLUSH_INTERVAL)
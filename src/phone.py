@@ -0,0 +1,98 @@
+# phone.py
+
+import re
+import threading
+import time
+
+_NON_DIGIT_RE = re.compile(r'\D+')
+
+
+def normalize_phone(raw: str, country_code: str = "62") -> str:
+    """Indonesian WhatsApp numbers in the form the Graph API uses: '0812-2793 5875' -> '6281227935875'.
+
+    Returns '' for values that are not a plausible phone number.
+    """
+    digits = _NON_DIGIT_RE.sub('', raw or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if digits.startswith('0'):
+        digits = country_code + digits[1:]
+    elif digits.startswith('8'):
+        digits = country_code + digits
+    if len(digits) < 9 or len(digits) > 15:
+        return ''
+    return digits
+
+
+class PhoneIndex:
+    """Hash index from normalized WhatsApp number to a compact patient record.
+
+    Built once from the leads CSV; lookups are a dict access with no file reads. Numbers shared
+    by several leads (family phones) are kept in `ambiguous` instead, and look up as None: we
+    cannot tell which patient is writing, so replies to them are not personalized.
+    """
+
+    def __init__(self, records: dict = None, build_seconds: float = 0.0, ambiguous: set = None):
+        self.records = records or {}
+        self.build_seconds = build_seconds
+        self.ambiguous = ambiguous or set()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.ambiguous_lookups = 0
+        self._lookup_ns = 0
+
+    @classmethod
+    def build(cls, rows, phone_field: str = 'No. Whatsapp') -> "PhoneIndex":
+        start = time.perf_counter()
+        records = {}
+        ambiguous = set()
+        for r in rows:
+            phone = normalize_phone(r.get(phone_field, ''))
+            if not phone or phone in ambiguous:
+                continue
+            if phone in records:
+                del records[phone]
+                ambiguous.add(phone)
+                continue
+            records[phone] = {
+                "name": (r.get('NAMA') or r.get('Nama') or '').strip(),
+                "age": (r.get('UMUR') or '').strip(),
+                "rm": (r.get('Nomor RM') or '').strip(),
+                "birth_date": (r.get('Tanggal lahir') or '').strip(),
+            }
+        return cls(records, time.perf_counter() - start, ambiguous)
+
+    @classmethod
+    def from_csv(cls, csv_path: str, **kwargs) -> "PhoneIndex":
+        from .csv_manager import iter_csv
+        index = cls.build(iter_csv(csv_path), **kwargs)
+        print(f"✅ Indexed {len(index.records)} patient numbers from {csv_path} in {index.build_seconds * 1000:.0f}ms"
+              f" ({len(index.ambiguous)} shared by several leads, not personalized)")
+        return index
+
+    def lookup(self, number: str):
+        """Patient record for a sender such as '6281227935875', or None (also for shared numbers)."""
+        start = time.perf_counter_ns()
+        phone = normalize_phone(number)
+        record = self.records.get(phone)
+        elapsed = time.perf_counter_ns() - start
+        with self._lock:
+            self.lookups += 1
+            self.hits += record is not None
+            self.ambiguous_lookups += record is None and phone in self.ambiguous
+            self._lookup_ns += elapsed
+        return record
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.records),
+                "shared_numbers": len(self.ambiguous),
+                "ambiguous_lookups": self.ambiguous_lookups,
+                "build_ms": round(self.build_seconds * 1000, 1),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "avg_lookup_us": round(self._lookup_ns / self.lookups / 1000, 2) if self.lookups else 0.0,
+            }
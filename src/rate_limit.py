@@ -0,0 +1,189 @@
+# rate_limit.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+
+    A rate of 0 (or less) disables limiting.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take `tokens` if available right now; never blocks."""
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        """Block until `tokens` are available. Returns False if `timeout` seconds pass first."""
+        if self.rate <= 0:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class SenderLimiter:
+    """A `TokenBucket` per key (a WhatsApp number): `rate` messages per second, bursts of `burst`.
+
+    Buckets of the least recently seen keys are dropped beyond `max_keys`; a dropped key starts
+    again with a full bucket. A rate of 0 (or less) disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float = None, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max(1, max_keys)
+        self._buckets = OrderedDict()  # key -> [bucket, refused since last allowed]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def allow(self, key) -> tuple[bool, bool]:
+        """(allowed, first refusal): the second is True only for the first message refused
+        since this key was last allowed, so callers can tell the sender once per streak."""
+        if self.rate <= 0:
+            return True, False
+        with self._lock:
+            entry = self._buckets.pop(key, None)
+            if entry is None:
+                entry = [TokenBucket(self.rate, self.burst), False]
+            self._buckets[key] = entry
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            if entry[0].try_acquire():
+                entry[1] = False
+                self.allowed += 1
+                return True, False
+            first, entry[1] = not entry[1], True
+            self.limited += 1
+            return False, first
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.rate > 0, "rate_per_sec": self.rate, "burst": self.burst,
+                    "senders": len(self._buckets), "allowed": self.allowed, "limited": self.limited}
+
+
+class ConcurrencyLimit:
+    """At most `limit` callers inside at once, at most `max_waiting` queued for a slot.
+
+    `acquire` refuses at once (a shed) when the queue is already full, and after `timeout`
+    seconds of waiting. A limit of 0 (or less) disables it.
+    """
+
+    def __init__(self, limit: int, max_waiting: int = 0):
+        self.limit = limit
+        self.max_waiting = max(0, max_waiting)
+        self._cond = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.peak = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    def acquire(self, timeout: float = None) -> bool:
+        with self._cond:
+            if self.limit > 0 and self.active >= self.limit:
+                if self.waiting >= self.max_waiting:
+                    self.shed += 1
+                    return False
+                self.waiting += 1
+                try:
+                    if not self._cond.wait_for(lambda: self.active < self.limit, timeout):
+                        self.timeouts += 1
+                        return False
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            return True
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"limit": self.limit, "max_waiting": self.max_waiting, "active": self.active,
+                    "waiting": self.waiting, "peak": self.peak, "shed": self.shed, "timeouts": self.timeouts}
+
+
+class AsyncConcurrencyLimit(ConcurrencyLimit):
+    """`ConcurrencyLimit` for coroutines on one event loop (`server_async`)."""
+
+    def __init__(self, limit: int, max_waiting: int = 0):
+        super().__init__(limit, max_waiting)
+        self._waiters = deque()
+
+    async def acquire(self, timeout: float = None) -> bool:
+        if self.limit > 0 and (self.active >= self.limit or self._waiters):
+            if self.waiting >= self.max_waiting:
+                self.shed += 1
+                return False
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            self.waiting += 1
+            try:
+                # release() hands its slot straight to the first waiter
+                await asyncio.wait_for(waiter, timeout)
+                return True
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return False
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+            finally:
+                self.waiting -= 1
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        return True
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "max_waiting": self.max_waiting, "active": self.active,
+                "waiting": self.waiting, "peak": self.peak, "shed": self.shed, "timeouts": self.timeouts}
@@ -1,17 +1,88 @@
-from .csv_manager import load_csv, update_birthday_reminders_for_today, save_csv
+import json
+import os
+from datetime import date, datetime
+from typing import Optional
+
+from .config import LEAD_DB
+from .csv_manager import file_stamp, rewrite_column, stream_birthday_reminders
+from .lead_store import open_lead_store
 
 # Local CSV data file
 DATA_CSV = "data/Data Almeera - leads_pwt.csv"
+UPDATED_CSV = "data/updated_leads.csv"
+
+STATE_SUFFIX = ".reminders.json"
+STATE_FORMAT = 1
+
+
+def state_path_for(dst_path: str) -> str:
+    return dst_path + STATE_SUFFIX
+
+
+def _load_state(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if state.get("format") == STATE_FORMAT else {}
+
+
+def _save_state(path: str, state: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(dict(state, format=STATE_FORMAT), f)
+    os.replace(tmp, path)
+
+
+def refresh_reminders(src_path: str = DATA_CSV, dst_path: str = UPDATED_CSV, today: Optional[date] = None,
+                      lead_db: Optional[str] = None) -> int:
+    """Bring the `ULTAH REMINDER` flags in `dst_path` up to date for `today`.
+
+    A state file next to `dst_path` records the last run date, the source fingerprint and
+    which rows were flagged. Nothing is written when that all still matches; if only the date
+    moved on, yesterday's flags are cleared and today's set from the lead store's birthday index
+    (`lead_db`, default LEAD_DB) without re-evaluating other rows; otherwise the source is streamed through in full.
+    Returns number of rows changed.
+    """
+    today = today or datetime.now().date()
+    source = file_stamp(src_path)
+    if source is None:
+        print(f"Warning: CSV file not found: {src_path}")
+        return 0
+    state_path = state_path_for(dst_path)
+    state = _load_state(state_path)
+    output = file_stamp(dst_path)
+    flagged = open_lead_store(src_path, lead_db or LEAD_DB).birthday_ids(today.month, today.day)
+
+    reusable = state.get("source") == source and output is not None and state.get("output") == output
+    if reusable and state.get("date") == today.isoformat():
+        print(f"Reminders in {dst_path} already up to date for {today}.")
+        return 0
+    if reusable:
+        values = {i: '' for i in state.get("flagged", [])}
+        values.update({i: 'ULTAH HARI INI' for i in flagged})
+        updated = rewrite_column(dst_path, 'ULTAH REMINDER', values)
+        print(f"Updated {updated} rows for birthday reminders (incremental) -> {dst_path}")
+    else:
+        updated = stream_birthday_reminders(src_path, dst_path, today=today)
+
+    _save_state(state_path, {
+        "date": today.isoformat(),
+        "source": source,
+        "output": file_stamp(dst_path),
+        "flagged": flagged,
+    })
+    return updated
 
 
 def main():
-    rows = load_csv(DATA_CSV)
-    if not rows:
+    if not os.path.exists(DATA_CSV):
         print("No data loaded; ensure the CSV path is correct.")
         return
 
-    # Update in-memory and write an updated CSV for inspection
-    updated = update_birthday_reminders_for_today(rows, write_back_path="data/updated_leads.csv")
+    # Update only the flags that changed since the last run and write an updated CSV for inspection
+    updated = refresh_reminders(DATA_CSV, UPDATED_CSV)
     print(f"Done. Rows updated: {updated}")
 
 
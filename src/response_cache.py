@@ -0,0 +1,174 @@
+# response_cache.py
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Chat shorthand folded to one spelling so "hrg brp kak??" and "Harga berapa?" share a key
+SLANG = {
+    "brp": "berapa", "brapa": "berapa", "berapaan": "berapa",
+    "hrg": "harga", "hrga": "harga", "harganya": "harga",
+    "gk": "tidak", "ga": "tidak", "gak": "tidak", "nggak": "tidak", "enggak": "tidak", "engga": "tidak", "tdk": "tidak",
+    "yg": "yang", "dgn": "dengan", "utk": "untuk", "buat": "untuk", "sm": "sama", "aja": "saja",
+    "gmn": "bagaimana", "gimana": "bagaimana", "bgmn": "bagaimana",
+    "tp": "tapi", "krn": "karena", "klo": "kalau", "kalo": "kalau", "kl": "kalau",
+    "bs": "bisa", "udh": "sudah", "udah": "sudah", "sdh": "sudah", "blm": "belum",
+    "skrg": "sekarang", "skr": "sekarang", "msh": "masih", "jg": "juga", "dr": "dari",
+    "muka": "wajah", "jerawatan": "jerawat",
+}
+
+# Greetings and particles that don't change the question
+FILLERS = {
+    "halo", "hallo", "hai", "hi", "kak", "kakak", "ka", "sis", "min", "minra", "admin",
+    "dong", "deh", "sih", "nih", "ya", "yah", "kah", "lho", "loh", "nya", "mau", "tanya",
+    "pasien", "bertanya",
+}
+
+# Letters only: "1000000" and "10" are different prices
+_REPEAT_RE = re.compile(r"([a-z])\1{2,}")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_question(text: str) -> str:
+    """Case, whitespace, punctuation and common slang folded: 'Hrg facial acne brp kak??' -> 'harga facial acne berapa'."""
+    text = _REPEAT_RE.sub(r"\1", (text or "").lower())  # "promooo" -> "promo"
+    words = []
+    for w in _WORD_RE.findall(text):
+        w = SLANG.get(w, w)
+        if w not in FILLERS:
+            words.append(w)
+    return " ".join(words)
+
+
+class ResponseCache:
+    """LRU + TTL cache of LLM replies, optionally backed by SQLite shared across processes.
+
+    Keys combine the normalized question with the catalog version; entries from other
+    catalog versions are purged as soon as a new version is seen.
+    """
+
+    def __init__(self, db_path: str = None, max_entries: int = 1000, ttl: float = 86400):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (reply, created_at, gen_seconds)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._version = None
+        self.stats_counts = {"hits": 0, "memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "purges": 0}
+        self._saved_seconds = 0.0
+
+    def _conn(self):
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, version TEXT NOT NULL, question TEXT NOT NULL,"
+            " reply TEXT NOT NULL, created_at REAL NOT NULL, gen_seconds REAL NOT NULL)"
+        )
+        conn.commit()
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @staticmethod
+    def make_key(question: str, version: str) -> str:
+        return hashlib.sha256(f"{version}\x00{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+    def _check_version(self, version: str):
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            previous, self._version = self._version, version
+            self._memory.clear()
+        conn = self._conn()
+        if conn is not None:
+            with conn:
+                conn.execute("DELETE FROM responses WHERE version != ?", (version,))
+        if previous is not None:
+            with self._lock:
+                self.stats_counts["purges"] += 1
+            print(f"[CACHE] Catalog changed ({previous} -> {version}), dropped cached replies")
+
+    def get(self, question: str, version: str):
+        self._check_version(version)
+        key = self.make_key(question, version)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._memory.move_to_end(key)
+                self.stats_counts["hits"] += 1
+                self.stats_counts["memory_hits"] += 1
+                self._saved_seconds += entry[2]
+                return entry[0]
+            if entry is not None:
+                del self._memory[key]
+
+        conn = self._conn()
+        if conn is not None:
+            row = conn.execute(
+                "SELECT reply, created_at, gen_seconds FROM responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl),
+            ).fetchone()
+            if row is not None:
+                with self._lock:
+                    self._put_memory(key, row)
+                    self.stats_counts["hits"] += 1
+                    self.stats_counts["db_hits"] += 1
+                    self._saved_seconds += row[2]
+                return row[0]
+
+        with self._lock:
+            self.stats_counts["misses"] += 1
+        return None
+
+    def _put_memory(self, key, entry):
+        self._memory[key] = tuple(entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def set(self, question: str, version: str, reply: str, gen_seconds: float = 0.0):
+        self._check_version(version)
+        key = self.make_key(question, version)
+        entry = (reply, time.time(), gen_seconds)
+        with self._lock:
+            self._put_memory(key, entry)
+            self.stats_counts["stores"] += 1
+            prune = self.stats_counts["stores"] % 100 == 0
+        conn = self._conn()
+        if conn is not None:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, version, question, reply, created_at, gen_seconds)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, version, normalize_question(question), *entry),
+                )
+                if prune:
+                    # Keep the shared store bounded as well
+                    conn.execute(
+                        "DELETE FROM responses WHERE created_at < ? OR key NOT IN "
+                        "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+                        (time.time() - self.ttl, self.max_entries * 10),
+                    )
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats_counts["hits"] + self.stats_counts["misses"]
+            return dict(self.stats_counts,
+                        entries=len(self._memory),
+                        hit_rate=round(self.stats_counts["hits"] / lookups, 3) if lookups else 0.0,
+                        saved_ms=round(self._saved_seconds * 1000, 1),
+                        db=self.db_path or None,
+                        version=self._version)
@@ -0,0 +1,133 @@
+# retrieval.py
+
+import math
+import re
+from collections import Counter
+
+# Words that carry no signal for matching complaints to treatments
+STOPWORDS = {
+    "yang", "dan", "di", "ke", "dari", "untuk", "dengan", "ada", "apa", "ini", "itu", "saya", "aku",
+    "kak", "kakak", "min", "minra", "mau", "ingin", "bisa", "tidak", "gak", "ga", "nggak", "ya", "yaa",
+    "dong", "deh", "sih", "nih", "kah", "berapa", "harga", "harganya", "tolong", "boleh", "juga",
+    "atau", "pada", "karena", "jadi", "sudah", "udah", "lagi", "banget", "agar", "supaya", "kalau",
+    "pasien", "bertanya", "the", "and", "of", "a", "an", "to", "for", "in", "&",
+}
+
+# Everyday patient words mapped to the (often English) terms used in the price list
+SYNONYMS = {
+    "jerawat": ["acne"],
+    "jerawatan": ["acne", "jerawat"],
+    "keriput": ["kerutan", "aging"],
+    "kendur": ["kencang", "aging"],
+    "tua": ["aging", "penuaan"],
+    "putih": ["whitening", "brightening"],
+    "cerah": ["brightening"],
+    "kemerdekaan": ["independence"],
+    "merah": ["redness", "kemerahan"],
+    "berminyak": ["oily", "minyak"],
+    "glow": ["glowing"],
+    "bopeng": ["scar"],
+    "bekas": ["scar"],
+    "flek": ["pigmentasi"],
+    "botak": ["hairloss", "kebotakan"],
+}
+
+_SUFFIXES = ("nya", "kan", "an", "lah")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def iter_catalog_items(prices_data, path=()):
+    """Yield (category, item) for every treatment/product dict that has a `name`."""
+    if isinstance(prices_data, dict):
+        if "name" in prices_data:
+            yield (path[-1] if path else ""), prices_data
+            return
+        for key, value in prices_data.items():
+            yield from iter_catalog_items(value, path + (key,))
+    elif isinstance(prices_data, list):
+        for value in prices_data:
+            yield from iter_catalog_items(value, path)
+
+
+def _item_text(category: str, item: dict) -> str:
+    includes = item.get("includes") or []
+    if not isinstance(includes, list):
+        includes = [str(includes)]
+    return " ".join([
+        category.replace("_", " "),
+        str(item.get("name", "")),
+        str(item.get("name", "")),  # name counts double: it is what patients ask for
+        str(item.get("description", "")),
+        " ".join(str(i) for i in includes),
+    ])
+
+
+class TreatmentIndex:
+    """Okapi BM25 index over treatment name, description and includes."""
+
+    def __init__(self, prices_data, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.items = list(iter_catalog_items(prices_data))
+        self._tfs = []
+        self._lengths = []
+        df = Counter()
+        for category, item in self.items:
+            tokens = tokenize(_item_text(category, item))
+            tf = Counter(tokens)
+            self._tfs.append(tf)
+            self._lengths.append(len(tokens))
+            df.update(tf.keys())
+        n = len(self.items)
+        self._avg_len = (sum(self._lengths) / n) if n else 0.0
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def _expand(self, token: str) -> list:
+        terms = [token] + SYNONYMS.get(token, [])
+        if token not in self._idf:
+            # Strip common Indonesian suffixes ("jerawatnya", "kusaman") when the bare word is indexed
+            for suffix in _SUFFIXES:
+                if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+                    terms.append(token[:-len(suffix)])
+                    break
+        return terms
+
+    def search(self, query: str, k: int = 5) -> list:
+        """Return up to `k` (score, category, item) tuples with a positive score, best first."""
+        terms = {t for token in tokenize(query) for t in self._expand(token) if t in self._idf}
+        if not terms or k <= 0:
+            return []
+        scored = []
+        for i, tf in enumerate(self._tfs):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_len or 1))
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    score += self._idf[t] * f * (self.k1 + 1) / (f + norm)
+            if score > 0:
+                scored.append((score, i))
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [(score, self.items[i][0], self.items[i][1]) for score, i in scored[:k]]
+
+
+def select_relevant_treatments(index: TreatmentIndex, query: str, k: int = 5):
+    """Return the top-`k` treatments for `query` grouped by category.
+
+    `index` is normally the catalog's (`Catalog.index`). Returns None when nothing matches so
+    callers can fall back to the full catalog.
+    """
+    if k <= 0 or not index.items:
+        return None
+    hits = index.search(query, k)
+    if not hits:
+        return None
+    grouped = {}
+    for _, category, item in hits:
+        grouped.setdefault(category, []).append(item)
+    return grouped
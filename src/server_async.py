@@ -0,0 +1,337 @@
+# server_async.py
+
+import asyncio
+import datetime
+import json
+import os
+import threading
+import time
+import traceback
+
+from aiohttp import web
+
+from . import llm_manager
+from . import server_flask as shared
+from .catalog import get_catalog
+from .config import (
+    LLM_MAX_BACKLOG, LLM_MAX_CONCURRENCY, LLM_SLOT_WAIT, LLM_TIMEOUT, MODERATION_TIMEOUT, PATIENT_CONTEXT, PREWARM,
+    PRICES_FILE, SPECULATIVE_MODERATION, WEBHOOK_ASYNC,
+)
+from .llm_manager import (
+    OPENAI_BREAKER, aget_llm_response, amoderate_content, fallback_reply, get_async_client, prompt_cache_stats,
+)
+from .metrics import METRICS
+from .rate_limit import AsyncConcurrencyLimit
+from .server_flask import _SPECULATIVE_SAVED, SPECULATIVE_STATS, _speculative_lock
+from .whatsapp_api import asend_text_message, close_async_session, get_async_session
+
+# asyncio variant of server_flask with the same routes and replies. Moderation, the LLM and
+# Graph API sends are awaited on async clients, so one process holds as many conversations
+# waiting on I/O as there are open webhooks instead of one per thread. Conversation history,
+# the response cache, dedup and the patient index are the same objects server_flask uses.
+# They are SQLite-backed (or, for the patient index, may still have to read the leads CSV), so
+# every call into them runs on the default executor instead of stalling the loop.
+
+READY = threading.Event()
+# Messages currently being handled (awaiting moderation, the LLM or a send)
+IN_FLIGHT = {"now": 0, "peak": 0}
+_BACKGROUND = set()
+# Per-sender buckets are shared with server_flask; LLM slots are awaited on the loop
+LLM_LIMIT = AsyncConcurrencyLimit(LLM_MAX_CONCURRENCY, LLM_MAX_BACKLOG)
+
+
+async def health(request):
+    return web.json_response({
+        "status": "ok",
+        "message": "WhatsApp Bot Almeera is running",
+        "timestamp": str(datetime.datetime.now())
+    })
+
+
+async def ready(request):
+    if READY.is_set():
+        return web.json_response({"status": "ready", "pid": os.getpid()})
+    return web.json_response({"status": "starting", "pid": os.getpid()}, status=503)
+
+
+async def webhook_verify(request):
+    query = request.query
+    mode = query.get("hub.mode", query.get("mode", ""))
+    token = (query.get("hub.verify_token", query.get("token", "")) or "").strip()
+    challenge = query.get("hub.challenge", query.get("challenge", ""))
+    expected = (shared.VERIFY_TOKEN or "").strip()
+    print(f"[WEBHOOK VERIFY] mode={mode} recv_token_len={len(token)} env_token_len={len(expected)}")
+
+    if mode == "subscribe" and token == expected:
+        return web.Response(text=challenge, content_type="text/plain")
+    return web.Response(text="Forbidden", status=403)
+
+
+async def _generate_reply(text: str, history=(), cache_result: bool = True) -> str:
+    catalog = get_catalog(PRICES_FILE)
+    cache = shared.RESPONSE_CACHE
+    if cache is not None and not history:
+        cached = await asyncio.to_thread(cache.get, text, catalog.version)
+        if cached is not None:
+            print("[CACHE] Hit")
+            return cached
+
+    start = time.perf_counter()
+    messages = list(history) + [{"role": "user", "content": shared._user_content(text)}]
+    reply = await aget_llm_response(messages, catalog, timeout=LLM_TIMEOUT)
+    if cache_result:
+        await asyncio.to_thread(shared._cache_reply, text, history, reply, time.perf_counter() - start)
+    return reply
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - start
+
+
+async def _moderate_and_generate(text: str, history=()):
+    """`server_flask._moderate_and_generate` as two tasks on the loop; counted in the same stats."""
+    start = time.perf_counter()
+    # Not cached until moderation has cleared the message
+    llm_task = asyncio.ensure_future(_timed(_generate_reply(text, history, cache_result=False)))
+
+    try:
+        (flagged, _), mod_time = await asyncio.wait_for(
+            _timed(amoderate_content(text, timeout=MODERATION_TIMEOUT)), timeout=MODERATION_TIMEOUT + 1)
+    except asyncio.TimeoutError:
+        print(f"[MODERATION] Timed out after {MODERATION_TIMEOUT}s, continuing")
+        flagged, mod_time = False, time.perf_counter() - start
+        with _speculative_lock:
+            SPECULATIVE_STATS["moderation_timeouts"] += 1
+
+    if flagged:
+        llm_task.cancel()
+        with _speculative_lock:
+            SPECULATIVE_STATS["messages"] += 1
+            SPECULATIVE_STATS["discarded_replies"] += 1
+        return True, None
+
+    try:
+        reply, llm_time = await asyncio.wait_for(llm_task, timeout=max(0.0, LLM_TIMEOUT + 1 - (time.perf_counter() - start)))
+        await asyncio.to_thread(shared._cache_reply, text, history, reply, llm_time)
+    except asyncio.TimeoutError:
+        print(f"[LLM] Timed out after {LLM_TIMEOUT}s")
+        reply, llm_time = shared.LLM_TIMEOUT_REPLY, time.perf_counter() - start
+        with _speculative_lock:
+            SPECULATIVE_STATS["llm_timeouts"] += 1
+
+    saved = max(0.0, mod_time + llm_time - (time.perf_counter() - start))
+    with _speculative_lock:
+        SPECULATIVE_STATS["messages"] += 1
+        _SPECULATIVE_SAVED.append(saved)
+    print(f"[SPECULATIVE] moderation={mod_time * 1000:.0f}ms llm={llm_time * 1000:.0f}ms saved={saved * 1000:.0f}ms")
+    return False, reply
+
+
+async def _moderate_then_generate(text: str, history=()):
+    if SPECULATIVE_MODERATION:
+        return await _moderate_and_generate(text, history)
+    flagged, _ = await amoderate_content(text, timeout=MODERATION_TIMEOUT)
+    if flagged:
+        return True, None
+    return False, await _generate_reply(text, history)
+
+
+async def _send_busy_reply(from_number: str, reason: str):
+    print(f"[SHED] {reason}: busy reply to {from_number}")
+    METRICS.inc("messages_shed_total", reason=reason)
+    METRICS.inc("fallback_replies_total", reason="busy")
+    success, response = await asend_text_message(from_number, shared.BUSY_REPLY)
+    print(f"[SEND] Busy response - Success: {success}, Response: {response}")
+
+
+async def handle_message(msg: dict):
+    """Moderate, generate and send the reply for a single inbound message."""
+    IN_FLIGHT["now"] += 1
+    IN_FLIGHT["peak"] = max(IN_FLIGHT["peak"], IN_FLIGHT["now"])
+    try:
+        with METRICS.timer("message_handle_seconds", type="text" if msg.get("type") == "text" else "other"):
+            await _handle_message(msg)
+    finally:
+        IN_FLIGHT["now"] -= 1
+
+
+async def _handle_message(msg: dict):
+    from_number = msg.get("from")
+    msg_type = msg.get("type")
+    print(f"[MESSAGE] From: {from_number}, Type: {msg_type}")
+
+    if msg_type != "text":
+        print(f"[OTHER] Non-text message type: {msg_type}")
+        METRICS.inc("fallback_replies_total", reason="non_text")
+        success, response = await asend_text_message(from_number, "Minra terima pesannya yaa. Untuk saat ini, kirim teks dulu ya ✨")
+        print(f"[SEND] Other message response - Success: {success}, Response: {response}")
+        return
+
+    text = msg.get("text", {}).get("body", "")
+    print(f"[TEXT] Content: {text}")
+    history = await asyncio.to_thread(shared.SESSIONS.history, from_number)
+    patients = await asyncio.to_thread(shared._patients)
+    patient = patients.lookup(from_number)
+    if patient:
+        print(f"[PATIENT] Matched {patient['name']} (RM {patient['rm']})")
+        if PATIENT_CONTEXT:
+            history = [shared._patient_context(patient)] + history
+    if not await LLM_LIMIT.acquire(timeout=LLM_SLOT_WAIT):
+        await _send_busy_reply(from_number, "llm_backlog")
+        return
+    try:
+        flagged, reply = await _moderate_then_generate(text, history)
+    finally:
+        LLM_LIMIT.release()
+    if flagged:
+        print(f"[MODERATION] Message flagged as inappropriate")
+        METRICS.inc("fallback_replies_total", reason="moderation")
+        success, response = await asend_text_message(from_number, shared.MODERATION_REPLY)
+        print(f"[SEND] Moderation response - Success: {success}, Response: {response}")
+        return
+
+    print(f"[LLM] Reply: {reply}")
+    if reply and not reply.startswith("[LLM") and reply != shared.LLM_TIMEOUT_REPLY:
+        await asyncio.to_thread(shared.SESSIONS.append, from_number, shared._user_content(text), reply)
+    else:
+        METRICS.inc("fallback_replies_total", reason="llm_timeout" if reply == shared.LLM_TIMEOUT_REPLY else "llm_unavailable")
+        if reply != shared.LLM_TIMEOUT_REPLY:
+            reply = fallback_reply(get_catalog(PRICES_FILE), text)
+
+    success, response = await asend_text_message(from_number, reply)
+    print(f"[SEND] LLM response - Success: {success}, Response: {response}")
+
+
+async def _handle_in_background(msg: dict):
+    try:
+        await handle_message(msg)
+    except Exception as e:
+        print(f"[ERROR] Exception handling message {msg.get('id')}: {e}")
+        traceback.print_exc()
+
+
+async def webhook_receive(request):
+    start = time.perf_counter()
+    raw = await request.read()
+    sig = request.headers.get("X-Hub-Signature-256", "")
+    with METRICS.timer("webhook_stage_seconds", stage="signature"):
+        valid = shared.verify_signature(raw, sig)
+    if not valid:
+        METRICS.inc("webhook_requests_total", status="401")
+        return web.Response(text="Invalid signature", status=401)
+
+    with METRICS.timer("webhook_stage_seconds", stage="parse"):
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            payload = {}
+    print(f"[WEBHOOK POST] Received payload: {payload}")
+
+    try:
+        for msg in shared.iter_messages(payload):
+            # Meta redelivers events it thinks we missed; each message ID is handled once
+            with METRICS.timer("webhook_stage_seconds", stage="dedup"):
+                duplicate = await asyncio.to_thread(shared.DEDUP.seen_before, msg.get("id"))
+            if duplicate:
+                print(f"[DEDUP] Skipping already handled message {msg.get('id')}")
+                continue
+            allowed, notify = shared.SENDER_LIMIT.allow(msg.get("from"))
+            if not allowed:
+                print(f"[LIMIT] {msg.get('from')} over {shared.SENDER_LIMIT.rate * 60:g} messages/min, dropping {msg.get('id')}")
+                METRICS.inc("messages_rate_limited_total")
+                if notify:
+                    await asend_text_message(msg.get("from"), shared.SLOW_DOWN_REPLY)
+                continue
+            if WEBHOOK_ASYNC:
+                # Acknowledge now; the task keeps running on the loop after the response
+                task = asyncio.ensure_future(_handle_in_background(msg))
+                _BACKGROUND.add(task)
+                task.add_done_callback(_BACKGROUND.discard)
+                continue
+            with METRICS.timer("webhook_stage_seconds", stage="handle"):
+                await handle_message(msg)
+    except Exception as e:
+        print(f"[ERROR] Exception in webhook processing: {e}")
+        traceback.print_exc()
+
+    METRICS.observe("webhook_stage_seconds", time.perf_counter() - start, stage="total")
+    METRICS.inc("webhook_requests_total", status="200")
+    return web.json_response({"status": "ok"})
+
+
+def _stats() -> dict:
+    return {
+        "server": "async",
+        "webhook_async": WEBHOOK_ASYNC,
+        "in_flight": dict(IN_FLIGHT, background_tasks=len(_BACKGROUND)),
+        "prompt_cache": prompt_cache_stats(),
+        "speculative": shared.speculative_stats(),
+        "response_cache": shared.RESPONSE_CACHE.stats() if shared.RESPONSE_CACHE is not None else {"enabled": False},
+        "sessions": shared.SESSIONS.stats(),
+        "dedup": shared.DEDUP.stats(),
+        "patients": shared._patients().stats(),
+        "limits": {"sender": shared.SENDER_LIMIT.stats(), "llm": LLM_LIMIT.stats(), "backlog": LLM_LIMIT.waiting},
+        "openai_breaker": OPENAI_BREAKER.stats(),
+    }
+
+
+async def stats(request):
+    return web.json_response(await asyncio.to_thread(_stats))
+
+
+async def metrics(request):
+    """Prometheus scrape endpoint (reads every worker's file when METRICS_DIR is set)."""
+    body = await asyncio.to_thread(METRICS.render)
+    return web.Response(body=body.encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4"})
+
+
+async def prewarm():
+    """Shared data on a worker thread, then the async OpenAI client and Graph API session on the loop."""
+    start = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, shared.load_shared_data)
+    get_async_client()
+    await get_async_session()
+    READY.set()
+    print(f"[PREWARM] Ready in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+async def _on_startup(app):
+    if PREWARM:
+        app["prewarm"] = asyncio.ensure_future(prewarm())
+    else:
+        READY.set()
+
+
+async def _on_cleanup(app):
+    if _BACKGROUND:
+        await asyncio.gather(*_BACKGROUND, return_exceptions=True)
+    await close_async_session()
+    if llm_manager.async_client is not None:
+        await llm_manager.async_client.close()
+        llm_manager.async_client = None
+
+
+def create_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/", health)
+    app.router.add_get("/ready", ready)
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/metrics", metrics)
+    app.router.add_get("/webhook", webhook_verify)
+    app.router.add_post("/webhook", webhook_receive)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def serve(host: str = "0.0.0.0", port: int = 8080):
+    web.run_app(create_app(), host=host, port=port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 8080))
+    print(f"🚀 Starting async server on port {port}")
+    print(f"📡 Server will be available at: http://0.0.0.0:{port}")
+    serve(port=port)
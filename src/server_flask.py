@@ -2,24 +2,111 @@ import os
 import hmac
 import hashlib
 import datetime
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from flask import Flask, request, jsonify, Response
-from .llm_manager import get_llm_response, moderate_content
-from .data_loader import load_prices_data
-from .whatsapp_api import send_text_message
+from .llm_manager import (
+    LLM_UNAVAILABLE, OPENAI_BREAKER, fallback_reply, get_client, get_llm_response, moderate_content, prompt_cache_stats,
+)
+from .catalog import get_catalog
+from .whatsapp_api import get_session, send_text_message
+from .webhook_queue import WebhookQueue, summarize_ms
+from .config import (
+    WEBHOOK_ASYNC, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE, PRICES_FILE,
+    SPECULATIVE_MODERATION, MODERATION_TIMEOUT, LLM_TIMEOUT,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_DB, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES,
+    SESSION_DB, SESSION_MAX_ACTIVE, SESSION_TOKEN_BUDGET, SESSION_IDLE_TTL, SESSION_PURGE_INTERVAL,
+    DEDUP_TTL, DEDUP_DB, LEADS_FILE, PATIENT_CONTEXT,
+    WHATSAPP_VERIFY_TOKEN, WHATSAPP_APP_SECRET, PREWARM,
+    SENDER_RATE_PER_MIN, SENDER_BURST, LLM_MAX_CONCURRENCY, LLM_MAX_BACKLOG, LLM_SLOT_WAIT,
+)
+from .dedup import MessageDeduplicator
+from .metrics import METRICS
+from .phone import PhoneIndex
+from .rate_limit import ConcurrencyLimit, SenderLimiter
+from .response_cache import ResponseCache
+from .session_store import SessionStore
 
 
 app = Flask(__name__)
-VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "verify_token_dev")
-APP_SECRET = os.getenv("WHATSAPP_APP_SECRET", "")
-# Load prices data with fallback
-try:
-    PRICES = load_prices_data("data/prices_august.json")
-    if not PRICES:
+VERIFY_TOKEN = WHATSAPP_VERIFY_TOKEN
+APP_SECRET = WHATSAPP_APP_SECRET
+# Sender number -> patient record, built once (by prewarm or the first message) so the
+# request path never reads the leads file
+PATIENTS = None
+_patients_lock = threading.Lock()
+
+
+def _patients() -> PhoneIndex:
+    global PATIENTS
+    if PATIENTS is None:
+        with _patients_lock:
+            if PATIENTS is None:
+                PATIENTS = PhoneIndex.from_csv(LEADS_FILE)
+    return PATIENTS
+
+
+# Set once this process has loaded its data and clients; reported by GET /ready
+READY = threading.Event()
+
+
+def load_shared_data(reload: bool = False):
+    """Load the price catalog with its retrieval index, the patient index and the OpenAI and
+    requests modules (not their clients, which hold sockets and stay per process).
+
+    Under gunicorn (`gunicorn.conf.py`) this runs in the master before workers are forked, so
+    every worker shares one copy of it copy-on-write; `reload` re-reads the leads file on HUP.
+    """
+    global PATIENTS
+    catalog = get_catalog(PRICES_FILE)
+    if not catalog:
         print("⚠️  No prices data loaded, using empty list")
-        PRICES = []
-except Exception as e:
-    print(f"❌ Error loading prices data: {e}")
-    PRICES = []
+    catalog.index
+    if reload:
+        patients = PhoneIndex.from_csv(LEADS_FILE)
+        with _patients_lock:
+            PATIENTS = patients
+    else:
+        _patients()
+    import openai  # noqa: F401
+    import requests  # noqa: F401
+
+
+def prewarm():
+    """Load what the first webhook would otherwise wait for (shared data plus this process's
+    OpenAI client and Graph API session), then mark the process ready."""
+    start = time.perf_counter()
+    load_shared_data()
+    get_client()
+    get_session()
+    READY.set()
+    print(f"[PREWARM] Ready in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+def start_prewarm():
+    """Run `prewarm` on a background thread (call once the server is listening).
+
+    With PREWARM=false everything loads on first use and the process reports ready at once.
+    """
+    if not PREWARM:
+        READY.set()
+        return None
+    thread = threading.Thread(target=prewarm, name="prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def serve(host: str = "0.0.0.0", port: int = 8080, debug: bool = False):
+    """Development/single-process server: binds the port first, then prewarms in the background."""
+    if debug:
+        app.run(host=host, port=port, debug=True)
+        return
+    from werkzeug.serving import make_server
+    server = make_server(host, port, app, threaded=True)
+    start_prewarm()
+    server.serve_forever()
 
 
 def verify_signature(request_body: bytes, signature: str) -> bool:
@@ -48,6 +135,20 @@ def health():
         }), 500
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint (totals over all worker processes when METRICS_DIR is set)."""
+    return Response(METRICS.render(), status=200, mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 503 until this process has finished prewarming."""
+    if READY.is_set():
+        return jsonify({"status": "ready", "pid": os.getpid()})
+    return jsonify({"status": "starting", "pid": os.getpid()}), 503
+
+
 @app.route("/webhook", methods=["GET"])
 def webhook_verify():
     # Support Meta hub.* params
@@ -67,51 +168,314 @@ def webhook_verify():
     return Response("Forbidden", status=403)
 
 
+MODERATION_REPLY = "Maaf, pesannya kurang sesuai ya. Coba pakai kata yang lebih sopan ✨"
+LLM_TIMEOUT_REPLY = "Maaf kak, Minra butuh waktu sedikit lebih lama. Nanti Minra balas lagi ya ✨"
+BUSY_REPLY = "Maaf kak, Minra lagi ramai banget nih 🙏 Coba kirim pesannya lagi beberapa menit lagi ya ✨"
+SLOW_DOWN_REPLY = "Pesannya sudah Minra terima kak, Minra jawab satu-satu ya 🙏 Tunggu sebentar lalu kirim lagi ✨"
+
+# One patient (or a broadcast burst) must not turn into unbounded LLM calls
+SENDER_LIMIT = SenderLimiter(SENDER_RATE_PER_MIN / 60, SENDER_BURST)
+LLM_LIMIT = ConcurrencyLimit(LLM_MAX_CONCURRENCY, LLM_MAX_BACKLOG)
+
+# Moderation and generation run side by side on this pool in speculative mode. A message holds
+# its LLM_LIMIT slot until both of its tasks finish, so with that limit on the pool never queues.
+_SPECULATIVE_POOL = ThreadPoolExecutor(max_workers=max(4, 2 * WEBHOOK_WORKERS, 2 * LLM_MAX_CONCURRENCY),
+                                       thread_name_prefix="speculative")
+_speculative_lock = threading.Lock()
+_SPECULATIVE_SAVED = deque(maxlen=1000)
+SPECULATIVE_STATS = {"messages": 0, "discarded_replies": 0, "moderation_timeouts": 0, "moderation_not_started": 0,
+                     "llm_timeouts": 0}
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_DB, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL) if RESPONSE_CACHE_ENABLED else None
+
+
+SESSIONS = SessionStore(SESSION_DB, SESSION_MAX_ACTIVE, SESSION_TOKEN_BUDGET, SESSION_IDLE_TTL, SESSION_PURGE_INTERVAL)
+
+
+def _user_content(text: str) -> str:
+    return f"Pasien bertanya: {text}"
+
+
+def _patient_context(patient: dict) -> dict:
+    details = f"nama {patient['name']}" + (f", umur {patient['age']} tahun" if patient["age"] else "")
+    return {"role": "system", "content": f"Data pasien yang sedang chat: {details}. Sapa pasien dengan namanya."}
+
+
+def _cache_reply(text: str, history, reply: str, gen_seconds: float):
+    # Follow-ups depend on the conversation, so only context-free questions are cacheable;
+    # fallback text from a failed LLM call is never cached
+    if RESPONSE_CACHE is None or history or not reply or reply.startswith("[LLM"):
+        return
+    RESPONSE_CACHE.set(text, get_catalog(PRICES_FILE).version, reply, gen_seconds)
+
+
+def _generate_reply(text: str, history=(), cache_result: bool = True) -> str:
+    """LLM reply to `text` given earlier turns; first-turn questions go through the response cache."""
+    catalog = get_catalog(PRICES_FILE)
+    if RESPONSE_CACHE is not None and not history:
+        cached = RESPONSE_CACHE.get(text, catalog.version)
+        if cached is not None:
+            print("[CACHE] Hit")
+            return cached
+
+    start = time.perf_counter()
+    messages = list(history) + [{"role": "user", "content": _user_content(text)}]
+    reply = get_llm_response(messages, catalog, timeout=LLM_TIMEOUT)
+    if cache_result:
+        _cache_reply(text, history, reply, time.perf_counter() - start)
+    return reply
+
+
+def _release_when_done(futures, release):
+    """Call `release` once all `futures` have finished (or been cancelled)."""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            release()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def _moderate_and_generate(text: str, history=(), release=None):
+    """Start moderation and generation together. Returns (flagged, reply); reply is None if flagged.
+
+    Moderation that times out is treated as clean, like any other moderation failure. Moderation
+    that never got a pool thread fails closed: the generated reply is dropped and LLM_UNAVAILABLE
+    returned, so the patient gets the price-list fallback. Timed-out calls keep running on the
+    pool, so `release` is called only once both have finished.
+    """
+    start = time.perf_counter()
+    mod_started = threading.Event()
+
+    def moderate():
+        mod_started.set()
+        return _timed(moderate_content, text, timeout=MODERATION_TIMEOUT)
+
+    mod_future = _SPECULATIVE_POOL.submit(moderate)
+    # Not cached until moderation has cleared the message
+    llm_future = _SPECULATIVE_POOL.submit(_timed, _generate_reply, text, history, cache_result=False)
+    if release is not None:
+        _release_when_done([mod_future, llm_future], release)
+
+    # The moderation timeout runs from when the call starts, not from when it was queued
+    if not mod_started.wait(MODERATION_TIMEOUT + 1):
+        mod_future.cancel()
+        llm_future.cancel()
+        print(f"[MODERATION] Not started after {MODERATION_TIMEOUT + 1:g}s (pool busy), not sending an unmoderated reply")
+        METRICS.inc("messages_shed_total", reason="moderation_backlog")
+        with _speculative_lock:
+            SPECULATIVE_STATS["messages"] += 1
+            SPECULATIVE_STATS["moderation_not_started"] += 1
+        return False, LLM_UNAVAILABLE
+
+    try:
+        (flagged, _), mod_time = mod_future.result(timeout=MODERATION_TIMEOUT + 1)
+    except FutureTimeout:
+        print(f"[MODERATION] Timed out after {MODERATION_TIMEOUT}s, continuing")
+        flagged, mod_time = False, time.perf_counter() - start
+        with _speculative_lock:
+            SPECULATIVE_STATS["moderation_timeouts"] += 1
+
+    if flagged:
+        llm_future.cancel()
+        with _speculative_lock:
+            SPECULATIVE_STATS["messages"] += 1
+            SPECULATIVE_STATS["discarded_replies"] += 1
+        return True, None
+
+    try:
+        reply, llm_time = llm_future.result(timeout=max(0.0, LLM_TIMEOUT + 1 - (time.perf_counter() - start)))
+        _cache_reply(text, history, reply, llm_time)
+    except FutureTimeout:
+        print(f"[LLM] Timed out after {LLM_TIMEOUT}s")
+        reply, llm_time = LLM_TIMEOUT_REPLY, time.perf_counter() - start
+        with _speculative_lock:
+            SPECULATIVE_STATS["llm_timeouts"] += 1
+
+    # Saved = what the sequential path would have taken minus what this one took
+    saved = max(0.0, mod_time + llm_time - (time.perf_counter() - start))
+    with _speculative_lock:
+        SPECULATIVE_STATS["messages"] += 1
+        _SPECULATIVE_SAVED.append(saved)
+    print(f"[SPECULATIVE] moderation={mod_time * 1000:.0f}ms llm={llm_time * 1000:.0f}ms saved={saved * 1000:.0f}ms")
+    return False, reply
+
+
+def speculative_stats() -> dict:
+    with _speculative_lock:
+        return dict(SPECULATIVE_STATS, enabled=SPECULATIVE_MODERATION, saved_ms=summarize_ms(sorted(_SPECULATIVE_SAVED)))
+
+
+def _moderate_then_generate(text: str, history=(), release=None):
+    """(flagged, reply); reply is None if flagged. `release` is called once no OpenAI call for
+    this message is running any more."""
+    if SPECULATIVE_MODERATION:
+        return _moderate_and_generate(text, history, release)
+    try:
+        flagged, _ = moderate_content(text, timeout=MODERATION_TIMEOUT)
+        if flagged:
+            return True, None
+        return False, _generate_reply(text, history)
+    finally:
+        if release is not None:
+            release()
+
+
+def _send_busy_reply(from_number: str, reason: str):
+    print(f"[SHED] {reason}: busy reply to {from_number}")
+    METRICS.inc("messages_shed_total", reason=reason)
+    METRICS.inc("fallback_replies_total", reason="busy")
+    success, response = send_text_message(from_number, BUSY_REPLY)
+    print(f"[SEND] Busy response - Success: {success}, Response: {response}")
+
+
+def _backlog() -> int:
+    """Messages waiting for an LLM slot or in the webhook queue."""
+    return LLM_LIMIT.waiting + WEBHOOK_QUEUE.depth()
+
+
+def handle_message(msg: dict):
+    """Moderate, generate and send the reply for a single inbound message."""
+    with METRICS.timer("message_handle_seconds", type="text" if msg.get("type") == "text" else "other"):
+        _handle_message(msg)
+
+
+def _handle_message(msg: dict):
+    from_number = msg.get("from")
+    msg_type = msg.get("type")
+    print(f"[MESSAGE] From: {from_number}, Type: {msg_type}")
+
+    if msg_type == "text":
+        text = msg.get("text", {}).get("body", "")
+        print(f"[TEXT] Content: {text}")
+
+        history = SESSIONS.history(from_number)
+        patient = _patients().lookup(from_number)
+        if patient:
+            print(f"[PATIENT] Matched {patient['name']} (RM {patient['rm']})")
+            if PATIENT_CONTEXT:
+                # Personalized, so never served from or stored in the response cache
+                history = [_patient_context(patient)] + history
+        if not LLM_LIMIT.acquire(timeout=LLM_SLOT_WAIT):
+            _send_busy_reply(from_number, "llm_backlog")
+            return
+        # The slot stays taken while a timed-out speculative call is still running
+        flagged, reply = _moderate_then_generate(text, history, release=LLM_LIMIT.release)
+        if flagged:
+            print(f"[MODERATION] Message flagged as inappropriate")
+            METRICS.inc("fallback_replies_total", reason="moderation")
+            success, response = send_text_message(from_number, MODERATION_REPLY)
+            print(f"[SEND] Moderation response - Success: {success}, Response: {response}")
+            return
+
+        print(f"[LLM] Reply: {reply}")
+        if reply and not reply.startswith("[LLM") and reply != LLM_TIMEOUT_REPLY:
+            SESSIONS.append(from_number, _user_content(text), reply)
+        else:
+            METRICS.inc("fallback_replies_total", reason="llm_timeout" if reply == LLM_TIMEOUT_REPLY else "llm_unavailable")
+            if reply != LLM_TIMEOUT_REPLY:
+                # Not get_llm_response's generic "[LLM Unavailable]" text: answer from the price list
+                reply = fallback_reply(get_catalog(PRICES_FILE), text)
+
+        success, response = send_text_message(from_number, reply)
+        print(f"[SEND] LLM response - Success: {success}, Response: {response}")
+    else:
+        print(f"[OTHER] Non-text message type: {msg_type}")
+        METRICS.inc("fallback_replies_total", reason="non_text")
+        success, response = send_text_message(from_number, "Minra terima pesannya yaa. Untuk saat ini, kirim teks dulu ya ✨")
+        print(f"[SEND] Other message response - Success: {success}, Response: {response}")
+
+
+WEBHOOK_QUEUE = WebhookQueue(handle_message, workers=WEBHOOK_WORKERS, maxsize=WEBHOOK_QUEUE_SIZE)
+DEDUP = MessageDeduplicator(DEDUP_TTL, DEDUP_DB or None)
+
+
+def iter_messages(payload: dict):
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            for msg in value.get("messages", []):
+                yield msg
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "webhook_async": WEBHOOK_ASYNC,
+        "queue": WEBHOOK_QUEUE.stats(),
+        "prompt_cache": prompt_cache_stats(),
+        "speculative": speculative_stats(),
+        "response_cache": RESPONSE_CACHE.stats() if RESPONSE_CACHE is not None else {"enabled": False},
+        "sessions": SESSIONS.stats(),
+        "dedup": DEDUP.stats(),
+        "patients": _patients().stats(),
+        "limits": {"sender": SENDER_LIMIT.stats(), "llm": LLM_LIMIT.stats(), "backlog": _backlog()},
+        "openai_breaker": OPENAI_BREAKER.stats(),
+    })
+
+
 @app.route("/webhook", methods=["POST"])
 def webhook_receive():
+    start = time.perf_counter()
     sig = request.headers.get("X-Hub-Signature-256", "")
     raw = request.data or b""
-    if not verify_signature(raw, sig):
+    with METRICS.timer("webhook_stage_seconds", stage="signature"):
+        valid = verify_signature(raw, sig)
+    if not valid:
+        METRICS.inc("webhook_requests_total", status="401")
         return Response("Invalid signature", status=401)
 
-    payload = request.get_json(silent=True) or {}
+    with METRICS.timer("webhook_stage_seconds", stage="parse"):
+        payload = request.get_json(silent=True) or {}
     print(f"[WEBHOOK POST] Received payload: {payload}")
     
     try:
-        for entry in payload.get("entry", []):
-            for change in entry.get("changes", []):
-                value = change.get("value", {})
-                for msg in value.get("messages", []):
-                    from_number = msg.get("from")
-                    msg_type = msg.get("type")
-                    print(f"[MESSAGE] From: {from_number}, Type: {msg_type}")
-                    
-                    if msg_type == "text":
-                        text = msg.get("text", {}).get("body", "")
-                        print(f"[TEXT] Content: {text}")
-                        
-                        flagged, _ = moderate_content(text)
-                        if flagged:
-                            print(f"[MODERATION] Message flagged as inappropriate")
-                            success, response = send_text_message(from_number, "Maaf, pesannya kurang sesuai ya. Coba pakai kata yang lebih sopan ✨")
-                            print(f"[SEND] Moderation response - Success: {success}, Response: {response}")
-                            continue
-                        
-                        messages = [{"role": "user", "content": f"Pasien bertanya: {text}"}]
-                        reply = get_llm_response(messages, PRICES)
-                        print(f"[LLM] Reply: {reply}")
-                        
-                        success, response = send_text_message(from_number, reply)
-                        print(f"[SEND] LLM response - Success: {success}, Response: {response}")
-                    else:
-                        print(f"[OTHER] Non-text message type: {msg_type}")
-                        success, response = send_text_message(from_number, "Minra terima pesannya yaa. Untuk saat ini, kirim teks dulu ya ✨")
-                        print(f"[SEND] Other message response - Success: {success}, Response: {response}")
+        for msg in iter_messages(payload):
+            # Meta redelivers events it thinks we missed; each message ID is handled once
+            with METRICS.timer("webhook_stage_seconds", stage="dedup"):
+                duplicate = DEDUP.seen_before(msg.get("id"))
+            if duplicate:
+                print(f"[DEDUP] Skipping already handled message {msg.get('id')}")
+                continue
+            allowed, notify = SENDER_LIMIT.allow(msg.get("from"))
+            if not allowed:
+                print(f"[LIMIT] {msg.get('from')} over {SENDER_LIMIT.rate * 60:g} messages/min, dropping {msg.get('id')}")
+                METRICS.inc("messages_rate_limited_total")
+                if notify:
+                    send_text_message(msg.get("from"), SLOW_DOWN_REPLY)
+                continue
+            if WEBHOOK_ASYNC:
+                if LLM_MAX_BACKLOG > 0 and _backlog() >= LLM_MAX_BACKLOG:
+                    _send_busy_reply(msg.get("from"), "queue_backlog")
+                    continue
+                with METRICS.timer("webhook_stage_seconds", stage="enqueue"):
+                    queued = WEBHOOK_QUEUE.submit(msg)
+                if queued:
+                    continue
+                # Queue full: handle inline rather than dropping the message
+                print(f"[QUEUE] Full (depth={WEBHOOK_QUEUE.depth()}), processing inline")
+            with METRICS.timer("webhook_stage_seconds", stage="handle"):
+                handle_message(msg)
     except Exception as e:
         print(f"[ERROR] Exception in webhook processing: {e}")
         import traceback
         traceback.print_exc()
     
+    METRICS.observe("webhook_stage_seconds", time.perf_counter() - start, stage="total")
+    METRICS.inc("webhook_requests_total", status="200")
     return jsonify({"status": "ok"})
 
 
@@ -121,4 +485,4 @@ if __name__ == "__main__":
     debug_mode = os.getenv("FLASK_DEBUG", "False").lower() == "true"
     print(f"🚀 Starting server on port {port}")
     print(f"📡 Server will be available at: http://0.0.0.0:{port}")
-    app.run(host="0.0.0.0", port=port, debug=debug_mode)
+    serve(port=port, debug=debug_mode)
@@ -0,0 +1,187 @@
+# session_store.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SUMMARY_MAX_CHARS = 600
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting Indonesian/English chat text
+    return len(text or "") // 4 + 4
+
+
+class Session:
+    __slots__ = ("messages", "summary", "updated_at")
+
+    def __init__(self, messages=None, summary: str = "", updated_at: float = 0.0):
+        self.messages = messages or []
+        self.summary = summary
+        self.updated_at = updated_at
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(m["content"]) for m in self.messages)
+
+
+class SessionStore:
+    """Conversation history per WhatsApp number.
+
+    Active sessions live in an in-memory LRU bounded by `max_sessions`; every update is
+    written through to SQLite (when `db_path` is set) so evicted or restarted sessions can be
+    reloaded. History is kept under `token_budget`: the oldest turns are folded into a short
+    summary. Sessions idle for longer than `idle_ttl` seconds start over, and SQLite rows idle
+    that long are purged every `purge_interval` seconds (checked on `append`).
+
+    Reads and writes for one number are serialized by a lock striped by number; the store-wide
+    lock only guards the LRU and counters, so SQLite reads for different senders run in parallel.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self, db_path: str = None, max_sessions: int = 1000, token_budget: int = 1200,
+                 idle_ttl: float = 6 * 3600, purge_interval: float = 600):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl
+        self.purge_interval = purge_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._number_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._local = threading.local()
+        self._last_purge = time.time()
+        self.counts = {"loaded": 0, "evicted": 0, "expired": 0, "summarized_turns": 0, "purged": 0}
+
+    def _conn(self):
+        if not self.db_path:
+            return None
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " number TEXT PRIMARY KEY, messages TEXT NOT NULL, summary TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at)")
+        conn.commit()
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _number_lock(self, number: str) -> threading.Lock:
+        return self._number_locks[hash(number) % len(self._number_locks)]
+
+    def _load(self, number: str, now: float) -> Session:
+        """Return the live session for `number` (caller holds the number's lock)."""
+        with self._lock:
+            session = self._sessions.get(number)
+        conn = self._conn()
+        if session is not None and conn is not None:
+            # Another worker process may have answered this number since we cached it
+            row = conn.execute("SELECT updated_at FROM sessions WHERE number = ?", (number,)).fetchone()
+            if row is not None and row[0] > session.updated_at:
+                session = None
+        loaded = False
+        if session is None:
+            row = conn.execute("SELECT messages, summary, updated_at FROM sessions WHERE number = ?",
+                               (number,)).fetchone() if conn is not None else None
+            if row is not None:
+                session, loaded = Session(json.loads(row[0]), row[1], row[2]), True
+            else:
+                session = Session(updated_at=now)
+        with self._lock:
+            self.counts["loaded"] += loaded
+            self._sessions[number] = session
+            self._sessions.move_to_end(number)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.counts["evicted"] += 1
+            if session.messages and now - session.updated_at > self.idle_ttl:
+                session.messages, session.summary = [], ""
+                self.counts["expired"] += 1
+        return session
+
+    def history(self, number: str) -> list:
+        """Messages to prepend to the next LLM call: summary of older turns, then recent turns."""
+        with self._number_lock(number):
+            session = self._load(number, time.time())
+            history = []
+            if session.summary:
+                history.append({"role": "system", "content": f"Pertanyaan pasien sebelumnya dalam percakapan ini: {session.summary}"})
+            history.extend(dict(m) for m in session.messages)
+            return history
+
+    def append(self, number: str, user_text: str, reply: str):
+        """Record one exchange and trim the session back under the token budget."""
+        now = time.time()
+        with self._number_lock(number):
+            session = self._load(number, now)
+            session.messages.append({"role": "user", "content": user_text})
+            session.messages.append({"role": "assistant", "content": reply})
+            session.updated_at = now
+            self._trim(session)
+            conn = self._conn()
+            if conn is not None:
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO sessions (number, messages, summary, updated_at) VALUES (?, ?, ?, ?)",
+                                 (number, json.dumps(session.messages, ensure_ascii=False), session.summary, now))
+        with self._lock:
+            purge = now - self._last_purge >= self.purge_interval
+            if purge:
+                self._last_purge = now
+        if purge:
+            self.purge_expired()
+
+    def _trim(self, session: Session):
+        # Always keep the latest exchange verbatim; older ones are dropped a pair at a time
+        while session.tokens() > self.token_budget and len(session.messages) > 2:
+            old = session.messages.pop(0)
+            if session.messages and session.messages[0]["role"] == "assistant" and len(session.messages) > 2:
+                session.messages.pop(0)
+            if old["role"] == "user":
+                question = " ".join(old["content"].split())
+                if question.startswith("Pasien bertanya:"):
+                    question = question[len("Pasien bertanya:"):].strip()
+                session.summary = f"{session.summary} {question[:160]};".strip()
+                with self._lock:
+                    self.counts["summarized_turns"] += 1
+            # The summary keeps the most recent questions and at most ~a quarter of the budget
+            max_chars = min(SUMMARY_MAX_CHARS, self.token_budget)
+            if len(session.summary) > max_chars:
+                session.summary = "…" + session.summary[-max_chars:]
+
+    def reset(self, number: str):
+        with self._number_lock(number):
+            with self._lock:
+                self._sessions.pop(number, None)
+            conn = self._conn()
+            if conn is not None:
+                with conn:
+                    conn.execute("DELETE FROM sessions WHERE number = ?", (number,))
+
+    def purge_expired(self) -> int:
+        """Drop sessions idle longer than `idle_ttl` from memory and SQLite. Returns rows deleted."""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            for number in [n for n, s in self._sessions.items() if s.updated_at < cutoff]:
+                del self._sessions[number]
+        conn = self._conn()
+        if conn is None:
+            return 0
+        with conn:
+            deleted = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+        if deleted:
+            print(f"[SESSIONS] Purged {deleted} idle session(s)")
+        with self._lock:
+            self.counts["purged"] += deleted
+        return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counts, active=len(self._sessions), max_sessions=self.max_sessions,
+                        token_budget=self.token_budget, db=self.db_path or None)
@@ -0,0 +1,128 @@
+# webhook_queue.py
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+
+class WebhookQueue:
+    """Bounded in-process queue drained by a fixed pool of worker threads.
+
+    The webhook handler only enqueues parsed messages; moderation, LLM and
+    sending happen on the workers. Workers are started lazily (and restarted
+    after a fork) so the queue is safe to create at import time.
+    """
+
+    def __init__(self, handler, workers: int = 4, maxsize: int = 1000, latency_window: int = 1000):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=max(0, maxsize))
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._latencies = deque(maxlen=latency_window)
+        self._waits = deque(maxlen=latency_window)
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._threads:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, item) -> bool:
+        """Enqueue `item` without blocking. Returns False if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((time.perf_counter(), item))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _run(self):
+        while True:
+            enqueued_at, item = self._queue.get()
+            started = time.perf_counter()
+            ok = True
+            try:
+                self.handler(item)
+            except Exception as e:
+                ok = False
+                print(f"[QUEUE] Worker error: {e}")
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    if ok:
+                        self.processed += 1
+                    else:
+                        self.failed += 1
+                    self._waits.append(started - enqueued_at)
+                    self._latencies.append(finished - enqueued_at)
+                self._queue.task_done()
+
+    def join(self):
+        """Block until every queued message has been handled (used by tests/scripts)."""
+        self._queue.join()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for queued and in-flight messages; False if some remain."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            waits = sorted(self._waits)
+            return {
+                "depth": self._queue.qsize(),
+                "maxsize": self._queue.maxsize,
+                "workers": self.workers,
+                "enqueued": self.enqueued,
+                "processed": self.processed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "latency_ms": summarize_ms(latencies),
+                "wait_ms": summarize_ms(waits),
+            }
+
+
+def summarize_ms(sorted_values) -> dict:
+    if not sorted_values:
+        return {"count": 0}
+    n = len(sorted_values)
+
+    def pct(p):
+        return round(sorted_values[min(n - 1, int(p * n))] * 1000, 2)
+
+    return {
+        "count": n,
+        "avg": round(sum(sorted_values) / n * 1000, 2),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "max": round(sorted_values[-1] * 1000, 2),
+    }
@@ -1,37 +1,253 @@
+import asyncio
 import os
-import requests
-from dotenv import load_dotenv
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
 
-load_dotenv()
+from .config import (
+    WHATSAPP_TOKEN_ACCESS,
+    PHONE_NUMBER,
+    WHATSAPP_GRAPH_API_BASE,
+    WHATSAPP_POOL_SIZE,
+    WHATSAPP_MAX_RETRIES,
+    WHATSAPP_BACKOFF_BASE,
+    WHATSAPP_BACKOFF_MAX,
+)
+from .metrics import METRICS
 
-WHATSAPP_TOKEN_ACCESS = os.getenv("WHATSAPP_TOKEN_ACCESS")
-PHONE_NUMBER = os.getenv("PHONE_NUMBER")  # WhatsApp Phone Number ID
-GRAPH_API_BASE = "https://graph.facebook.com/v22.0"
+GRAPH_API_BASE = WHATSAPP_GRAPH_API_BASE
 
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-def send_text_message(to_number: str, text: str) -> tuple[bool, str]:
+# Built once; see configure()
+MESSAGES_URL = None
+HEADERS = {}
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def configure(token: str = None, phone_number_id: str = None, base_url: str = None):
+    """(Re)build the messages URL, auth headers and pooled session.
+
+    Called at import with values from .env; tests and local stubs call it to point elsewhere.
+    """
+    global WHATSAPP_TOKEN_ACCESS, PHONE_NUMBER, GRAPH_API_BASE, MESSAGES_URL, HEADERS, _session, _async_session
+    if token is not None:
+        WHATSAPP_TOKEN_ACCESS = token
+    if phone_number_id is not None:
+        PHONE_NUMBER = phone_number_id
+    if base_url is not None:
+        GRAPH_API_BASE = base_url.rstrip("/")
+    MESSAGES_URL = f"{GRAPH_API_BASE}/{PHONE_NUMBER}/messages"
+    HEADERS = {
+        "Authorization": f"Bearer {WHATSAPP_TOKEN_ACCESS}",
+        "Content-Type": "application/json",
+    }
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+    # The aiohttp session is bound to its event loop; the next async send builds a new one
+    _async_session = None
+
+
+def get_session() -> "requests.Session":
+    """Module-level keep-alive session, recreated after a fork so workers don't share sockets.
+
+    `requests` is imported here, on first use, to keep it off the server's startup path.
+    """
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WHATSAPP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(HEADERS)
+            _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def _retry_after_seconds(resp) -> float:
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
     try:
-        # If no token is configured, simulate sending for local testing
-        if not WHATSAPP_TOKEN_ACCESS or not PHONE_NUMBER:
-            msg = f"SIMULATED_SEND: to={to_number} text={text}"
-            print(msg)
-            return True, msg
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
 
-        url = f"{GRAPH_API_BASE}/{PHONE_NUMBER}/messages"
-        headers = {
-            "Authorization": f"Bearer {WHATSAPP_TOKEN_ACCESS}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": to_number,
-            "type": "text",
-            "text": {"body": text},
-        }
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
+
+def _backoff_delay(attempt: int, resp=None) -> float:
+    retry_after = _retry_after_seconds(resp)
+    if retry_after is not None:
+        return min(retry_after, WHATSAPP_BACKOFF_MAX)
+    # Exponential backoff with jitter: between half and the full step
+    step = min(WHATSAPP_BACKOFF_MAX, WHATSAPP_BACKOFF_BASE * (2 ** attempt))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def _never_sent(e) -> bool:
+    """True if a requests ConnectionError failed before the request reached Graph, so it is safe to repeat."""
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = e.args[0] if e.args else None
+    # requests wraps urllib3's MaxRetryError, whose `reason` is the underlying error
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+
+def _post_messages(payload: dict) -> tuple[bool, str]:
+    session = get_session()
+    import requests
+    resp = None
+    for attempt in range(WHATSAPP_MAX_RETRIES + 1):
+        try:
+            resp = session.post(MESSAGES_URL, json=payload, timeout=30)
+        except requests.ConnectionError as e:
+            if not _never_sent(e):
+                # Dropped mid-request (RemoteDisconnected, ProtocolError, ...): Graph may have sent it
+                return False, str(e)
+            if attempt >= WHATSAPP_MAX_RETRIES:
+                return False, str(e)
+            resp = None
+            METRICS.inc("whatsapp_retries_total", reason=type(e).__name__)
+            delay = _backoff_delay(attempt)
+            print(f"[WHATSAPP] {type(e).__name__}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        except requests.Timeout as e:
+            # Read timeout: Graph may already have accepted the message, and a retry could send it twice
+            return False, str(e)
         if resp.status_code // 100 == 2:
             return True, resp.text
-        return False, resp.text
+        if resp.status_code not in RETRY_STATUSES or attempt >= WHATSAPP_MAX_RETRIES:
+            return False, resp.text
+        METRICS.inc("whatsapp_retries_total", reason=str(resp.status_code))
+        delay = _backoff_delay(attempt, resp)
+        print(f"[WHATSAPP] HTTP {resp.status_code}, retrying in {delay:.2f}s")
+        time.sleep(delay)
+    return False, resp.text if resp is not None else "no response"
+
+
+def _record_send(kind: str, start: float, ok: bool, response: str) -> tuple[bool, str]:
+    METRICS.observe("whatsapp_send_seconds", time.perf_counter() - start, kind=kind, outcome="ok" if ok else "error")
+    if not ok:
+        METRICS.inc("whatsapp_send_errors_total", kind=kind)
+    return ok, response
+
+
+def _send(kind: str, payload: dict) -> tuple[bool, str]:
+    start = time.perf_counter()
+    return _record_send(kind, start, *_post_messages(payload))
+
+
+def _simulated_text_send(to_number: str, text: str):
+    """(True, message) when no token is configured, so sends are simulated for local testing; else None."""
+    if WHATSAPP_TOKEN_ACCESS and PHONE_NUMBER:
+        return None
+    msg = f"SIMULATED_SEND: to={to_number} text={text}"
+    print(msg)
+    METRICS.inc("whatsapp_simulated_sends_total", kind="text")
+    return True, msg
+
+
+def _text_payload(to_number: str, text: str) -> dict:
+    return {
+        "messaging_product": "whatsapp",
+        "to": to_number,
+        "type": "text",
+        "text": {"body": text},
+    }
+
+
+_async_session = None
+
+
+async def get_async_session():
+    """aiohttp session for the asyncio server (`server_async`), created on first use inside its loop."""
+    global _async_session
+    if _async_session is None or _async_session.closed:
+        import aiohttp
+        _async_session = aiohttp.ClientSession(
+            headers=HEADERS,
+            connector=aiohttp.TCPConnector(limit=WHATSAPP_POOL_SIZE),
+            # Like requests' timeout=30: per connect/read, not counting the wait for a pooled connection
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30),
+        )
+    return _async_session
+
+
+async def close_async_session():
+    global _async_session
+    if _async_session is not None:
+        await _async_session.close()
+        _async_session = None
+
+
+async def _apost_messages(payload: dict) -> tuple[bool, str]:
+    """`_post_messages` for the event loop: same retry policy, waits with asyncio.sleep."""
+    import aiohttp
+    session = await get_async_session()
+    resp = text = None
+    for attempt in range(WHATSAPP_MAX_RETRIES + 1):
+        try:
+            async with session.post(MESSAGES_URL, json=payload) as resp:
+                text = await resp.text()
+        except aiohttp.ClientConnectorError as e:
+            # Could not connect, so the request never reached Graph and is safe to repeat
+            if attempt >= WHATSAPP_MAX_RETRIES:
+                return False, str(e) or type(e).__name__
+            resp = None
+            METRICS.inc("whatsapp_retries_total", reason=type(e).__name__)
+            delay = _backoff_delay(attempt)
+            print(f"[WHATSAPP] {type(e).__name__}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            continue
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Graph may already have accepted the message, and a retry could send it twice
+            return False, str(e) or type(e).__name__
+        if resp.status // 100 == 2:
+            return True, text
+        if resp.status not in RETRY_STATUSES or attempt >= WHATSAPP_MAX_RETRIES:
+            return False, text
+        METRICS.inc("whatsapp_retries_total", reason=str(resp.status))
+        delay = _backoff_delay(attempt, resp)
+        print(f"[WHATSAPP] HTTP {resp.status}, retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+    return False, text if resp is not None else "no response"
+
+
+async def asend_text_message(to_number: str, text: str) -> tuple[bool, str]:
+    """`send_text_message` for the asyncio server."""
+    try:
+        simulated = _simulated_text_send(to_number, text)
+        if simulated:
+            return simulated
+        start = time.perf_counter()
+        return _record_send("text", start, *await _apost_messages(_text_payload(to_number, text)))
+    except Exception as e:
+        return False, str(e)
+
+
+def send_text_message(to_number: str, text: str) -> tuple[bool, str]:
+    try:
+        simulated = _simulated_text_send(to_number, text)
+        if simulated:
+            return simulated
+        return _send("text", _text_payload(to_number, text))
     except Exception as e:
         return False, str(e)
 
@@ -42,13 +258,9 @@ def send_template_message(to_number: str, template_name: str, language_code: str
         if not WHATSAPP_TOKEN_ACCESS or not PHONE_NUMBER:
             msg = f"SIMULATED_TEMPLATE_SEND: to={to_number} template={template_name}"
             print(msg)
+            METRICS.inc("whatsapp_simulated_sends_total", kind="template")
             return True, msg
 
-        url = f"{GRAPH_API_BASE}/{PHONE_NUMBER}/messages"
-        headers = {
-            "Authorization": f"Bearer {WHATSAPP_TOKEN_ACCESS}",
-            "Content-Type": "application/json",
-        }
         payload = {
             "messaging_product": "whatsapp",
             "to": to_number,
@@ -60,9 +272,9 @@ def send_template_message(to_number: str, template_name: str, language_code: str
         }
         if components:
             payload["template"]["components"] = components
-        resp = requests.post(url, headers=headers, json=payload, timeout=30)
-        if resp.status_code // 100 == 2:
-            return True, resp.text
-        return False, resp.text
+        return _send("template", payload)
     except Exception as e:
         return False, str(e)
+
+
+configure()
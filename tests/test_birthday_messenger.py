@@ -0,0 +1,103 @@
+"""
+Tests for batched birthday message generation
+"""
+import json
+import unittest
+from unittest import mock
+
+import openai
+
+from src import birthday_messenger, birthday_simulator, llm_manager
+from src.birthday_messenger import GenerationStopped, generate_birthday_messages, birthday_text
+from src.campaign import TargetTimeout
+from benchmarks.stubs import OpenAIStub
+
+NAMES = ["Alice", "Bob", "Cici", "Dedi", "Eka"]
+
+
+class TestGenerateBirthdayMessages(unittest.TestCase):
+    """Test batching and per-recipient fallback"""
+
+    def test_batches_of_batch_size(self):
+        calls = []
+
+        def llm(messages, prices_data, response_format=None):
+            calls.append(response_format)
+            recipients = json.loads(messages[-1]["content"].splitlines()[-1])["recipients"]
+            return json.dumps({"messages": {r["id"]: f"HBD {r['name']}" for r in recipients}})
+
+        result = generate_birthday_messages(NAMES, {}, batch_size=2, llm=llm)
+        self.assertEqual(result, [f"HBD {n}" for n in NAMES])
+        self.assertEqual(calls, [{"type": "json_object"}] * 3)
+
+    def test_missing_and_malformed_entries_fall_back(self):
+        def llm(messages, prices_data, response_format=None):
+            if response_format is None:
+                return "single " + messages[-1]["content"].split("bernama ")[1].split(".")[0]
+            if "Alice" in messages[-1]["content"]:
+                return json.dumps({"messages": {"0": "HBD Alice", "1": ""}})
+            return "not json"
+
+        before = birthday_messenger.batch_stats()["fallbacks"]
+        result = generate_birthday_messages(NAMES, {}, batch_size=3, llm=llm)
+        self.assertEqual(result, ["HBD Alice", "single Bob", "single Cici", "single Dedi", "single Eka"])
+        self.assertEqual(birthday_messenger.batch_stats()["fallbacks"] - before, 4)
+
+    def test_json_mode_against_openai_stub(self):
+        stub = OpenAIStub().start()
+        self.addCleanup(stub.stop)
+        client = openai.OpenAI(api_key="test", base_url=stub.base_url, max_retries=0)
+        with mock.patch.object(llm_manager, "client", client):
+            result = generate_birthday_messages(NAMES, {"treatments": []}, batch_size=5)
+        self.assertEqual(stub.counts["chat_calls"], 1)
+        self.assertEqual(stub.calls[0]["response_format"], {"type": "json_object"})
+        self.assertTrue(all(name in msg for name, msg in zip(NAMES, result)))
+
+    def test_llm_failure_gets_greeting_template(self):
+        def llm(messages, prices_data, response_format=None):
+            return llm_manager.LLM_UNAVAILABLE
+
+        result = generate_birthday_messages(["Alice", "Bob"], {}, batch_size=2, llm=llm)
+        self.assertEqual(result, [None, None])
+        text = birthday_text("Alice Wijaya", result[0])
+        self.assertTrue(text.startswith("Selamat ulang tahun, Kak Alice!"))
+        self.assertNotIn("[LLM", text)
+        self.assertTrue(birthday_text("Kak Bob", "[LLM Error] x").startswith("Selamat ulang tahun, Kak Bob!"))
+        self.assertEqual(birthday_text("Alice Wijaya", "HBD!"), "Kak Alice HBD!")
+
+    def test_timeout_keeps_messages_already_generated(self):
+        def llm(messages, prices_data, response_format=None, **kwargs):
+            recipients = json.loads(messages[-1]["content"].splitlines()[-1])["recipients"]
+            if recipients[0]["name"] == "Cici":
+                raise TargetTimeout("timed out waiting for OpenAI rate limit")
+            return json.dumps({"messages": {r["id"]: f"HBD {r['name']}" for r in recipients}})
+
+        with self.assertRaises(GenerationStopped) as cm:
+            generate_birthday_messages(NAMES, {}, batch_size=2, llm=llm)
+        self.assertEqual(cm.exception.messages, {0: "HBD Alice", 1: "HBD Bob"})
+        self.assertIsInstance(cm.exception.__cause__, TargetTimeout)
+
+    def test_simulator_sends_batch_messages_generated_before_timeout(self):
+        targets = [{"NAMA": name, "No. Whatsapp": f"08120000000{i}"} for i, name in enumerate(NAMES)]
+
+        def llm(messages, prices_data, response_format=None, **kwargs):
+            if response_format is None:
+                return "single " + messages[-1]["content"].split("bernama ")[1].split(".")[0]
+            recipients = json.loads(messages[-1]["content"].splitlines()[-1])["recipients"]
+            if recipients[0]["name"] == "Cici":
+                raise TargetTimeout("timed out waiting for OpenAI rate limit")
+            return json.dumps({"messages": {r["id"]: f"HBD {r['name']}" for r in recipients}})
+
+        with mock.patch.object(birthday_simulator.os.path, "exists", return_value=True), \
+                mock.patch.object(birthday_simulator, "refresh_reminders", return_value=0), \
+                mock.patch.object(birthday_simulator, "open_lead_store") as store, \
+                mock.patch.object(birthday_simulator, "get_catalog", return_value={}), \
+                mock.patch.object(llm_manager, "get_llm_response", side_effect=llm):
+            store.return_value.birthdays_on.return_value = targets
+            rows = birthday_simulator.run_simulation(write_report=False, batch_size=2, variants=0)
+        self.assertEqual([r["Message"] for r in rows],
+                         ["HBD Alice", "HBD Bob", "single Cici", "single Dedi", "single Eka"])
+
+
+if __name__ == '__main__':
+    unittest.main()
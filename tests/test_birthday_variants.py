@@ -0,0 +1,58 @@
+"""
+Tests for birthday_variants module
+"""
+import tempfile
+import unittest
+
+from src.birthday_variants import get_variant_pool, VariantPool
+from src.catalog import Catalog
+
+
+class TestVariantPool(unittest.TestCase):
+    """Test daily variant generation, caching and assignment"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.calls = 0
+
+    def _llm(self, messages, prices_data, **kwargs):
+        self.calls += 1
+        return f"Variant {self.calls} ✨"
+
+    def _failing_llm(self, messages, prices_data, **kwargs):
+        return "[LLM Unavailable] Selamat ulang tahun!"
+
+    def test_generated_once_per_day_and_version(self):
+        catalog = Catalog({"treatments": []}, "v1")
+        pool = get_variant_pool(catalog, n=4, directory=self.dir, day="2025-12-09", llm=self._llm)
+        self.assertEqual(len(pool.variants), 4)
+        self.assertEqual(self.calls, 4)
+
+        again = get_variant_pool(catalog, n=4, directory=self.dir, day="2025-12-09", llm=self._llm)
+        self.assertEqual(again.variants, pool.variants)
+        self.assertEqual(self.calls, 4)
+
+        get_variant_pool(Catalog({"treatments": []}, "v2"), n=4, directory=self.dir, day="2025-12-09", llm=self._llm)
+        get_variant_pool(catalog, n=4, directory=self.dir, day="2025-12-10", llm=self._llm)
+        self.assertEqual(self.calls, 12)
+
+    def test_llm_unavailable_reuses_latest_pool(self):
+        catalog = Catalog({"treatments": []}, "v1")
+        self.assertIsNone(get_variant_pool(catalog, n=2, directory=self.dir, day="2025-12-08", llm=self._failing_llm))
+        get_variant_pool(catalog, n=2, directory=self.dir, day="2025-12-08", llm=self._llm)
+        pool = get_variant_pool(catalog, n=2, directory=self.dir, day="2025-12-09", llm=self._failing_llm)
+        self.assertEqual((pool.day, pool.variants), ("2025-12-08", ["Variant 1 ✨", "Variant 2 ✨"]))
+
+    def test_assignment_deterministic_and_siblings_differ(self):
+        pool = VariantPool("2025-12-09", "v1", [f"v{i}" for i in range(5)])
+        phones = ["081227935875", "6281227935875", "089660117691"]
+        first = pool.assign(phones)
+        self.assertEqual(first, pool.assign(phones))
+        self.assertNotEqual(first[0], first[1])  # same number in two formats: a family phone
+        self.assertEqual(pool.assign(phones[2:]), first[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
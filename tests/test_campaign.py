@@ -0,0 +1,60 @@
+"""
+Tests for campaign runner and token bucket
+"""
+import time
+import unittest
+
+from src.campaign import run_campaign, TargetTimeout
+from src.rate_limit import TokenBucket
+
+
+def _job(target, ctx):
+    delay, name = target
+    text = ctx.llm(lambda n, timeout=None: (time.sleep(delay), f"Selamat ulang tahun {n}")[1], name)
+    return ctx.send(lambda t: t, text)
+
+
+class TestRunCampaign(unittest.TestCase):
+    """Test concurrent campaign execution"""
+
+    def test_results_keep_target_order_and_overlap(self):
+        targets = [(0.2, "A"), (0.05, "B"), (0.1, "C"), (0.0, "D")]
+        results, summary = run_campaign(targets, _job, concurrency=4, timeout=5,
+                                        llm_bucket=TokenBucket(0), send_bucket=TokenBucket(0))
+        self.assertEqual(results, [f"Selamat ulang tahun {n}" for _, n in targets])
+        self.assertEqual(summary["ok"], 4)
+        self.assertLess(summary["wall_clock_s"], 0.3)
+
+    def test_per_target_timeout_skips_send(self):
+        sent = []
+
+        def job(target, ctx):
+            time.sleep(target)
+            return ctx.send(sent.append, target)
+
+        results, summary = run_campaign([0.0, 0.3], job, concurrency=2, timeout=0.1,
+                                        llm_bucket=TokenBucket(0), send_bucket=TokenBucket(0),
+                                        on_error=lambda t, e: type(e).__name__)
+        self.assertEqual(sent, [0.0])
+        self.assertEqual(results[1], TargetTimeout.__name__)
+        self.assertEqual(summary["timeouts"], 1)
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test token bucket rate limiting"""
+
+    def test_burst_then_limited(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+        self.assertTrue(bucket.acquire(timeout=0.5))
+
+    def test_acquire_times_out(self):
+        bucket = TokenBucket(rate=1, capacity=1)
+        bucket.try_acquire()
+        self.assertFalse(bucket.acquire(timeout=0.05))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests for the circuit breaker and its use around OpenAI calls
+"""
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from src import llm_manager
+from src.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+PRICES = {"treatments": {"facial": [
+    {"name": "Radiant Acne Facial", "description": "Jerawat", "original_price": 285000, "promo_price": 198000},
+]}}
+
+
+def _fail():
+    raise ConnectionError("down")
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test state transitions"""
+
+    def test_opens_after_consecutive_failures_and_fails_fast(self):
+        breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            breaker.record(False)
+        breaker.record(True)  # a success resets the count
+        for _ in range(3):
+            self.assertTrue(breaker.allow())
+            breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+        with self.assertRaises(CircuitOpenError):
+            with breaker.guard():
+                self.fail("called while open")
+        self.assertEqual(breaker.stats()["rejected"], 2)
+
+    def test_slow_successes_count_as_failures(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, slow_call_seconds=1.0)
+        breaker.record(True, 1.5)
+        breaker.record(True, 2.0)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.stats()["slow"], 2)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.02)
+        breaker.record(False)
+        time.sleep(0.03)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # one probe at a time
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.03)
+        with breaker.guard():
+            pass
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.stats()["opened"], 2)
+
+    def test_cancelled_probe_frees_its_slot(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+        breaker.record(False)
+
+        async def probe():
+            with breaker.guard():
+                await asyncio.sleep(1)
+
+        async def scenario():
+            task = asyncio.ensure_future(probe())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(scenario())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+
+    def test_disabled(self):
+        breaker = CircuitBreaker("test", failure_threshold=0)
+        for _ in range(10):
+            breaker.record(False)
+        self.assertTrue(breaker.allow())
+
+
+class TestOpenAIBreaker(unittest.TestCase):
+    """Test chat and moderation sharing one breaker"""
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.chat.completions.create.side_effect = _fail
+        self.client.moderations.create.side_effect = _fail
+        patches = [
+            mock.patch.object(llm_manager, "client", self.client),
+            mock.patch.object(llm_manager, "OPENAI_BREAKER", CircuitBreaker("openai", 3, reset_timeout=60)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_failures_from_both_calls_open_it_for_both(self):
+        messages = [{"role": "user", "content": "harga facial acne?"}]
+        self.assertEqual(llm_manager.get_llm_response(messages, PRICES), llm_manager.LLM_UNAVAILABLE)
+        self.assertEqual(llm_manager.moderate_content("halo"), (False, "Moderation service unavailable."))
+        llm_manager.get_llm_response(messages, PRICES)
+        self.assertEqual(llm_manager.OPENAI_BREAKER.state, CircuitBreaker.OPEN)
+
+        llm_manager.get_llm_response(messages, PRICES)
+        llm_manager.moderate_content("halo")
+        self.assertEqual(self.client.chat.completions.create.call_count, 2)
+        self.assertEqual(self.client.moderations.create.call_count, 1)
+
+    def test_fallback_reply_lists_matching_treatments(self):
+        reply = llm_manager.fallback_reply(PRICES, "harga facial acne berapa?")
+        self.assertIn("Radiant Acne Facial: Rp198.000 (normal Rp285.000)", reply)
+        self.assertNotIn("ulang tahun", reply)
+        self.assertEqual(llm_manager.fallback_reply(PRICES, "halo kak"), llm_manager.FALLBACK_REPLY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,15 @@
 """
 Tests for csv_manager module
 """
+import csv
+import os
+import tempfile
 import unittest
-from datetime import datetime
-from src.csv_manager import _parse_dob, update_birthday_reminders_for_today, get_rows_where_column_equals
+from datetime import date, datetime
+from src.csv_manager import (
+    _parse_dob, update_birthday_reminders_for_today, get_rows_where_column_equals,
+    iter_csv, stream_birthday_reminders,
+)
 
 
 class TestParseDOB(unittest.TestCase):
@@ -56,5 +62,39 @@ class TestBirthdayReminders(unittest.TestCase):
         self.assertEqual(result[1]["Nama"], "Charlie")
 
 
+class TestStreamingCSV(unittest.TestCase):
+    """Test row-by-row reading and reminder write-back"""
+
+    HEADER = ["no", "NAMA", "Tanggal lahir", "ULTAH REMINDER", "BULAN", "TANGGAL", "", "", ""]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "leads.csv")
+        with open(self.path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerow(["1", "Alice", "18/10/1990", "", "10", "18", "a", "b", "c"])
+            writer.writerow(["2", "Bob", "15/06/1985", "ULTAH HARI INI", "6", "15", "", "", ""])
+            writer.writerow(["3", "Cici", "", "", "10", "18"])  # short row
+
+    def _read(self):
+        with open(self.path, newline="", encoding="utf-8") as f:
+            return list(csv.reader(f))
+
+    def test_stream_sets_flags_in_place_and_keeps_columns(self):
+        updated = stream_birthday_reminders(self.path, self.path, today=date(2026, 10, 18))
+        self.assertEqual(updated, 3)
+        header, *rows = self._read()
+        self.assertEqual(header, self.HEADER)
+        self.assertEqual([r[3] for r in rows], ["ULTAH HARI INI", "", "ULTAH HARI INI"])
+        self.assertEqual(rows[0][6:], ["a", "b", "c"])
+        self.assertEqual(len(rows[2]), len(self.HEADER))
+
+    def test_iter_csv(self):
+        self.assertEqual([r["NAMA"] for r in iter_csv(self.path)], ["Alice", "Bob", "Cici"])
+        self.assertEqual(list(iter_csv(self.path + ".missing")), [])
+
+
 if __name__ == '__main__':
     unittest.main()
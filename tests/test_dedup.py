@@ -0,0 +1,56 @@
+"""
+Tests for dedup module
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from src.dedup import MessageDeduplicator
+
+
+class TestMessageDeduplicator(unittest.TestCase):
+    """Test message-ID deduplication of webhook redeliveries"""
+
+    def test_second_delivery_is_duplicate(self):
+        dedup = MessageDeduplicator()
+        self.assertFalse(dedup.seen_before("wamid.1"))
+        self.assertTrue(dedup.seen_before("wamid.1"))
+        self.assertFalse(dedup.seen_before("wamid.2"))
+        self.assertFalse(dedup.seen_before(None))
+        self.assertEqual(dedup.stats()["duplicates"], 1)
+
+    def test_ids_expire_after_ttl(self):
+        dedup = MessageDeduplicator(ttl=60)
+        with mock.patch("src.dedup.time.time", return_value=1000.0):
+            dedup.seen_before("wamid.1")
+        with mock.patch("src.dedup.time.time", return_value=1061.0):
+            self.assertFalse(dedup.seen_before("wamid.1"))
+
+    def test_memory_bounded_by_max_entries(self):
+        dedup = MessageDeduplicator(max_entries=10)
+        for i in range(50):
+            dedup.seen_before(f"wamid.{i}")
+        self.assertEqual(dedup.stats()["tracked"], 10)
+
+    def test_sqlite_shared_between_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "dedup.sqlite3")
+            # Two instances stand in for two worker processes
+            first, second = MessageDeduplicator(db_path=db), MessageDeduplicator(db_path=db)
+            self.assertFalse(first.seen_before("wamid.1"))
+            self.assertTrue(second.seen_before("wamid.1"))
+            self.assertEqual(second.stats()["duplicates"], 1)
+
+    def test_locked_sqlite_falls_back_to_memory(self):
+        dedup = MessageDeduplicator(db_path="unused.sqlite3")
+        locked = mock.MagicMock()
+        locked.execute.side_effect = sqlite3.OperationalError("database is locked")
+        with mock.patch.object(dedup, "_conn", return_value=locked):
+            self.assertFalse(dedup.seen_before("wamid.1"))
+            self.assertTrue(dedup.seen_before("wamid.1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Tests for lead_store and phone modules
+"""
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from src.csv_manager import get_rows_where_column_equals, load_csv, save_csv
+from src.lead_store import LeadStore, open_lead_store
+from src.phone import PhoneIndex, normalize_phone
+
+
+ROWS = [
+    {"Nomor RM": "0312210001", "NAMA": "Alice", "Pekerjaan": "IRT", "Tanggal lahir": "09/12/1990",
+     "No. Whatsapp": "0812-2793-5875", "ULTAH REMINDER": "ULTAH HARI INI"},
+    {"Nomor RM": "0612210002", "NAMA": "Bob", "Pekerjaan": " IRT", "Tanggal lahir": "10/12/1991",
+     "No. Whatsapp": "", "ULTAH REMINDER": ""},
+    {"Nomor RM": "1012210003", "NAMA": "Cici", "Pekerjaan": "Guru", "Tanggal lahir": "1985-12-09",
+     "No. Whatsapp": "+62 896 6011 7691", "ULTAH REMINDER": ""},
+]
+
+
+class TestNormalizePhone(unittest.TestCase):
+    """Test WhatsApp number normalization"""
+
+    def test_formats_normalize_to_country_code(self):
+        for raw in ["081227935875", "0812-2793-5875", "+62 812 2793 5875", "6281227935875", "81227935875"]:
+            self.assertEqual(normalize_phone(raw), "6281227935875")
+
+    def test_invalid_numbers(self):
+        for raw in ["", "-", "0049", None]:
+            self.assertEqual(normalize_phone(raw), "")
+
+
+class TestPhoneIndex(unittest.TestCase):
+    """Test sender number -> patient lookups"""
+
+    def test_lookup_any_format(self):
+        index = PhoneIndex.build(ROWS)
+        self.assertEqual(index.lookup("6281227935875")["name"], "Alice")
+        self.assertEqual(index.lookup("+62 896-6011-7691")["rm"], "1012210003")
+        self.assertIsNone(index.lookup("6280000000000"))
+        stats = index.stats()
+        self.assertEqual((stats["entries"], stats["shared_numbers"], stats["hits"], stats["lookups"]), (2, 0, 2, 3))
+
+    def test_shared_number_is_not_matched(self):
+        # Two leads on one family phone, in different formats: we cannot tell who is writing
+        index = PhoneIndex.build(ROWS + [dict(ROWS[0], NAMA="Alice's mum", **{"No. Whatsapp": "+62 812-2793-5875"})])
+        self.assertIsNone(index.lookup("6281227935875"))
+        self.assertEqual(index.lookup("+62 896-6011-7691")["rm"], "1012210003")
+        stats = index.stats()
+        self.assertEqual((stats["entries"], stats["shared_numbers"], stats["ambiguous_lookups"]), (1, 1, 1))
+
+
+class TestLeadStore(unittest.TestCase):
+    """Test CSV import, indexed lookups and export"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.csv_path = os.path.join(tmp.name, "leads.csv")
+        save_csv(self.csv_path, ROWS)
+        self.store = open_lead_store(self.csv_path, os.path.join(tmp.name, "leads.sqlite3"))
+
+    def test_indexed_lookups(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.by_rm("0612210002"), [ROWS[1]])
+        self.assertEqual([r["NAMA"] for r in self.store.by_phone("0896-6011-7691")], ["Cici"])
+        self.assertEqual([r["NAMA"] for r in self.store.birthdays_on(date(2025, 12, 9))], ["Alice", "Cici"])
+        self.assertEqual(self.store.get(2), ROWS[2])
+
+    def test_upcoming_birthdays_excludes_start_day(self):
+        upcoming = self.store.upcoming_birthdays(3, start=date(2025, 12, 8))
+        self.assertEqual([(d, [r["NAMA"] for r in rows]) for d, rows in upcoming],
+                         [(date(2025, 12, 9), ["Alice", "Cici"]), (date(2025, 12, 10), ["Bob"])])
+        self.assertEqual([d for d, _ in self.store.upcoming_birthdays(1, start=date(2025, 12, 9))], [date(2025, 12, 10)])
+
+    def test_upcoming_birthdays_across_new_year_and_leap_day(self):
+        save_csv(self.csv_path, [{"NAMA": "Dedi", "Tanggal lahir": "01/01/1990"},
+                                 {"NAMA": "Eka", "Tanggal lahir": "29/02/1992"}])
+        store = open_lead_store(self.csv_path, self.store.db_path)
+        self.assertEqual([(d, [r["NAMA"] for r in rows]) for d, rows in store.upcoming_birthdays(3, start=date(2025, 12, 30))],
+                         [(date(2026, 1, 1), ["Dedi"])])
+        self.assertEqual([(d, [r["NAMA"] for r in rows]) for d, rows in store.upcoming_birthdays(2, start=date(2027, 2, 27))],
+                         [(date(2027, 2, 28), ["Eka"])])
+        self.assertEqual([d for d, _ in store.upcoming_birthdays(2, start=date(2028, 2, 28))], [date(2028, 2, 29)])
+
+    def test_where_matches_csv_helper(self):
+        for column, value in [("Pekerjaan", "IRT"), ("ULTAH REMINDER", ""), ("missing", "")]:
+            self.assertEqual(self.store.where(column, value), get_rows_where_column_equals(ROWS, column, value))
+            self.assertEqual(get_rows_where_column_equals(self.store, column, value), self.store.where(column, value))
+
+    def test_where_uses_column_index(self):
+        self.store.where("Pekerjaan", "IRT")
+        path = '$."Pekerjaan"'
+        plan = self.store._conn().execute(
+            f"EXPLAIN QUERY PLAN SELECT data FROM leads WHERE trim(coalesce(json_extract(data, '{path}'), '')) = ?",
+            ("IRT",)).fetchall()
+        self.assertIn("USING INDEX idx_leads_where_", plan[0][-1])
+
+    def test_reimports_when_csv_changes(self):
+        db_path = self.store.db_path
+        self.assertEqual(len(open_lead_store(self.csv_path, db_path)), 3)
+        save_csv(self.csv_path, ROWS[:1])
+        self.assertEqual(len(open_lead_store(self.csv_path, db_path)), 1)
+
+    def test_set_field_and_export(self):
+        self.assertEqual(self.store.birthday_ids(12, 10), [1])
+        self.assertEqual(self.store.set_field([0], "ULTAH REMINDER", "") + self.store.set_field([1], "ULTAH REMINDER", "ULTAH HARI INI"), 2)
+        out = os.path.join(self.tmp, "export.csv")
+        self.assertEqual(self.store.export_csv(out), 3)
+        exported = load_csv(out)
+        self.assertEqual([r["ULTAH REMINDER"] for r in exported], ["", "ULTAH HARI INI", ""])
+        self.assertEqual(list(exported[0]), list(ROWS[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
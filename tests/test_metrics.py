@@ -0,0 +1,71 @@
+"""
+Tests for metrics module
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from src.metrics import Metrics, clear_metrics_dir
+
+
+class TestMetrics(unittest.TestCase):
+    """Test counters, histograms and Prometheus rendering"""
+
+    def test_counter_and_histogram_rendered(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.inc("whatsapp_simulated_sends_total", kind="text")
+        metrics.inc("whatsapp_simulated_sends_total", kind="text")
+        metrics.observe("llm_request_seconds", 0.05, outcome="ok")
+        metrics.observe("llm_request_seconds", 0.5, outcome="ok")
+        metrics.observe("llm_request_seconds", 3.0, outcome="ok")
+        body = metrics.render()
+        self.assertIn("# TYPE llm_request_seconds histogram", body)
+        self.assertIn('whatsapp_simulated_sends_total{kind="text"} 2', body)
+        self.assertIn('llm_request_seconds_bucket{outcome="ok",le="0.1"} 1', body)
+        self.assertIn('llm_request_seconds_bucket{outcome="ok",le="1"} 2', body)
+        self.assertIn('llm_request_seconds_bucket{outcome="ok",le="+Inf"} 3', body)
+        self.assertIn('llm_request_seconds_sum{outcome="ok"} 3.55', body)
+        self.assertIn('llm_request_seconds_count{outcome="ok"} 3', body)
+
+    def test_timer_records_duration(self):
+        metrics = Metrics()
+        with metrics.timer("webhook_stage_seconds", stage="parse"):
+            pass
+        self.assertIn('webhook_stage_seconds_count{stage="parse"} 1', metrics.render())
+
+    def test_label_values_escaped(self):
+        metrics = Metrics()
+        metrics.inc("llm_errors_total", call="chat", error='Bad "quote"')
+        self.assertIn('llm_errors_total{call="chat",error="Bad \\"quote\\""} 1', metrics.render())
+
+    def test_processes_sharing_directory_are_summed(self):
+        with tempfile.TemporaryDirectory() as d:
+            other = Metrics(d)
+            other.inc("webhook_requests_total", status="200")
+            other.observe("webhook_stage_seconds", 0.002, stage="total")
+            snapshot = other.snapshot()
+            snapshot["pid"] = 999999
+            with open(os.path.join(d, "999999.json"), "w") as f:
+                json.dump(snapshot, f)
+
+            metrics = Metrics(d)
+            metrics.inc("webhook_requests_total", status="200")
+            metrics.observe("webhook_stage_seconds", 0.002, stage="total")
+            body = metrics.render()
+            self.assertIn('webhook_requests_total{status="200"} 2', body)
+            self.assertIn('webhook_stage_seconds_count{stage="total"} 2', body)
+
+            clear_metrics_dir(d)
+            self.assertEqual(os.listdir(d), [])
+
+    def test_forked_process_starts_from_zero(self):
+        metrics = Metrics()
+        metrics.inc("webhook_requests_total", status="200")
+        metrics._pid = -1  # as seen from a child after fork
+        metrics.inc("webhook_requests_total", status="200")
+        self.assertIn('webhook_requests_total{status="200"} 1', metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
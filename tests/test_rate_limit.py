@@ -0,0 +1,108 @@
+"""
+Tests for per-sender rate limits and the LLM concurrency limit
+"""
+import asyncio
+import threading
+import time
+import unittest
+
+from src.rate_limit import AsyncConcurrencyLimit, ConcurrencyLimit, SenderLimiter
+
+
+class TestSenderLimiter(unittest.TestCase):
+    """Test per-key token buckets"""
+
+    def test_burst_then_limited_with_one_notice_per_streak(self):
+        limiter = SenderLimiter(rate=1 / 60, burst=2)
+        results = [limiter.allow("62811") for _ in range(4)]
+        self.assertEqual(results, [(True, False), (True, False), (False, True), (False, False)])
+        self.assertEqual(limiter.allow("62822"), (True, False))  # other senders are unaffected
+        self.assertEqual((limiter.stats()["allowed"], limiter.stats()["limited"]), (3, 2))
+
+    def test_refill_ends_the_streak(self):
+        limiter = SenderLimiter(rate=50, burst=1)
+        self.assertEqual(limiter.allow("62811"), (True, False))
+        self.assertEqual(limiter.allow("62811"), (False, True))
+        time.sleep(0.05)
+        self.assertEqual(limiter.allow("62811"), (True, False))
+        self.assertEqual(limiter.allow("62811"), (False, True))
+
+    def test_least_recent_senders_evicted(self):
+        limiter = SenderLimiter(rate=1 / 60, burst=1, max_keys=2)
+        for key in ("a", "b", "c"):
+            limiter.allow(key)
+        self.assertEqual(limiter.stats()["senders"], 2)
+        self.assertEqual(limiter.allow("a"), (True, False))  # forgotten, so a fresh bucket
+
+    def test_zero_rate_disables(self):
+        limiter = SenderLimiter(0)
+        self.assertTrue(all(limiter.allow("62811")[0] for _ in range(100)))
+
+
+class TestConcurrencyLimit(unittest.TestCase):
+    """Test the thread-based slot limit"""
+
+    def test_sheds_when_queue_full(self):
+        limit = ConcurrencyLimit(1, max_waiting=0)
+        self.assertTrue(limit.acquire())
+        self.assertFalse(limit.acquire(timeout=1))
+        self.assertEqual(limit.stats()["shed"], 1)
+
+    def test_waiter_gets_released_slot(self):
+        limit = ConcurrencyLimit(1, max_waiting=1)
+        limit.acquire()
+        got = []
+        t = threading.Thread(target=lambda: got.append(limit.acquire(timeout=2)))
+        t.start()
+        time.sleep(0.05)
+        self.assertEqual(limit.stats()["waiting"], 1)
+        limit.release()
+        t.join()
+        self.assertEqual(got, [True])
+        self.assertEqual((limit.active, limit.waiting), (1, 0))
+
+    def test_wait_times_out(self):
+        limit = ConcurrencyLimit(1, max_waiting=1)
+        limit.acquire()
+        self.assertFalse(limit.acquire(timeout=0.01))
+        self.assertEqual((limit.stats()["timeouts"], limit.waiting), (1, 0))
+
+
+class TestAsyncConcurrencyLimit(unittest.TestCase):
+    """Test the event-loop slot limit"""
+
+    def test_slots_handed_over_in_order_and_shed_beyond_queue(self):
+        async def scenario():
+            limit = AsyncConcurrencyLimit(1, max_waiting=2)
+            order = []
+
+            async def worker(name):
+                if not await limit.acquire(timeout=1):
+                    order.append(f"{name}:shed")
+                    return
+                order.append(name)
+                await asyncio.sleep(0.01)
+                limit.release()
+
+            await asyncio.gather(*(worker(n) for n in "abcd"))
+            return order, limit.stats()
+
+        order, stats = asyncio.run(scenario())
+        self.assertEqual(order, ["a", "d:shed", "b", "c"])
+        self.assertEqual((stats["active"], stats["waiting"], stats["shed"], stats["peak"]), (0, 0, 1, 1))
+
+    def test_wait_times_out(self):
+        async def scenario():
+            limit = AsyncConcurrencyLimit(1, max_waiting=1)
+            await limit.acquire()
+            timed_out = not await limit.acquire(timeout=0.01)
+            limit.release()
+            return timed_out, limit.stats()
+
+        timed_out, stats = asyncio.run(scenario())
+        self.assertTrue(timed_out)
+        self.assertEqual((stats["timeouts"], stats["active"], stats["waiting"]), (1, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Tests for reminders module
+"""
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+from src import reminders
+from src.csv_manager import load_csv, save_csv, stream_birthday_reminders
+
+
+ROWS = [
+    {"NAMA": "Alice", "Tanggal lahir": "09/12/1990", "ULTAH REMINDER": "ULTAH HARI INI"},
+    {"NAMA": "Bob", "Tanggal lahir": "10/12/1991", "ULTAH REMINDER": ""},
+    {"NAMA": "Cici", "Tanggal lahir": "1985-12-09", "ULTAH REMINDER": ""},
+]
+
+
+class TestRefreshReminders(unittest.TestCase):
+    """Test skipped, incremental and full reminder updates"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = os.path.join(tmp.name, "leads.csv")
+        self.dst = os.path.join(tmp.name, "updated.csv")
+        save_csv(self.src, ROWS)
+        patch = mock.patch.object(reminders, "LEAD_DB", os.path.join(tmp.name, "leads.sqlite3"))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _flags(self):
+        return [r["ULTAH REMINDER"] for r in load_csv(self.dst)]
+
+    def test_same_day_rerun_is_skipped(self):
+        self.assertEqual(reminders.refresh_reminders(self.src, self.dst, today=date(2025, 12, 9)), 1)
+        with mock.patch.object(reminders, "stream_birthday_reminders") as stream, \
+                mock.patch.object(reminders, "rewrite_column") as rewrite:
+            self.assertEqual(reminders.refresh_reminders(self.src, self.dst, today=date(2025, 12, 9)), 0)
+        stream.assert_not_called()
+        rewrite.assert_not_called()
+        self.assertEqual(self._flags(), ["ULTAH HARI INI", "", "ULTAH HARI INI"])
+
+    def test_next_day_only_moves_flags(self):
+        reminders.refresh_reminders(self.src, self.dst, today=date(2025, 12, 9))
+        with mock.patch.object(reminders, "stream_birthday_reminders") as stream:
+            updated = reminders.refresh_reminders(self.src, self.dst, today=date(2025, 12, 10))
+        stream.assert_not_called()
+        self.assertEqual(updated, 3)
+        self.assertEqual(self._flags(), ["", "ULTAH HARI INI", ""])
+
+        # Same result as a full pass
+        full = self.dst + ".full.csv"
+        stream_birthday_reminders(self.src, full, today=date(2025, 12, 10))
+        with open(full, encoding="utf-8") as a, open(self.dst, encoding="utf-8") as b:
+            self.assertEqual(a.read(), b.read())
+
+    def test_changed_source_or_output_runs_full_pass(self):
+        reminders.refresh_reminders(self.src, self.dst, today=date(2025, 12, 9))
+        save_csv(self.src, ROWS + [{"NAMA": "Dedi", "Tanggal lahir": "10/12/1980", "ULTAH REMINDER": ""}])
+        reminders.refresh_reminders(self.src, self.dst, today=date(2025, 12, 10))
+        self.assertEqual(self._flags(), ["", "ULTAH HARI INI", "", "ULTAH HARI INI"])
+
+        os.remove(self.dst)
+        reminders.refresh_reminders(self.src, self.dst, today=date(2025, 12, 10))
+        self.assertEqual(self._flags(), ["", "ULTAH HARI INI", "", "ULTAH HARI INI"])
+
+
+if __name__ == '__main__':
+    unittest.main()
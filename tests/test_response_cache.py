@@ -0,0 +1,67 @@
+"""
+Tests for response_cache module
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.response_cache import ResponseCache, normalize_question
+
+
+class TestNormalizeQuestion(unittest.TestCase):
+    """Test question normalization"""
+
+    def test_folds_case_punctuation_and_slang(self):
+        self.assertEqual(normalize_question("Hrg facial acne brp kak??"), "harga facial acne berapa")
+        self.assertEqual(normalize_question("  HARGA   facial acne berapa?  "), "harga facial acne berapa")
+
+    def test_collapses_repeated_letters(self):
+        self.assertEqual(normalize_question("ada promooo apa yaaa"), normalize_question("ada promo apa"))
+
+    def test_repeated_digits_are_kept(self):
+        self.assertNotEqual(normalize_question("harga 1000000"), normalize_question("harga 10"))
+        self.assertNotEqual(normalize_question("paket 2000"), normalize_question("paket 20"))
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test LRU, TTL, SQLite sharing and catalog invalidation"""
+
+    def test_hit_for_equivalent_question(self):
+        cache = ResponseCache()
+        cache.set("Ada promo apa?", "v1", "Promo kemerdekaan kak!", gen_seconds=1.5)
+        self.assertEqual(cache.get("ada promo apa kak", "v1"), "Promo kemerdekaan kak!")
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["saved_ms"], 1500.0)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set("satu", "v1", "1")
+        cache.set("dua", "v1", "2")
+        cache.get("satu", "v1")
+        cache.set("tiga", "v1", "3")
+        self.assertIsNone(cache.get("dua", "v1"))
+        self.assertEqual(cache.get("satu", "v1"), "1")
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl=10)
+        with mock.patch("src.response_cache.time.time", return_value=1000.0):
+            cache.set("promo", "v1", "ada")
+        with mock.patch("src.response_cache.time.time", return_value=1011.0):
+            self.assertIsNone(cache.get("promo", "v1"))
+
+    def test_sqlite_store_shared_and_dropped_on_catalog_change(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, "cache.sqlite3")
+            ResponseCache(db).set("harga laser pico", "v1", "Rp 1.500.000")
+
+            other_process = ResponseCache(db)
+            self.assertEqual(other_process.get("Harga laser pico?", "v1"), "Rp 1.500.000")
+            self.assertEqual(other_process.stats()["db_hits"], 1)
+
+            self.assertIsNone(other_process.get("harga laser pico", "v2"))
+            self.assertIsNone(ResponseCache(db).get("harga laser pico", "v1"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests for retrieval module
+"""
+import unittest
+from src.retrieval import TreatmentIndex, select_relevant_treatments
+from src.catalog import Catalog
+from src.llm_manager import build_system_message, SYSTEM_INSTRUCTIONS, PROMPT_CACHE_STATS
+
+PRICES = {
+    "treatments": {
+        "acne_series_treatment": [
+            {"name": "Acne Rescue & Repair", "description": "Jerawat Bruntusan, Mengurangi Kemerahan",
+             "includes": ["Facial Acne Redness", "Serum Acne"]},
+        ],
+        "anti_aging_series": [
+            {"name": "Timeless Youth", "description": "Kerutan halus, kulit kendur", "includes": ["RF", "Serum"]},
+        ],
+        "laser_pico_launching_promo": [
+            {"name": "Pico Laser Glow", "description": "Flek hitam, pigmentasi", "includes": ["Laser Pico"]},
+        ],
+    }
+}
+
+
+class TestTreatmentIndex(unittest.TestCase):
+    """Test BM25 treatment retrieval"""
+
+    def test_search_ranks_matching_treatment_first(self):
+        hits = TreatmentIndex(PRICES).search("Harga laser pico berapa?", k=2)
+        self.assertEqual(hits[0][2]["name"], "Pico Laser Glow")
+
+    def test_search_maps_everyday_words_and_suffixes(self):
+        hits = TreatmentIndex(PRICES).search("muka aku jerawatan parah", k=1)
+        self.assertEqual(hits[0][1], "acne_series_treatment")
+
+    def test_select_returns_none_without_matches(self):
+        self.assertIsNone(select_relevant_treatments(TreatmentIndex(PRICES), "selamat pagi", k=3))
+
+    def test_select_disabled_with_zero_k(self):
+        self.assertIsNone(select_relevant_treatments(TreatmentIndex(PRICES), "laser pico", k=0))
+
+    def test_select_groups_by_category(self):
+        result = select_relevant_treatments(TreatmentIndex(PRICES), "keriput", k=3)
+        self.assertEqual(list(result), ["anti_aging_series"])
+
+
+class TestSystemMessage(unittest.TestCase):
+    """Test system prompt layout and per-version caching"""
+
+    def test_prompt_starts_with_fixed_instructions(self):
+        self.assertTrue(build_system_message(PRICES, "laser pico").startswith(SYSTEM_INSTRUCTIONS))
+        self.assertTrue(build_system_message(PRICES, "selamat pagi").startswith(SYSTEM_INSTRUCTIONS))
+
+    def test_full_catalog_prompt_reused_per_version(self):
+        catalog = Catalog(PRICES, "test-version-1")
+        first = build_system_message(catalog, top_k=0)
+        reuses = PROMPT_CACHE_STATS["reuses"]
+        self.assertIs(build_system_message(catalog, top_k=0), first)
+        self.assertEqual(PROMPT_CACHE_STATS["reuses"], reuses + 1)
+        self.assertIsNot(build_system_message(Catalog(PRICES, "test-version-2"), top_k=0), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Tests for the asyncio webhook server
+"""
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from aiohttp.test_utils import AioHTTPTestCase
+
+from src import server_async, server_flask
+from src.response_cache import ResponseCache
+from src.session_store import SessionStore
+from src.dedup import MessageDeduplicator
+from src.phone import PhoneIndex
+from src.metrics import Metrics
+from src.rate_limit import AsyncConcurrencyLimit, SenderLimiter
+from tests.test_server_flask import PATIENTS, _payload
+
+
+class TestAsyncWebhook(AioHTTPTestCase):
+    """Test the async server against the same contract as server_flask"""
+
+    async def get_application(self):
+        return server_async.create_app()
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(server_async, "PREWARM", False),
+            mock.patch.object(server_async, "WEBHOOK_ASYNC", False),
+            mock.patch.object(server_async, "SPECULATIVE_MODERATION", False),
+            mock.patch.object(server_async, "amoderate_content", mock.AsyncMock(return_value=(False, "Content is clean."))),
+            mock.patch.object(server_async, "aget_llm_response", mock.AsyncMock(return_value="Halo kak!")),
+            mock.patch.object(server_async, "asend_text_message", mock.AsyncMock(return_value=(True, "ok"))),
+            mock.patch.object(server_async, "METRICS", Metrics()),
+            mock.patch.object(server_flask, "METRICS", Metrics()),
+            mock.patch.object(server_flask, "RESPONSE_CACHE", ResponseCache()),
+            mock.patch.object(server_flask, "SESSIONS", SessionStore()),
+            mock.patch.object(server_flask, "DEDUP", MessageDeduplicator()),
+            mock.patch.object(server_flask, "PATIENTS", PhoneIndex.build(PATIENTS)),
+            mock.patch.object(server_flask, "SENDER_LIMIT", SenderLimiter(0)),
+            mock.patch.object(server_async, "LLM_LIMIT", AsyncConcurrencyLimit(0)),
+        ]
+        mocks = [p.start() for p in patches]
+        self.moderate, self.llm, self.send = mocks[3:6]
+        for p in patches:
+            self.addCleanup(p.stop)
+        super().setUp()
+
+    async def test_health_and_verify(self):
+        resp = await self.client.get("/")
+        self.assertEqual((await resp.json())["status"], "ok")
+        with mock.patch.object(server_flask, "VERIFY_TOKEN", "secret"):
+            ok = await self.client.get("/webhook", params={"hub.mode": "subscribe", "hub.verify_token": "secret",
+                                                           "hub.challenge": "42"})
+            bad = await self.client.get("/webhook", params={"hub.mode": "subscribe", "hub.verify_token": "nope"})
+        self.assertEqual((ok.status, await ok.text()), (200, "42"))
+        self.assertEqual(bad.status, 403)
+
+    async def test_inline_mode_replies_before_returning(self):
+        resp = await self.client.post("/webhook", json=_payload("harga facial?"))
+        self.assertEqual(resp.status, 200)
+        self.send.assert_awaited_once_with("628123456789", "Halo kak!")
+
+    async def test_background_mode_replies_after_ack(self):
+        with mock.patch.object(server_async, "WEBHOOK_ASYNC", True):
+            resp = await self.client.post("/webhook", json=_payload("harga facial?", "ada promo?"))
+        self.assertEqual(resp.status, 200)
+        await asyncio.gather(*server_async._BACKGROUND)
+        self.assertEqual(self.send.await_count, 2)
+
+    async def test_redelivered_message_is_ignored(self):
+        await self.client.post("/webhook", json=_payload("harga facial?", ids=["wamid.1"]))
+        await self.client.post("/webhook", json=_payload("harga facial?", ids=["wamid.1"]))
+        self.assertEqual(self.send.await_count, 1)
+
+    async def test_follow_up_shares_history_and_patient_context(self):
+        with mock.patch.object(server_async, "PATIENT_CONTEXT", True):
+            await self.client.post("/webhook", json=_payload("ada laser pico?", from_number="6281227935875"))
+            await self.client.post("/webhook", json=_payload("yang itu harganya?", from_number="6281227935875"))
+        sent_messages = self.llm.await_args[0][0]
+        self.assertEqual([m["role"] for m in sent_messages], ["system", "user", "assistant", "user"])
+        self.assertIn("KASNIAH", sent_messages[0]["content"])
+
+    async def test_flagged_message_gets_polite_refusal(self):
+        self.moderate.return_value = (True, "{}")
+        await self.client.post("/webhook", json=_payload("kata kasar"))
+        self.send.assert_awaited_once_with("628123456789", server_flask.MODERATION_REPLY)
+        self.llm.assert_not_awaited()
+
+    async def test_speculative_flagged_message_discards_generated_reply(self):
+        self.moderate.return_value = (True, "{}")
+        with mock.patch.object(server_async, "SPECULATIVE_MODERATION", True):
+            await self.client.post("/webhook", json=_payload("kata kasar"))
+        self.send.assert_awaited_once_with("628123456789", server_flask.MODERATION_REPLY)
+
+    async def test_llm_failure_counted_as_fallback(self):
+        self.llm.return_value = "[LLM Unavailable] Selamat ulang tahun!"
+        await self.client.post("/webhook", json=_payload("harga facial?"))
+        body = await (await self.client.get("/metrics")).text()
+        self.assertIn('fallback_replies_total{reason="llm_unavailable"} 1', body)
+        self.assertEqual(server_flask.SESSIONS.history("628123456789"), [])
+        self.assertNotIn("ulang tahun", self.send.await_args[0][1])
+
+    async def test_sqlite_stores_used_off_the_event_loop(self):
+        threads = []
+        real_history, real_seen = server_flask.SESSIONS.history, server_flask.DEDUP.seen_before
+
+        def record(fn):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return fn(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(server_flask.SESSIONS, "history", record(real_history)), \
+                mock.patch.object(server_flask.DEDUP, "seen_before", record(real_seen)):
+            await self.client.post("/webhook", json=_payload("harga facial?"))
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    async def test_metrics_content_type(self):
+        resp = await self.client.get("/metrics")
+        self.assertEqual(resp.headers["Content-Type"], "text/plain; version=0.0.4")
+        self.assertNotIn("X-Metrics-Format", resp.headers)
+
+    async def test_full_llm_backlog_gets_busy_reply(self):
+        limit = AsyncConcurrencyLimit(1, max_waiting=0)
+        await limit.acquire()
+        with mock.patch.object(server_async, "LLM_LIMIT", limit):
+            await self.client.post("/webhook", json=_payload("harga facial?"))
+        self.moderate.assert_not_awaited()
+        self.send.assert_awaited_once_with("628123456789", server_flask.BUSY_REPLY)
+        body = await (await self.client.get("/metrics")).text()
+        self.assertIn('messages_shed_total{reason="llm_backlog"} 1', body)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,305 @@
+"""
+Tests for server_flask webhook handling
+"""
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from src import server_flask
+from src.response_cache import ResponseCache
+from src.session_store import SessionStore
+from src.dedup import MessageDeduplicator
+from src.phone import PhoneIndex
+from src.metrics import Metrics
+from src.rate_limit import ConcurrencyLimit, SenderLimiter
+from src.webhook_queue import WebhookQueue
+
+PATIENTS = [{"NAMA": "KASNIAH", "UMUR": "45", "Nomor RM": "0312210001", "No. Whatsapp": "0812-2793-5875"}]
+
+
+def _payload(*texts, from_number="628123456789", ids=None):
+    messages = [
+        {"from": from_number, "id": ids[i] if ids else f"wamid.{from_number}.{t}", "type": "text", "text": {"body": t}}
+        for i, t in enumerate(texts)
+    ]
+    return {"entry": [{"changes": [{"value": {"messages": messages}}]}]}
+
+
+class TestWebhookReceive(unittest.TestCase):
+    """Test inline and queued webhook processing"""
+
+    def setUp(self):
+        self.client = server_flask.app.test_client()
+        patches = [
+            mock.patch.object(server_flask, "moderate_content", return_value=(False, "Content is clean.")),
+            mock.patch.object(server_flask, "get_llm_response", return_value="Halo kak!"),
+            mock.patch.object(server_flask, "send_text_message", return_value=(True, "ok")),
+            mock.patch.object(server_flask, "RESPONSE_CACHE", ResponseCache()),
+            mock.patch.object(server_flask, "SESSIONS", SessionStore()),
+            mock.patch.object(server_flask, "DEDUP", MessageDeduplicator()),
+            mock.patch.object(server_flask, "PATIENTS", PhoneIndex.build(PATIENTS)),
+            mock.patch.object(server_flask, "METRICS", Metrics()),
+            mock.patch.object(server_flask, "SENDER_LIMIT", SenderLimiter(0)),
+            mock.patch.object(server_flask, "LLM_LIMIT", ConcurrencyLimit(0)),
+        ]
+        self.moderate, self.llm, self.send, self.cache, self.sessions, self.dedup, self.patients, self.metrics = \
+            [p.start() for p in patches][:8]
+        for p in patches:
+            self.addCleanup(p.stop)
+
+    def test_inline_mode_replies_before_returning(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False):
+            resp = self.client.post("/webhook", json=_payload("harga facial?"))
+        self.assertEqual(resp.status_code, 200)
+        self.send.assert_called_once_with("628123456789", "Halo kak!")
+
+    def test_async_mode_enqueues_and_workers_reply(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", True):
+            resp = self.client.post("/webhook", json=_payload("harga facial?", "ada promo?"))
+        self.assertEqual(resp.status_code, 200)
+        server_flask.WEBHOOK_QUEUE.join()
+        self.assertEqual(self.send.call_count, 2)
+
+        stats = self.client.get("/stats").get_json()
+        self.assertEqual(stats["queue"]["depth"], 0)
+        self.assertGreaterEqual(stats["queue"]["processed"], 2)
+        self.assertIn("p95", stats["queue"]["latency_ms"])
+
+    def test_queue_drain_waits_for_in_flight_messages(self):
+        release = threading.Event()
+        q = WebhookQueue(lambda item: release.wait(5), workers=1)
+        q.submit("m1")
+        self.assertFalse(q.drain(timeout=0.05))
+        release.set()
+        self.assertTrue(q.drain(timeout=5))
+        self.assertEqual(q.stats()["processed"], 1)
+
+    def test_repeated_question_served_from_cache(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False):
+            self.client.post("/webhook", json=_payload("Harga facial acne berapa?", from_number="62811"))
+            self.client.post("/webhook", json=_payload("hrg facial acne brp kak??", from_number="62822"))
+        self.assertEqual(self.llm.call_count, 1)
+        self.assertEqual(self.send.call_count, 2)
+        self.assertEqual(self.client.get("/stats").get_json()["response_cache"]["hits"], 1)
+
+    def test_follow_up_carries_conversation_history(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False):
+            self.client.post("/webhook", json=_payload("ada laser pico?"))
+            self.client.post("/webhook", json=_payload("yang itu harganya berapa?"))
+        self.assertEqual(self.llm.call_count, 2)
+        sent_messages = self.llm.call_args[0][0]
+        self.assertEqual([m["role"] for m in sent_messages], ["user", "assistant", "user"])
+        self.assertIn("laser pico", sent_messages[0]["content"])
+
+    def test_redelivered_message_is_ignored(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False):
+            for _ in range(3):
+                resp = self.client.post("/webhook", json=_payload("harga facial?", ids=["wamid.same"]))
+                self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.moderate.call_count, 1)
+        self.assertEqual(self.llm.call_count, 1)
+        self.assertEqual(self.send.call_count, 1)
+        self.assertEqual(self.client.get("/stats").get_json()["dedup"]["duplicates"], 2)
+
+    def test_metrics_endpoint_reports_stages_and_fallbacks(self):
+        self.llm.return_value = "[LLM Unavailable] Selamat ulang tahun!"
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False):
+            self.client.post("/webhook", json=_payload("harga facial?"))
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.mimetype.startswith("text/plain"))
+        body = resp.get_data(as_text=True)
+        self.assertIn('webhook_requests_total{status="200"} 1', body)
+        for stage in ("signature", "parse", "dedup", "handle", "total"):
+            self.assertIn(f'webhook_stage_seconds_count{{stage="{stage}"}} 1', body)
+        self.assertIn('fallback_replies_total{reason="llm_unavailable"} 1', body)
+        self.assertIn('message_handle_seconds_count{type="text"} 1', body)
+
+    def test_llm_failure_answers_from_price_list_not_birthday_greeting(self):
+        self.llm.return_value = "[LLM Unavailable] Selamat ulang tahun!"
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False):
+            self.client.post("/webhook", json=_payload("harga facial acne berapa?"))
+        sent = self.send.call_args[0][1]
+        self.assertNotIn("ulang tahun", sent)
+        self.assertIn("gangguan", sent)
+        self.assertIn("Rp", sent)
+
+    def test_known_patient_matched_and_named_in_prompt(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False), \
+                mock.patch.object(server_flask, "PATIENT_CONTEXT", True):
+            self.client.post("/webhook", json=_payload("ada promo?", from_number="6281227935875"))
+            self.client.post("/webhook", json=_payload("ada promo?", from_number="62899"))
+        first_call = self.llm.call_args_list[0][0][0]
+        self.assertEqual(first_call[0]["role"], "system")
+        self.assertIn("KASNIAH", first_call[0]["content"])
+        self.assertEqual(self.llm.call_count, 2)  # personalized reply is not reused from the cache
+        stats = self.client.get("/stats").get_json()["patients"]
+        self.assertEqual((stats["lookups"], stats["hits"]), (2, 1))
+        self.assertIn("avg_lookup_us", stats)
+
+    def test_flagged_message_gets_polite_refusal(self):
+        self.moderate.return_value = (True, "{}")
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False):
+            self.client.post("/webhook", json=_payload("kata kasar"))
+        self.llm.assert_not_called()
+        self.assertIn("kurang sesuai", self.send.call_args[0][1])
+
+    def test_sender_over_limit_is_told_once_and_not_answered(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False), \
+                mock.patch.object(server_flask, "SENDER_LIMIT", SenderLimiter(1 / 60, 2)):
+            for i in range(4):
+                self.client.post("/webhook", json=_payload("halo kak", ids=[f"wamid.{i}"]))
+        self.assertEqual(self.llm.call_count, 2)
+        self.assertEqual([c[0][1] for c in self.send.call_args_list],
+                         ["Halo kak!", "Halo kak!", server_flask.SLOW_DOWN_REPLY])
+        self.assertIn("messages_rate_limited_total 2", self.client.get("/metrics").get_data(as_text=True))
+
+    def test_full_llm_backlog_gets_busy_reply(self):
+        limit = ConcurrencyLimit(1, max_waiting=0)
+        limit.acquire()  # the only slot is taken
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", False), \
+                mock.patch.object(server_flask, "LLM_LIMIT", limit):
+            self.client.post("/webhook", json=_payload("harga facial?"))
+            stats = self.client.get("/stats").get_json()["limits"]["llm"]
+        self.moderate.assert_not_called()
+        self.send.assert_called_once_with("628123456789", server_flask.BUSY_REPLY)
+        self.assertEqual(stats["shed"], 1)
+        self.assertIn('messages_shed_total{reason="llm_backlog"} 1', self.client.get("/metrics").get_data(as_text=True))
+
+    def test_long_queue_sheds_before_enqueueing(self):
+        with mock.patch.object(server_flask, "WEBHOOK_ASYNC", True), \
+                mock.patch.object(server_flask, "LLM_MAX_BACKLOG", 3), \
+                mock.patch.object(server_flask.WEBHOOK_QUEUE, "depth", return_value=3):
+            self.client.post("/webhook", json=_payload("harga facial?"))
+        self.send.assert_called_once_with("628123456789", server_flask.BUSY_REPLY)
+        self.assertIn('messages_shed_total{reason="queue_backlog"} 1', self.client.get("/metrics").get_data(as_text=True))
+
+
+class TestSpeculativeModeration(unittest.TestCase):
+    """Test moderation and generation running concurrently"""
+
+    def setUp(self):
+        self.client = server_flask.app.test_client()
+
+        def slow(result):
+            def fn(*args, **kwargs):
+                time.sleep(0.1)
+                return result
+            return fn
+
+        patches = [
+            mock.patch.object(server_flask, "WEBHOOK_ASYNC", False),
+            mock.patch.object(server_flask, "SPECULATIVE_MODERATION", True),
+            mock.patch.object(server_flask, "moderate_content", side_effect=slow((False, "Content is clean."))),
+            mock.patch.object(server_flask, "get_llm_response", side_effect=slow("Halo kak!")),
+            mock.patch.object(server_flask, "send_text_message", return_value=(True, "ok")),
+            mock.patch.object(server_flask, "RESPONSE_CACHE", None),
+            mock.patch.object(server_flask, "SESSIONS", SessionStore()),
+            mock.patch.object(server_flask, "DEDUP", MessageDeduplicator()),
+            mock.patch.object(server_flask, "SENDER_LIMIT", SenderLimiter(0)),
+        ]
+        pool = ThreadPoolExecutor(max_workers=4)
+        patches.append(mock.patch.object(server_flask, "_SPECULATIVE_POOL", pool))
+        mocks = [p.start() for p in patches]
+        self.moderate, self.llm, self.send = mocks[2:5]
+        for p in patches:
+            self.addCleanup(p.stop)
+        # Discarded generations must finish before the mocks above are removed
+        self.addCleanup(pool.shutdown, wait=True)
+
+    def test_clean_message_overlaps_both_calls(self):
+        before = server_flask.speculative_stats()["saved_ms"]["count"]
+        start = time.perf_counter()
+        self.client.post("/webhook", json=_payload("harga facial?"))
+        self.assertLess(time.perf_counter() - start, 0.19)
+        self.send.assert_called_once_with("628123456789", "Halo kak!")
+        self.assertEqual(server_flask.speculative_stats()["saved_ms"]["count"], before + 1)
+
+    def test_flagged_message_discards_generated_reply(self):
+        self.moderate.side_effect = None
+        self.moderate.return_value = (True, "{}")
+        self.client.post("/webhook", json=_payload("kata kasar"))
+        self.send.assert_called_once_with("628123456789", server_flask.MODERATION_REPLY)
+
+    def test_busy_pool_never_sends_unmoderated_reply(self):
+        busy = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(busy.shutdown, wait=True)
+        unblock = threading.Event()
+        busy.submit(unblock.wait, 5)
+        with mock.patch.object(server_flask, "_SPECULATIVE_POOL", busy), \
+                mock.patch.object(server_flask, "MODERATION_TIMEOUT", -0.8), \
+                mock.patch.object(server_flask, "RESPONSE_CACHE", None):
+            self.client.post("/webhook", json=_payload("harga facial?"))
+        unblock.set()
+        self.moderate.assert_not_called()
+        self.llm.assert_not_called()
+        reply = self.send.call_args[0][1]
+        self.assertNotEqual(reply, "Halo kak!")
+        self.assertEqual(reply, server_flask.fallback_reply(server_flask.get_catalog(server_flask.PRICES_FILE), "harga facial?"))
+        self.assertGreaterEqual(server_flask.speculative_stats()["moderation_not_started"], 1)
+
+    def test_llm_slot_held_until_timed_out_generation_finishes(self):
+        finish = threading.Event()
+        started = threading.Event()
+
+        def hanging_llm(*args, **kwargs):
+            started.set()
+            finish.wait(5)
+            return "Halo kak!"
+
+        self.llm.side_effect = hanging_llm
+        limit = ConcurrencyLimit(1)
+        with mock.patch.object(server_flask, "LLM_LIMIT", limit), mock.patch.object(server_flask, "LLM_TIMEOUT", 0):
+            self.client.post("/webhook", json=_payload("harga facial?"))
+            self.send.assert_called_once_with("628123456789", server_flask.LLM_TIMEOUT_REPLY)
+            self.assertTrue(started.is_set())
+            self.assertEqual(limit.active, 1)
+            finish.set()
+            server_flask._SPECULATIVE_POOL.shutdown(wait=True)
+            self.assertEqual(limit.active, 0)
+
+
+class TestPrewarm(unittest.TestCase):
+    """Test lazy startup and background prewarm"""
+
+    def test_prewarm_builds_patient_index_and_clients(self):
+        with mock.patch.object(server_flask, "PATIENTS", None), \
+                mock.patch.object(server_flask.PhoneIndex, "from_csv", return_value=PhoneIndex.build(PATIENTS)) as from_csv, \
+                mock.patch.object(server_flask, "get_client") as get_client, \
+                mock.patch.object(server_flask, "get_session") as get_session, \
+                mock.patch.object(server_flask, "PREWARM", True):
+            with mock.patch.object(server_flask, "READY", server_flask.threading.Event()):
+                server_flask.start_prewarm().join(timeout=5)
+            self.assertIsNotNone(server_flask.PATIENTS)
+            server_flask._patients()
+        from_csv.assert_called_once()
+        get_client.assert_called_once_with()
+        get_session.assert_called_once_with()
+
+    def test_prewarm_disabled(self):
+        with mock.patch.object(server_flask, "PREWARM", False), \
+                mock.patch.object(server_flask, "READY", server_flask.threading.Event()):
+            self.assertIsNone(server_flask.start_prewarm())
+            self.assertEqual(server_flask.app.test_client().get("/ready").status_code, 200)
+
+    def test_ready_only_after_prewarm(self):
+        client = server_flask.app.test_client()
+        with mock.patch.object(server_flask, "READY", server_flask.threading.Event()), \
+                mock.patch.object(server_flask, "PATIENTS", PhoneIndex.build(PATIENTS)), \
+                mock.patch.object(server_flask, "get_client"), mock.patch.object(server_flask, "get_session"):
+            self.assertEqual(client.get("/ready").status_code, 503)
+            server_flask.prewarm()
+            self.assertEqual(client.get("/ready").get_json()["status"], "ready")
+
+    def test_reload_rebuilds_patient_index(self):
+        old, new = PhoneIndex.build([]), PhoneIndex.build(PATIENTS)
+        with mock.patch.object(server_flask, "PATIENTS", old), \
+                mock.patch.object(server_flask.PhoneIndex, "from_csv", return_value=new):
+            server_flask.load_shared_data(reload=True)
+            self.assertIs(server_flask._patients(), new)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for session_store module
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.session_store import SessionStore
+
+
+class TestSessionStore(unittest.TestCase):
+    """Test per-number conversation history"""
+
+    def test_history_keeps_exchanges_per_number(self):
+        store = SessionStore()
+        store.append("62811", "Pasien bertanya: ada laser pico?", "Ada kak!")
+        self.assertEqual(store.history("62811"), [
+            {"role": "user", "content": "Pasien bertanya: ada laser pico?"},
+            {"role": "assistant", "content": "Ada kak!"},
+        ])
+        self.assertEqual(store.history("62822"), [])
+
+    def test_history_trimmed_to_token_budget_with_summary(self):
+        store = SessionStore(token_budget=120)
+        for i in range(20):
+            store.append("62811", f"Pasien bertanya: pertanyaan nomor {i} tentang facial", "x" * 80)
+        history = store.history("62811")
+        self.assertEqual(history[0]["role"], "system")
+        self.assertIn("pertanyaan nomor 17", history[0]["content"])
+        self.assertLessEqual(store._sessions["62811"].tokens(), 120)
+        self.assertEqual(history[-2]["content"], "Pasien bertanya: pertanyaan nomor 19 tentang facial")
+        self.assertLess(len(history), 8)
+
+    def test_memory_bounded_and_reloaded_from_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SessionStore(os.path.join(tmp, "sessions.sqlite3"), max_sessions=2)
+            for number in ("1", "2", "3"):
+                store.append(number, f"halo dari {number}", "halo kak")
+            self.assertEqual(store.stats()["active"], 2)
+            self.assertEqual(store.history("1")[0]["content"], "halo dari 1")
+            self.assertEqual(store.stats()["loaded"], 1)
+
+    def test_idle_sessions_expire(self):
+        store = SessionStore(idle_ttl=60)
+        with mock.patch("src.session_store.time.time", return_value=1000.0):
+            store.append("62811", "halo", "halo kak")
+        with mock.patch("src.session_store.time.time", return_value=1061.0):
+            self.assertEqual(store.history("62811"), [])
+
+    def test_expired_rows_purged_from_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch("src.session_store.time.time", return_value=1000.0):
+                store = SessionStore(os.path.join(tmp, "sessions.sqlite3"), idle_ttl=60, purge_interval=300)
+                store.append("62811", "halo", "halo kak")
+            with mock.patch("src.session_store.time.time", return_value=1100.0):
+                store.append("62822", "halo", "halo kak")
+                self.assertEqual(store.stats()["purged"], 0)  # interval not yet reached
+            with mock.patch("src.session_store.time.time", return_value=1300.0):
+                store.append("62833", "halo", "halo kak")
+            numbers = [n for (n,) in store._conn().execute("SELECT number FROM sessions ORDER BY number")]
+            self.assertEqual(numbers, ["62833"])
+            self.assertEqual(store.stats()["purged"], 2)
+
+    def test_sqlite_read_does_not_hold_store_lock(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SessionStore(os.path.join(tmp, "sessions.sqlite3"))
+            store.append("62811", "halo", "halo kak")
+            real_conn = store._conn
+            held = []
+
+            def conn():
+                held.append(store._lock.locked())
+                return real_conn()
+
+            with mock.patch.object(store, "_conn", side_effect=conn):
+                store.history("62822")
+            self.assertTrue(held)
+            self.assertFalse(any(held))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Tests for whatsapp_api module against a local Graph API stub
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+import aiohttp
+import requests
+
+from src import whatsapp_api
+from benchmarks.stubs import GraphApiStub
+
+
+class TestSendTextMessage(unittest.TestCase):
+    """Test pooled session reuse and retry behaviour"""
+
+    def setUp(self):
+        self.stub = GraphApiStub().start()
+        self.addCleanup(self.stub.stop)
+        whatsapp_api.configure(token="test-token", phone_number_id="123", base_url=self.stub.base_url)
+        self.addCleanup(whatsapp_api.configure, token="", phone_number_id="")
+        patcher = mock.patch.object(whatsapp_api, "WHATSAPP_BACKOFF_BASE", 0.001)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sends_reuse_one_connection(self):
+        for i in range(5):
+            ok, _ = whatsapp_api.send_text_message("628123", f"halo {i}")
+            self.assertTrue(ok)
+        self.assertEqual(self.stub.counts["requests"], 5)
+        self.assertEqual(self.stub.counts["connections"], 1)
+        self.assertEqual(self.stub.sent[0]["payload"]["text"]["body"], "halo 0")
+
+    def test_retries_on_429_and_5xx(self):
+        self.stub.fail_next(1, status=429, retry_after=0)
+        self.stub.fail_next(1, status=503)
+        ok, _ = whatsapp_api.send_text_message("628123", "halo")
+        self.assertTrue(ok)
+        self.assertEqual(self.stub.counts["requests"], 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.stub.fail_next(whatsapp_api.WHATSAPP_MAX_RETRIES + 1, status=500)
+        ok, _ = whatsapp_api.send_text_message("628123", "halo")
+        self.assertFalse(ok)
+        self.assertEqual(self.stub.counts["requests"], whatsapp_api.WHATSAPP_MAX_RETRIES + 1)
+
+    def test_does_not_retry_client_errors(self):
+        self.stub.fail_next(1, status=400)
+        ok, _ = whatsapp_api.send_text_message("628123", "halo")
+        self.assertFalse(ok)
+        self.assertEqual(self.stub.counts["requests"], 1)
+
+    def test_connection_errors_retried_but_read_timeouts_not(self):
+        session = mock.Mock()
+        with mock.patch.object(whatsapp_api, "get_session", return_value=session):
+            session.post.side_effect = requests.ConnectTimeout("connect timed out")
+            self.assertFalse(whatsapp_api.send_text_message("628123", "halo")[0])
+            self.assertEqual(session.post.call_count, whatsapp_api.WHATSAPP_MAX_RETRIES + 1)
+
+            session.post.reset_mock()
+            session.post.side_effect = requests.ReadTimeout("read timed out")
+            self.assertFalse(whatsapp_api.send_text_message("628123", "halo")[0])
+            self.assertEqual(session.post.call_count, 1)
+
+    def test_only_connect_failures_retried(self):
+        from http.client import RemoteDisconnected
+        from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+        session = mock.Mock()
+        refused = NewConnectionError(None, "Failed to establish a new connection: [Errno 111] Connection refused")
+        with mock.patch.object(whatsapp_api, "get_session", return_value=session):
+            session.post.side_effect = requests.ConnectionError(MaxRetryError(None, "/messages", refused))
+            self.assertFalse(whatsapp_api.send_text_message("628123", "halo")[0])
+            self.assertEqual(session.post.call_count, whatsapp_api.WHATSAPP_MAX_RETRIES + 1)
+
+            session.post.reset_mock()
+            dropped = ProtocolError("Connection aborted.", RemoteDisconnected("Remote end closed connection without response"))
+            session.post.side_effect = requests.ConnectionError(dropped)
+            self.assertFalse(whatsapp_api.send_text_message("628123", "halo")[0])
+            self.assertEqual(session.post.call_count, 1)
+
+    def test_async_send_retries_only_connect_failures(self):
+        session = mock.Mock()
+        refused = aiohttp.ClientConnectorError(mock.Mock(), OSError(111, "Connection refused"))
+
+        async def send(error):
+            session.post.reset_mock()
+            session.post.side_effect = error
+            with mock.patch.object(whatsapp_api, "get_async_session", mock.AsyncMock(return_value=session)):
+                return await whatsapp_api.asend_text_message("628123", "halo")
+
+        self.assertFalse(asyncio.run(send(refused))[0])
+        self.assertEqual(session.post.call_count, whatsapp_api.WHATSAPP_MAX_RETRIES + 1)
+        self.assertFalse(asyncio.run(send(asyncio.TimeoutError()))[0])
+        self.assertEqual(session.post.call_count, 1)
+
+    def test_async_send_against_stub(self):
+        async def send():
+            try:
+                return await whatsapp_api.asend_text_message("628123", "halo")
+            finally:
+                await whatsapp_api.close_async_session()
+
+        self.stub.fail_next(1, status=503)
+        ok, _ = asyncio.run(send())
+        self.assertTrue(ok)
+        self.assertEqual(self.stub.counts["requests"], 2)
+
+    def test_retry_after_header_is_respected(self):
+        resp = mock.Mock(headers={"Retry-After": "2"})
+        self.assertEqual(whatsapp_api._backoff_delay(0, resp), 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()